@@ -0,0 +1,279 @@
+""" Фоновая загрузка ресурсов: картинки декодируются в пуле потоков, в видеопамять уходят в главном потоке """
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import arcade
+import pyglet
+from PIL import Image
+
+UPLOAD_BUDGET = 0.006  # секунд за кадр на выгрузку готовых текстур в атлас (хотя бы одна за кадр)
+MEMORY_BUDGET = 64 * 2 ** 20  # байт на ленивые ресурсы; сверх него выгружаются давно не нужные
+
+
+class SilentSound:
+    """ Звук, который не удалось загрузить: play() отдаёт пустой плеер, его можно остановить как обычный """
+
+    def play(self, *args, **kwargs):
+        return pyglet.media.Player()
+
+
+def load_sound(path, fallback=None):
+    """ Звук path, при ошибке - fallback, а если и он не грузится - тишина """
+    for candidate in (path, fallback):
+        if candidate is None:
+            continue
+        try:
+            return arcade.load_sound(candidate)
+        except Exception as e:
+            print(f"Не удалось загрузить звук {candidate}: {e}")
+    return SilentSound()
+
+
+def _decode(path, size):
+    if size is None:
+        return arcade.load_texture(path)
+    # Кадр на весь экран: в атлас незачем класть больше пикселей, чем будет нарисовано.
+    # draft даёт JPEG-декодеру сразу уменьшить картинку, если она хотя бы вдвое больше экрана
+    image = Image.open(path)
+    image.draft('RGB', size)
+    image = image.convert('RGBA').resize(size, Image.LANCZOS)
+    return arcade.Texture(image, hash=f"{path}:{size[0]}x{size[1]}")
+
+
+def _load_texture(path, fallback, size):
+    # Фоновый поток: Pillow декодирует файл, arcade считает хеш и хитбокс - GL здесь не нужен
+    try:
+        return _decode(path, size)
+    except Exception as e:
+        if fallback is None:
+            raise
+        print(f"Не удалось загрузить {path}: {e}")
+        return _decode(fallback, size)
+
+
+class AssetLoader:
+    """
+    Очередь ресурсов по приоритету: что поставлено раньше, то и будет готово раньше.
+    Задачи делятся на группы, у каждой группы свой прогресс (например, 'menu' - всё для стартового меню)
+    """
+
+    def __init__(self, workers=None, autoupdate=False):
+        self.pool = ThreadPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1),
+                                       thread_name_prefix="assets")
+        self.queue = deque()  # (future или None, завершение в главном потоке, группа)
+        self.total = {}  # группа -> задач всего
+        self.finished = {}  # группа -> задач готово
+        self.autoupdate = autoupdate  # сам вызывает update() по часам pyglet, пока очередь не пуста
+        self.scheduled = False
+
+    def _push(self, future, finish, group):
+        self.queue.append((future, finish, group))
+        self.total[group] = self.total.get(group, 0) + 1
+        self.finished.setdefault(group, 0)
+        if self.autoupdate and not self.scheduled:
+            pyglet.clock.schedule(self._tick)
+            self.scheduled = True
+
+    def _tick(self, delta_time):
+        # Шаг загрузки в кадре (по часам pyglet, в каком бы окне ни была игра)
+        self.update()
+        if not self.queue:
+            pyglet.clock.unschedule(self._tick)
+            self.scheduled = False
+
+    def texture(self, path, on_ready, group, fallback=None, size=None, upload=True):
+        """
+        Текстура файла path; on_ready(texture) вызывается в главном потоке, когда она уже в атласе.
+        size=(ш, в) - сразу привести картинку к этому размеру (полноэкранные кадры анимаций);
+        upload=False - только декодировать, в атлас текстура попадёт при первой отрисовке
+        """
+        def finish(texture):
+            if upload:
+                arcade.get_window().ctx.default_atlas.add(texture)
+            on_ready(texture)
+
+        self._push(self.pool.submit(_load_texture, path, fallback, size), finish, group)
+
+    @staticmethod
+    def reserve_atlas(size):
+        """
+        Сразу растит общий атлас до size, пока он почти пуст: иначе он растёт по ходу загрузки,
+        и каждое удвоение копирует всё содержимое (на 16384x16384 это секунды)
+        """
+        ctx = arcade.get_window().ctx
+        limit = ctx.info.MAX_TEXTURE_SIZE
+        size = (min(size[0], limit), min(size[1], limit))
+        if ctx.default_atlas.width < size[0] or ctx.default_atlas.height < size[1]:
+            ctx.default_atlas.resize(size)
+
+    def run(self, func, on_ready, group, *args):
+        """ func(*args) в пуле потоков, on_ready(результат) - в главном потоке в порядке очереди """
+        self._push(self.pool.submit(func, *args), on_ready, group)
+
+    def call(self, func, group):
+        """ Работа в главном потоке в общей очереди (звуки: pyglet.media ждёт их из главного потока) """
+        self._push(None, func, group)
+
+    def update(self, budget=UPLOAD_BUDGET):
+        """ Доделывает готовые задачи по порядку, пока не кончится бюджет кадра """
+        start = time.perf_counter()
+        while self.queue:
+            future, finish, group = self.queue[0]
+            if future is not None and not future.done():
+                break  # порядок важнее: следующие задачи ждут эту
+            self.queue.popleft()
+            try:
+                if future is None:
+                    finish()
+                else:
+                    finish(future.result())
+            except Exception as e:
+                print(f"Ошибка загрузки ресурса: {e}")
+            self.finished[group] += 1
+            if time.perf_counter() - start > budget:
+                break
+
+    def wait(self, *groups):
+        """ Доделывает группы сразу, блокируя главный поток (то, что нужно прямо сейчас) """
+        while self.queue and not self.done(*groups):
+            future = self.queue[0][0]
+            if future is not None:
+                try:
+                    future.result()
+                except Exception:
+                    pass  # ошибку напечатает update
+            self.update(budget=0)
+
+    def progress(self, *groups):
+        """ Доля готовых задач в группах (все группы, если не указаны) """
+        groups = groups or tuple(self.total)
+        total = sum(self.total.get(g, 0) for g in groups)
+        return sum(self.finished.get(g, 0) for g in groups) / total if total else 1.0
+
+    def done(self, *groups):
+        return self.progress(*groups) >= 1.0
+
+    def close(self):
+        if self.scheduled:
+            pyglet.clock.unschedule(self._tick)
+            self.scheduled = False
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _sound_size(sound):
+    # Статический звук держит в памяти весь распакованный PCM
+    data = getattr(getattr(sound, 'source', None), '_data', None)
+    return len(data) if data else 0
+
+
+class AssetHandle:
+    """
+    Ресурс, который загружается при первом get() (или заранее через AssetRegistry.warm).
+    После выгрузки следующий get() загрузит его снова
+    """
+
+    def __init__(self, registry, name, load, size, warm=None, release=None):
+        self.registry = registry
+        self.name = name
+        self._load = load  # () -> значение, в главном потоке
+        self._size = size  # значение -> байт в памяти
+        self._warm = warm  # (loader, on_ready) ставит загрузку в фон; None - та же _load в общей очереди
+        self._release = release  # значение -> None, освобождает то, что не соберёт сборщик мусора
+        self.value = None
+        self.loaded = False
+        self.warming = False
+        self.last_used = 0.0
+
+    def get(self):
+        if not self.loaded:
+            if self.warming:
+                self.registry.loader.wait(self.name)  # уже грузится в фоне - доделываем сейчас
+            if not self.loaded:
+                self._set(self._load())
+        self.last_used = time.monotonic()
+        return self.value
+
+    def warm(self):
+        if self.loaded or self.warming:
+            return
+        self.warming = True
+        if self._warm is None:
+            self.registry.loader.call(lambda: self._set(self._load()), self.name)
+        else:
+            self._warm(self.registry.loader, self._set)
+
+    def size(self):
+        return self._size(self.value) if self.loaded else 0
+
+    def _set(self, value):
+        self.value = value
+        self.loaded = True
+        self.warming = False
+        self.last_used = time.monotonic()
+        self.registry.trim()
+
+    def evict(self):
+        if self.loaded and self._release is not None:
+            self._release(self.value)
+        self.value = None
+        self.loaded = False
+
+
+class AssetRegistry:
+    """
+    Ленивые ресурсы по именам: при старте только описания, загрузка - при первом обращении
+    или заранее, когда игра предсказывает, что ресурс скоро понадобится. Если вместе они занимают
+    больше budget байт, выгружаются те, к которым дольше всего не обращались
+    """
+
+    def __init__(self, loader, budget=MEMORY_BUDGET):
+        self.loader = loader
+        self.budget = budget
+        self.handles = {}
+
+    def __getitem__(self, name):
+        return self.handles[name]
+
+    def add(self, name, load, size, warm=None, release=None):
+        handle = self.handles[name] = AssetHandle(self, name, load, size, warm, release)
+        return handle
+
+    def texture(self, name, path, fallback=None, size=None):
+        """
+        Картинка (None, если не загрузилась); в фоне декодируется в пуле потоков и сразу уходит в атлас.
+        size=(ш, в) - сразу привести к этому размеру (полноэкранные картинки - к размеру экрана)
+        """
+        def load():
+            try:
+                return _load_texture(path, fallback, size)
+            except Exception as e:
+                print(f"Не удалось загрузить {path}: {e}")
+                return None
+
+        def warm(loader, on_ready):
+            loader.texture(path, on_ready, name, fallback=fallback, size=size)
+
+        return self.add(name, load, lambda texture: texture.width * texture.height * 4 if texture else 0, warm)
+
+    def sound(self, name, path, fallback=None):
+        return self.add(name, lambda: load_sound(path, fallback), _sound_size)
+
+    def warm(self, *names):
+        """ Загрузить заранее в фоне (уже загруженные и грузящиеся пропускаются) """
+        for name in names:
+            self.handles[name].warm()
+
+    def used(self):
+        return sum(handle.size() for handle in self.handles.values())
+
+    def trim(self):
+        """ Выгружает давно не нужные ресурсы, пока не уложимся в бюджет (самый свежий остаётся всегда) """
+        loaded = sorted((h for h in self.handles.values() if h.loaded), key=lambda h: h.last_used)
+        used = sum(h.size() for h in loaded)
+        for handle in loaded[:-1]:
+            if used <= self.budget:
+                break
+            used -= handle.size()
+            handle.evict()
@@ -0,0 +1,86 @@
+import threading
+
+import database
+
+
+class AutosaveService:
+    """ Сохранение в фоновом потоке: главный поток только снимает копию мира """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = None  # последний ещё не записанный снимок
+        self._busy = False  # идёт запись
+        self._closed = False
+        self._entities = {}  # копии сущностей с прошлого снимка (см. database.snapshot_game)
+        self._game = None  # (имя, время создания) сохранения, к которому относятся копии и счётчик событий
+        self._events_sent = 0  # столько событий лога уже ушло в снимки
+        self.saves_written = 0
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+
+    def request(self, world, heroes, enemies, lairs, replay=None):
+        """
+        Снимок делается сразу, запись - в потоке. Незаписанный снимок заменяется новым.
+        replay - (герои в json, список событий): копируются только события после прошлого запроса
+        """
+        with self._cond:
+            if self._closed:
+                return
+            game = (world.get('name'), world.get('time_of_creation'))
+            if game != self._game:
+                self._game = game
+                self._entities.clear()
+                self._events_sent = 0
+            if replay is not None:
+                heroes_json, events = replay
+                first = self._events_sent
+                replay = (heroes_json, first, events[first:])
+                self._events_sent = len(events)
+            snapshot = database.snapshot_game(world, heroes, enemies, lairs, replay, self._entities)
+            pending = self._pending
+            if pending is not None and pending.replay is not None and replay is not None:
+                heroes_json, first, events = pending.replay
+                if first + len(events) == replay[1]:
+                    # События незаписанного снимка ещё не в базе - новый снимок забирает их себе
+                    snapshot = snapshot._replace(replay=(heroes_json, first, events + replay[2]))
+            self._pending = snapshot
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """ Ждёт, пока все запрошенные сохранения будут записаны """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending is None and not self._busy, timeout)
+
+    def close(self):
+        """ Дописывает последний снимок и останавливает поток """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        # sqlite3-соединение нельзя передавать между потоками, поэтому у потока оно своё
+        conn = None
+        encoded = {}  # строки сущностей с прошлой записи (см. database._write_entities)
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or self._closed)
+                if self._pending is None:
+                    break
+                snapshot, self._pending = self._pending, None
+                self._busy = True
+            try:
+                if conn is None:
+                    conn = database.get_connection()
+                database.save_snapshot(snapshot, conn, encoded)
+                self.saves_written += 1
+            except Exception as e:
+                print(f"Не удалось сохранить игру: {e}")
+                with self._cond:
+                    self._events_sent = 0  # события этого снимка в базу не попали - следующий отправит весь лог
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+        if conn is not None:
+            conn.close()
@@ -0,0 +1,140 @@
+""" Прогоны баланса: много партий без окна параллельно. Запуск: python balance.py heroes.zip [...] --seeds 200 """
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+
+import simulation
+from game_logic import read_characters_zip
+from terrain import load_terrain
+
+
+# Персонажи из архивов читаются в каждом процессе пула один раз
+_heroes_cache = {}
+
+
+def _ability_name(unit, effect):
+    for ability in unit.abilities:
+        if ability.get('effect') == effect:
+            return ability.get('name', effect)
+    return effect
+
+
+def play_game(job):
+    """ Одна партия: (архив героев, сид, лимит ходов) -> запись для JSONL """
+    zip_path, seed, max_turns = job
+    if zip_path not in _heroes_cache:
+        _heroes_cache[zip_path] = read_characters_zip(zip_path)
+    heroes_data = _heroes_cache[zip_path]
+
+    # Как в GameView.setup: сид партии задаёт и карту, и все броски после неё
+    random.seed(seed)
+    grid, taverns = load_terrain(seed)
+    sim = simulation.Simulation(grid, seed, verbose=False)
+
+    abilities = {}  # "кто: способность" -> [применений, урон]
+
+    def on_ability(source, target, effect, damage):
+        key = f"{source.name}: {_ability_name(source, effect)}"
+        entry = abilities.setdefault(key, [0, 0])
+        entry[0] += 1
+        entry[1] += damage
+
+    sim.on_ability = on_ability
+    sim.new_game([dict(h) for h in heroes_data], taverns)
+
+    coins = []
+    boss_turn = None
+    outcome = None
+    while outcome is None and sim.turn_number < max_turns:
+        outcome = sim.step_turn()
+        coins.append(sim.coins)
+        if boss_turn is None and sim.boss_spawned:
+            boss_turn = sim.turn_number
+    return {'type': 'game', 'zip': zip_path, 'seed': seed, 'outcome': outcome or 'timeout',
+            'turns': sim.turn_number, 'boss_turn': boss_turn, 'heroes_left': len(sim.heroes),
+            'abilities': abilities, 'coins': coins}
+
+
+def read_results(path):
+    """ Уже записанные партии (для продолжения прерванного прогона) """
+    games = []
+    if not os.path.exists(path):
+        return games
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # строка, оборванная при остановке прогона
+            if record.get('type') == 'game':
+                games.append(record)
+    return games
+
+
+def summarize(games):
+    """ Сводка по партиям одного архива героев """
+    wins = [g for g in games if g['outcome'] == 'win']
+    boss_turns = [g['boss_turn'] for g in games if g['boss_turn'] is not None]
+    abilities = {}
+    for g in games:
+        for key, (casts, damage) in g['abilities'].items():
+            entry = abilities.setdefault(key, [0, 0])
+            entry[0] += casts
+            entry[1] += damage
+    # Кривая монет: среднее по партиям, ещё идущим на этом ходу
+    coin_curve = []
+    for turn in range(max((len(g['coins']) for g in games), default=0)):
+        values = [g['coins'][turn] for g in games if turn < len(g['coins'])]
+        coin_curve.append(round(sum(values) / len(values), 1))
+    return {
+        'type': 'summary',
+        'zip': games[0]['zip'] if games else None,
+        'games': len(games),
+        'win_rate': round(len(wins) / len(games), 3) if games else 0,
+        'loss_rate': round(sum(g['outcome'] == 'lose' for g in games) / len(games), 3) if games else 0,
+        'timeouts': sum(g['outcome'] == 'timeout' for g in games),
+        'mean_turns_to_win': round(sum(g['turns'] for g in wins) / len(wins), 1) if wins else None,
+        'boss_reached': len(boss_turns),
+        'mean_turns_to_boss': round(sum(boss_turns) / len(boss_turns), 1) if boss_turns else None,
+        'damage_per_cast': {key: round(damage / casts, 2) for key, (casts, damage) in sorted(abilities.items())},
+        'casts': {key: casts for key, (casts, damage) in sorted(abilities.items())},
+        'coin_curve': coin_curve,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Прогоны баланса: партии без окна на всех ядрах")
+    parser.add_argument('zips', nargs='+', help="архивы героев (как sample_heroes/heroes_1.zip)")
+    parser.add_argument('--seeds', type=int, default=100, help="сколько партий (сидов) на архив")
+    parser.add_argument('--first-seed', type=int, default=1)
+    parser.add_argument('--max-turns', type=int, default=500, help="после стольких ходов партия - ничья")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--out', default='balance.jsonl', help="JSONL с партиями; уже сыгранные пропускаются")
+    args = parser.parse_args(argv)
+    # Партии в файле узнаём по пути к архиву - он не должен зависеть от текущей папки
+    args.zips = [os.path.abspath(z) for z in args.zips]
+
+    done = {(g['zip'], g['seed']) for g in read_results(args.out)}
+    jobs = [(zip_path, seed, args.max_turns) for zip_path in args.zips
+            for seed in range(args.first_seed, args.first_seed + args.seeds) if (zip_path, seed) not in done]
+    print(f"Партий: {len(jobs)} (уже сыграно {len(done)}), процессов: {args.workers}", file=sys.stderr)
+
+    if jobs:
+        with open(args.out, 'a', encoding='utf-8') as out, multiprocessing.Pool(args.workers) as pool:
+            for n, record in enumerate(pool.imap_unordered(play_game, jobs), 1):
+                # Каждая партия пишется сразу - прогон можно смотреть через tail -f и продолжить после остановки
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                out.flush()
+                print(f"[{n}/{len(jobs)}] {record['zip']} сид {record['seed']}: {record['outcome']} "
+                      f"за {record['turns']} ходов", file=sys.stderr)
+
+    games = read_results(args.out)
+    for zip_path in args.zips:
+        print(json.dumps(summarize([g for g in games if g['zip'] == zip_path]), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
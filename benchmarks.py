@@ -0,0 +1,735 @@
+""" Микробенчмарки горячих участков игры, только замеры (правильность проверяет tests/). Запуск: python benchmarks.py [имя ...] """
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+from collections import deque
+from types import SimpleNamespace
+
+from constants import *
+
+
+def _legacy_get_stat(entity, stat_name):
+    """ Старый путь: проход по всему списку эффектов на каждый запрос """
+    base = entity.stats_dict.get(stat_name, 0)
+    bonus = 0
+    for effect in entity.active_effects:
+        if effect['stat'] == stat_name:
+            bonus += effect['value']
+    return (base + bonus, bonus, base)
+
+
+def bench_get_stat(buffs=(0, 60, 200), repeat=2000):
+    """ get_stat: таблица бонусов против прохода по active_effects (равенство проверяет tests/test_simulation.py) """
+    from entities import Entity
+
+    for count in buffs:
+        entity = Entity("images/hero_1.jpg", "hero", json_data=ENEMY_JSON.copy())
+        stats = list(entity.stats_dict)
+        for _ in range(count):
+            entity.add_effect(random.choice(stats), random.randint(-3, 3), random.randint(1, 5))
+
+        def legacy():
+            for key in stats:
+                _legacy_get_stat(entity, key)
+
+        def cached():
+            for key in stats:
+                entity.get_stat(key)
+
+        t_old = timeit.timeit(legacy, number=repeat)
+        t_new = timeit.timeit(cached, number=repeat)
+        calls = repeat * len(stats)
+        print(f"get_stat, {count} баффов, {len(stats)} статов:")
+        print(f"  проход по эффектам: {t_old / calls * 1e6:.2f} мкс/вызов")
+        print(f"  таблица бонусов:    {t_new / calls * 1e6:.2f} мкс/вызов (x{t_old / t_new:.1f})")
+
+
+class _SyntheticEntity(SimpleNamespace):
+    """ Как Unit: ключ в кеше снимков, поэтому сравнивается и хешируется по объекту """
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+
+def _synthetic_world(entities=10000, lairs=3):
+    """ Мир из простых объектов с теми же полями, что сохраняет database """
+    items = [SimpleNamespace(name=item['name'], image_path=item['image'], price=item['price'],
+                             stats_dict=item['stats'], abilities=item['abilities']) for item in ITEMS_DB]
+    heroes, enemies = [], []
+    for i in range(entities):
+        data = ENEMY_JSON if i % 10 else BOSS_VAMPIRE
+        entity = _SyntheticEntity(name=f"{data['name']} {i}", role='hero' if i < 4 else 'enemy',
+                                  center_x=random.randint(0, GRID_WIDTH) * TILE_SIZE,
+                                  center_y=random.randint(0, GRID_HEIGHT) * TILE_SIZE,
+                                  stats_dict=dict(data['stats'], hp=10, max_hp=10),
+                                  active_effects=[{'stat': 'hp', 'value': 1, 'duration': 2}],
+                                  abilities=data['abilities'], is_guardian=i % 3 == 0, is_boss=False,
+                                  image_path='images/enemy.jpg', inventory=random.sample(items, 2),
+                                  stats_version=0, effects_version=0, abilities_version=0)
+        (heroes if entity.role == 'hero' else enemies).append(entity)
+    lair_list = [SimpleNamespace(center_x=i * TILE_SIZE, center_y=i * TILE_SIZE, guardians_needed=6,
+                                 next_spawn_interval=2, guardians_spawned=False) for i in range(lairs)]
+    world = {'seed': 1, 'name': 'bench', 'time_of_creation': '2000-01-01 00:00:00',
+             'coins': 75, 'rep': 0, 'quest': None}
+    return world, heroes, enemies, lair_list
+
+
+def _with_temp_db(func):
+    """ Запускает func на временной базе, не трогая gamedata.db """
+    import database
+
+    old_name = database.DB_NAME
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, 'bench.db')
+        try:
+            database.init_db()
+            return func(database)
+        finally:
+            database.DB_NAME = old_name
+
+
+def bench_save(entities=10000, saves=5):
+    """ Сохранение мира с большим числом сущностей (повторные F5 в одно сохранение) """
+    world, heroes, enemies, lairs = _synthetic_world(entities)
+
+    def run(database):
+        start = time.perf_counter()
+        for _ in range(saves):
+            database.save_game_state(world, heroes, enemies, lairs)
+        return time.perf_counter() - start
+
+    elapsed = _with_temp_db(run)
+    print(f"save_game_state, {entities} сущностей: {saves / elapsed:.2f} сохранений/с "
+          f"({elapsed / saves * 1000:.0f} мс на сохранение)")
+
+
+def bench_autosave(entities=10000, requests=20, changed=100):
+    """ Сколько стоит сохранение главному потоку: снимок для AutosaveService против записи на месте """
+    from autosave import AutosaveService
+
+    world, heroes, enemies, lairs = _synthetic_world(entities)
+
+    def run(database):
+        start = time.perf_counter()
+        database.save_game_state(world, heroes, enemies, lairs)
+        t_sync = time.perf_counter() - start
+
+        # Между запросами проходит ход (и прошлая запись успевает закончиться):
+        # часть сущностей сдвинулась или получила урон, лог подрос
+        service = AutosaveService()
+        everyone = heroes + enemies
+        events = [['end_turn']] * (entities * 2)
+        stalls = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            service.request(world, heroes, enemies, lairs, ('[]', events))
+            stalls.append(time.perf_counter() - start)
+            service.flush()
+            for entity in random.sample(everyone, changed):
+                entity.center_x += TILE_SIZE
+                entity.stats_dict['hp'] -= 1
+                entity.stats_version += 1
+            events.extend([['move', 0, 1, 1]] * changed)
+        service.close()
+        return t_sync, stalls[0], max(stalls[1:]), sum(stalls[1:]) / (requests - 1), service.saves_written
+
+    t_sync, t_first, t_max, t_avg, written = _with_temp_db(run)
+    print(f"сохранение, {entities} сущностей: на месте {t_sync * 1000:.0f} мс, "
+          f"снимок для автосохранения: первый {t_first * 1000:.0f} мс, "
+          f"дальше {t_avg * 1000:.1f} мс (макс. {t_max * 1000:.1f} мс, меняется {changed} за ход); "
+          f"{requests} запросов -> {written} записей")
+
+
+def bench_load(sizes=(100, 10000)):
+    """ Загрузка сохранения с разным числом сущностей (число запросов проверяет tests/test_database.py) """
+    for entities in sizes:
+        world, heroes, enemies, lairs = _synthetic_world(entities)
+
+        def run(database):
+            database.save_game_state(world, heroes, enemies, lairs)
+            save_id = database.get_recent_saves(1)[0][0]
+            start = time.perf_counter()
+            database.load_game_state(save_id)
+            return time.perf_counter() - start
+
+        elapsed = _with_temp_db(run)
+        print(f"load_game_state, {entities} сущностей: {elapsed * 1000:.0f} мс")
+
+
+def bench_enemy_turn(enemies=200, heroes=4, seed=7):
+    """ Планирование хода врагов: одно поле расстояний от всех героев (до последнего врага и по всей карте) """
+    from pathfinding import FlowField, OccupancyGrid
+    from terrain import generate_terrain
+
+    grid, _ = generate_terrain(seed)
+    width, height = grid.shape
+    occupancy = OccupancyGrid(grid)
+    passable = occupancy.passable
+    rng = random.Random(seed)
+    free = [(x, y) for x in range(width) for y in range(height) if passable[x * height + y]]
+    cells = rng.sample(free, heroes + enemies)
+    hero_cells, enemy_cells = cells[:heroes], cells[heroes:]
+    for cell in cells:
+        occupancy.move(None, cell)
+
+    t_settle = timeit.timeit(lambda: FlowField(occupancy, hero_cells, settle=enemy_cells), number=20) / 20
+    t_full = timeit.timeit(lambda: FlowField(occupancy, hero_cells), number=20) / 20
+    print(f"ход врагов, {enemies} врагов, {heroes} героев, карта {width}x{height}:")
+    print(f"  поле расстояний: {t_settle * 1000:.2f} мс до последнего врага, {t_full * 1000:.2f} мс по всей карте")
+
+
+def _maze(width, height, rng):
+    """ Лабиринт (обход в глубину) в виде плоского массива проходимости """
+    passable = bytearray(width * height)
+    stack = [(1, 1)]
+    passable[1 * height + 1] = 1
+    while stack:
+        x, y = stack[-1]
+        moves = [(dx, dy) for dx, dy in ((2, 0), (-2, 0), (0, 2), (0, -2))
+                 if 0 < x + dx < width - 1 and 0 < y + dy < height - 1
+                 and not passable[(x + dx) * height + y + dy]]
+        if not moves:
+            stack.pop()
+            continue
+        dx, dy = rng.choice(moves)
+        passable[(x + dx // 2) * height + y + dy // 2] = 1
+        passable[(x + dx) * height + y + dy] = 1
+        stack.append((x + dx, y + dy))
+    return passable
+
+
+def _bfs_path(start, goal, width, height, obstacles):
+    """ Прежний game_logic.bfs_path (обход в ширину по кортежам и множествам) - база для сравнения с A* """
+    queue = deque([start])
+    came_from = {start: None}
+    while queue:
+        current = queue.popleft()
+        if current == goal:
+            break
+        cx, cy = current
+        for nxt in [(cx + 1, cy), (cx - 1, cy), (cx, cy + 1), (cx, cy - 1)]:
+            if 0 <= nxt[0] < width and 0 <= nxt[1] < height and nxt not in came_from and nxt not in obstacles:
+                queue.append(nxt)
+                came_from[nxt] = current
+    if goal not in came_from:
+        return []
+    path = []
+    while goal != start:
+        path.append(goal)
+        goal = came_from[goal]
+    path.reverse()
+    return path
+
+
+def bench_pathfinding(size=101, queries=100, move_range=8, seed=3):
+    """ BFS против astar_path на открытой карте и в лабиринте (A* и с отсечкой по move_range) """
+    from pathfinding import astar_path
+
+    rng = random.Random(seed)
+    maps = {'открытая карта': bytearray(b'\x01') * (size * size), 'лабиринт': _maze(size, size, rng)}
+    print(f"поиск пути, карта {size}x{size}, {queries} запросов:")
+    for title, passable in maps.items():
+        free = [(x, y) for x in range(size) for y in range(size) if passable[x * size + y]]
+        obstacles = {(x, y) for x in range(size) for y in range(size) if not passable[x * size + y]}
+        pairs = [tuple(rng.sample(free, 2)) for _ in range(queries)]
+
+        t_bfs = timeit.timeit(lambda: [_bfs_path(a, b, size, size, obstacles) for a, b in pairs], number=1)
+        t_astar = timeit.timeit(lambda: [astar_path(a, b, size, size, passable) for a, b in pairs], number=1)
+        t_cut = timeit.timeit(lambda: [astar_path(a, b, size, size, passable, max_cost=move_range)
+                                       for a, b in pairs], number=1)
+        print(f"  {title}: BFS {t_bfs / queries * 1000:.2f} мс, A* {t_astar / queries * 1000:.2f} мс "
+              f"(x{t_bfs / t_astar:.1f}), A* с отсечкой {move_range} {t_cut / queries * 1000:.3f} мс на запрос")
+
+
+def bench_click(counts=(200, 2000), clicks=500, seed=5):
+    """ Кто стоит в клетке: arcade.get_sprites_at_point по списку против SpatialHash """
+    import arcade
+    from spatial import SpatialHash
+
+    rng = random.Random(seed)
+    print(f"поиск сущности под курсором, {clicks} кликов:")
+    for count in counts:
+        sprites = arcade.SpriteList()
+        index = SpatialHash()
+        cells = rng.sample([(x, y) for x in range(GRID_WIDTH) for y in range(GRID_HEIGHT)],
+                           min(count, GRID_WIDTH * GRID_HEIGHT))
+        for gx, gy in cells:
+            sprite = arcade.SpriteSolidColor(TILE_SIZE, TILE_SIZE, color=arcade.color.RED)
+            sprite.position = (gx * TILE_SIZE + TILE_SIZE / 2, gy * TILE_SIZE + TILE_SIZE / 2)
+            sprites.append(sprite)
+            index.move(sprite, None, (gx, gy))
+        points = [(rng.uniform(0, GRID_WIDTH * TILE_SIZE), rng.uniform(0, GRID_HEIGHT * TILE_SIZE))
+                  for _ in range(clicks)]
+
+        t_scan = timeit.timeit(lambda: [arcade.get_sprites_at_point(p, sprites) for p in points], number=1)
+        t_hash = timeit.timeit(lambda: [index.at_point(*p) for p in points], number=1)
+        print(f"  {len(cells)} сущностей: перебор {t_scan / clicks * 1e6:.1f} мкс, "
+              f"по клеткам {t_hash / clicks * 1e6:.2f} мкс на клик")
+
+
+def bench_lairs(counts=(3, 300), queries=2000, seed=11):
+    """ Ближайшее логово и логова в радиусе через LairIndex """
+    from spatial import LairIndex
+
+    rng = random.Random(seed)
+    print(f"логова, {queries} запросов:")
+    for count in counts:
+        index = LairIndex()
+        for gx, gy in rng.sample([(x, y) for x in range(GRID_WIDTH) for y in range(GRID_HEIGHT)], count):
+            index.add(SimpleNamespace(center_x=gx * TILE_SIZE + TILE_SIZE / 2, center_y=gy * TILE_SIZE + TILE_SIZE / 2))
+        cells = [(rng.randrange(GRID_WIDTH), rng.randrange(GRID_HEIGHT)) for _ in range(queries)]
+
+        t_nearest = timeit.timeit(lambda: [index.nearest(c) for c in cells], number=1)
+        t_within = timeit.timeit(lambda: [index.within(c, LAIR_ACTIVATION_RADIUS) for c in cells], number=1)
+        print(f"  {count} логов: ближайшее {t_nearest / queries * 1e6:.1f} мкс, "
+              f"в радиусе {t_within / queries * 1e6:.1f} мкс")
+
+
+def bench_headless(games=20, max_turns=300, seed=13):
+    """ Партии без окна через Simulation.step_turn: сколько ходов в секунду """
+    import simulation
+    from game_logic import read_characters_zip
+    from terrain import load_terrain
+
+    heroes_data = read_characters_zip("sample_heroes/heroes_1.zip")
+    turns, units, outcomes, elapsed = 0, 0, {}, 0.0
+    for game in range(games):
+        random.seed(seed + game)
+        grid, taverns = load_terrain(seed + game)
+        sim = simulation.Simulation(grid, seed + game, verbose=False)
+        sim.new_game([dict(h) for h in heroes_data], taverns)
+        start = time.perf_counter()
+        outcome = None
+        while outcome is None and sim.turn_number < max_turns:
+            outcome = sim.step_turn()
+            units += len(sim.heroes) + len(sim.enemies)
+        elapsed += time.perf_counter() - start
+        turns += sim.turn_number
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    print(f"Без окна, {games} партий (до {max_turns} ходов): {turns} ходов, исходы {outcomes}")
+    print(f"  {turns / elapsed:.0f} ходов/с, в среднем {units / turns:.0f} сущностей на карте")
+
+
+def bench_replay(turns=200, seed=17):
+    """ Перемотка партии по логу (совпадение с исходной партией проверяет tests/test_simulation.py) """
+    import json
+    import simulation
+    from game_logic import read_characters_zip
+    from replay import replay_game
+    from terrain import load_terrain
+
+    heroes_data = read_characters_zip("sample_heroes/heroes_1.zip")
+    grid, taverns = load_terrain(seed)
+    sim = simulation.Simulation(grid, seed, verbose=False)
+    sim.new_game(json.loads(json.dumps(heroes_data)), taverns)
+    while sim.turn_number < turns and not sim.step_turn():
+        pass
+
+    events = json.loads(json.dumps(sim.events))  # как после записи в базу
+    start = time.perf_counter()
+    replayed = replay_game(seed, json.loads(json.dumps(heroes_data)), events)
+    elapsed = time.perf_counter() - start
+    size = len(json.dumps(events, ensure_ascii=False).encode())
+    print(f"Воспроизведение: {len(events)} событий ({size // 1024} КБ) на {sim.turn_number} ходов")
+    print(f"  перемотка до конца: {elapsed * 1000:.0f} мс, {replayed.turn_number} ходов")
+
+
+def bench_profiler(zones=200000, turns=100, seed=19):
+    """ Цена зон профилировщика выключенным и включённым, и выгрузка трассы """
+    import json
+
+    import simulation
+    from game_logic import read_characters_zip
+    from profiler import Profiler, PROFILER
+    from terrain import load_terrain
+
+    profiler = Profiler()
+
+    def bare():
+        for _ in range(zones):
+            pass
+
+    def zoned():
+        for _ in range(zones):
+            with profiler.zone('bench'):
+                pass
+
+    t_bare = min(timeit.repeat(bare, number=1, repeat=3))
+    t_off = min(timeit.repeat(zoned, number=1, repeat=3))
+    profiler.enable()
+    t_on = min(timeit.repeat(zoned, number=1, repeat=3))
+    print(f"Зона профилировщика: выключен {(t_off - t_bare) / zones * 1e9:.0f} нс, "
+          f"включён {(t_on - t_bare) / zones * 1e9:.0f} нс")
+
+    heroes_data = read_characters_zip("sample_heroes/heroes_1.zip")
+    grid, taverns = load_terrain(seed)
+
+    def play(enabled):
+        PROFILER.enable(enabled)
+        PROFILER.reset()
+        sim = simulation.Simulation(grid, seed, verbose=False)
+        sim.new_game(json.loads(json.dumps(heroes_data)), taverns)
+        start = time.perf_counter()
+        while sim.turn_number < turns and not sim.step_turn():
+            pass
+        return time.perf_counter() - start, sim.turn_number
+
+    try:
+        (t_off, played), (t_on, _) = play(False), play(True)
+        p50, p95, p99 = PROFILER.percentiles('enemy.act')
+        with tempfile.TemporaryDirectory() as tmp:
+            path = PROFILER.export_chrome_trace(os.path.join(tmp, 'trace.json'))
+            with open(path, encoding='utf-8') as f:
+                trace = json.load(f)['traceEvents']
+    finally:
+        PROFILER.enable(False)
+        PROFILER.reset()
+    print(f"  {played} ходов без окна: выключен {t_off * 1000:.0f} мс, включён {t_on * 1000:.0f} мс")
+    print(f"  enemy.act p50/p95/p99: {p50:.2f}/{p95:.2f}/{p99:.2f} мс, событий в трассе {len(trace)}")
+
+
+def bench_particles(walkers=100, frames=300, bursts_every=10):
+    """ Обновление частиц: спрайт на частицу против массивов ParticleSystem (без отрисовки) """
+    import math
+
+    import arcade
+    from effects import EffectManager
+
+    class LegacyParticle(arcade.SpriteCircle):
+        """ Старая частица: свой спрайт и удаление из списка по альфе """
+        def __init__(self, x, y, color, change_x, change_y, fade_speed=5, gravity=0):
+            super().__init__(radius=3, color=color)
+            self.center_x, self.center_y = x, y
+            self.change_x, self.change_y = change_x, change_y
+            self.fade_speed, self.gravity = fade_speed, gravity
+
+        def update(self, delta_time):
+            super().update()
+            self.change_y -= self.gravity * delta_time
+            self.center_x += self.change_x * delta_time
+            self.center_y += self.change_y * delta_time
+            self.alpha = max(0, self.alpha - self.fade_speed)
+            if self.alpha <= 0:
+                self.remove_from_sprite_lists()
+
+    rng = random.Random(1)
+    positions = [(rng.uniform(0, 6000), rng.uniform(0, 6000)) for _ in range(walkers)]
+
+    def legacy():
+        particles = arcade.SpriteList()
+        peak = 0
+        for frame in range(frames):
+            for x, y in positions:
+                p = LegacyParticle(x + rng.uniform(-10, 10), y + 10, arcade.color.LIGHT_GRAY,
+                                   rng.uniform(-0.5, 0.5), rng.uniform(0.1, 1), fade_speed=10)
+                p.alpha = 150
+                particles.append(p)
+            if frame % bursts_every == 0:
+                for _ in range(12):
+                    angle = rng.uniform(0, 2 * math.pi)
+                    particles.append(LegacyParticle(3000, 3000, arcade.color.RED,
+                                                    math.cos(angle) * 3, math.sin(angle) * 3, fade_speed=7))
+            particles.update(1 / 60)
+            peak = max(peak, len(particles))
+        return peak
+
+    def pooled():
+        manager = EffectManager()
+        xs, ys = [x for x, _ in positions], [y for _, y in positions]
+        peak = 0
+        for frame in range(frames):
+            manager.add_walk_effects(xs, ys)
+            if frame % bursts_every == 0:
+                manager.add_damage_effect(3000, 3000)
+            manager.update(1 / 60)
+            peak = max(peak, len(manager.points))
+        return peak
+
+    start = time.perf_counter()
+    legacy_peak = legacy()
+    t_legacy = time.perf_counter() - start
+    start = time.perf_counter()
+    pooled_peak = pooled()
+    t_pooled = time.perf_counter() - start
+    print(f"Частицы: {walkers} идущих, {frames} кадров")
+    print(f"  спрайты: {t_legacy / frames * 1000:.2f} мс/кадр, до {legacy_peak} частиц")
+    print(f"  массивы: {t_pooled / frames * 1000:.2f} мс/кадр, до {pooled_peak} частиц "
+          f"(ускорение x{t_legacy / t_pooled:.0f})")
+
+
+def bench_text(frames=300, lairs=3, heals=5):
+    """ Надписи кадра: draw_text и текстура на каждый плюсик против общих текстур и arcade.Text (нужно окно) """
+    import arcade
+
+    try:
+        window = arcade.get_window()
+    except RuntimeError:
+        # На сервере без дисплея запускать с ARCADE_HEADLESS=1
+        window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, visible=False)
+    import pyglet
+    from effects import TextParticle
+    from text_cache import set_text, text_texture
+
+    sim = SimpleNamespace(coins=75, reputation=40, lairs=[SimpleNamespace(center_x=200 + 300 * i, center_y=300,
+                                                                            guardians_needed=6) for i in range(lairs)],
+                          active_quest={'text': "Уничтожь одно логово поблизости.", 'progress': 0, 'target': 1})
+
+    def tick(frame):
+        # Значения меняются изредка, как в игре
+        if frame % 30 == 0:
+            sim.coins += 5
+            sim.lairs[frame // 30 % lairs].guardians_needed -= 1
+
+    def legacy(frame):
+        tick(frame)
+        q = sim.active_quest
+        for lair in sim.lairs:
+            arcade.draw_text(f"{lair.guardians_needed}", lair.center_x, lair.center_y + 50, arcade.color.RED, 14,
+                             anchor_x="center")
+        arcade.draw_text(f"Квест: {q['text']} ({q['progress']}/{q['target']})", 500, 760,
+                         width=250, multiline=True, font_size=24, anchor_x='center')
+        arcade.draw_text(f"Монеты: {sim.coins}", 500, 25, arcade.color.GOLD, 24, anchor_x='center')
+        arcade.draw_text(f"Репутация: {sim.reputation}", 500, 60, arcade.color.GREEN, 24, anchor_x='center')
+        if frame % 60 == 0:
+            for _ in range(heals * 12):
+                arcade.Sprite(arcade.create_text_sprite("+", arcade.color.GREEN, 20).texture)
+
+    # Как GameView.setup_hud / update_hud (views здесь не импортируем - он тянет arcade.gui и ввод)
+    batch = pyglet.graphics.Batch()
+    quest_text = arcade.Text("", 500, 760, font_size=24, width=250, multiline=True, anchor_x='center', batch=batch)
+    coins_text = arcade.Text("", 500, 25, arcade.color.GOLD, 24, anchor_x='center', batch=batch)
+    rep_text = arcade.Text("", 500, 60, font_size=24, anchor_x='center', batch=batch)
+    lair_batch = pyglet.graphics.Batch()
+    lair_labels = [arcade.Text("", lair.center_x, lair.center_y + 50, arcade.color.RED, 14, anchor_x="center",
+                               batch=lair_batch) for lair in sim.lairs]
+
+    def cached(frame):
+        tick(frame)
+        q = sim.active_quest
+        set_text(quest_text, f"Квест: {q['text']} ({q['progress']}/{q['target']})")
+        set_text(coins_text, f"Монеты: {sim.coins}")
+        set_text(rep_text, f"Репутация: {sim.reputation}", arcade.color.GREEN)
+        for lair, label in zip(sim.lairs, lair_labels):
+            set_text(label, str(lair.guardians_needed))
+        lair_batch.draw()
+        batch.draw()
+        if frame % 60 == 0:
+            for _ in range(heals * 12):
+                TextParticle(0, 0, "+", arcade.color.GREEN)
+
+    results = {}
+    for name, draw in (('draw_text', legacy), ('кеш', cached)):
+        window.clear()
+        draw(0)  # прогрев шрифтов
+        start = time.perf_counter()
+        for frame in range(1, frames + 1):
+            draw(frame)
+        window.ctx.finish()
+        results[name] = (time.perf_counter() - start) / frames * 1000
+    print(f"Надписи: {lairs} логова + HUD, {heals} лечений в секунду, {frames} кадров")
+    print(f"  draw_text: {results['draw_text']:.2f} мс/кадр, {lairs + 3} отрисовок надписей")
+    print(f"  кеш: {results['кеш']:.2f} мс/кадр, 2 отрисовки пачек, текстур в кеше {text_texture.cache_info().currsize}")
+
+
+def bench_assets(frames=51):
+    """ Кадры заставки: загрузка подряд в главном потоке против AssetLoader (нужно окно) """
+    import arcade
+
+    try:
+        window = arcade.get_window()
+    except RuntimeError:
+        # На сервере без дисплея запускать с ARCADE_HEADLESS=1
+        window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, visible=False)
+    from assets import AssetLoader
+
+    paths = [f"images/start_menu/start_menu_{i:03d}.jpg" for i in range(frames)]
+
+    # Как раньше: всё в главном потоке, окно стоит до конца
+    atlas = arcade.DefaultTextureAtlas((2048, 2048))
+    start = time.perf_counter()
+    for path in paths:
+        atlas.add(arcade.load_texture(path))
+    window.ctx.finish()
+    t_sync = time.perf_counter() - start
+
+    # В фоне: первый кадр - группа 'menu', остальные следом; главный поток - только update() в кадрах.
+    # Атлас заранее нужного размера (51 кадр в размер экрана помещается в 8192x8192), кадры сразу в размер экрана
+    loader = AssetLoader()
+    loaded = []
+    size = (SCREEN_WIDTH, SCREEN_HEIGHT)
+    start = time.perf_counter()
+    loader.reserve_atlas((8192, 8192))
+    loader.texture(paths[0], loaded.append, 'menu', size=size)
+    for path in paths[1:]:
+        loader.texture(path, loaded.append, 'rest', size=size)
+    busy = time.perf_counter() - start
+    t_menu, updates, worst = None, 0, busy
+    while loader.queue:
+        s = time.perf_counter()
+        loader.update()
+        spent = time.perf_counter() - s
+        worst, busy, updates = max(worst, spent), busy + spent, updates + 1
+        if t_menu is None and loader.done('menu'):
+            t_menu = time.perf_counter() - start
+        time.sleep(1 / 120)  # остаток кадра
+    window.ctx.finish()
+    t_all = time.perf_counter() - start
+    loader.close()
+    assert len(loaded) == frames
+    print(f"Кадры заставки ({frames} шт.): подряд в главном потоке {t_sync:.2f} с")
+    print(f"  в фоне: первый кадр через {t_menu * 1000:.0f} мс, все через {t_all:.2f} с; "
+          f"главный поток занят {busy:.2f} с, худший кадр {worst * 1000:.0f} мс")
+
+
+def bench_frames(frames=51, steps=300):
+    """ Анимация меню: все кадры текстурами в атласе против FramePlayer из упакованного файла (нужно окно) """
+    import arcade
+
+    try:
+        window = arcade.get_window()
+    except RuntimeError:
+        # На сервере без дисплея запускать с ARCADE_HEADLESS=1
+        window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, visible=False)
+    from frames import FramePlayer, ensure_pack
+
+    rect = arcade.rect.LBWH(0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+
+    def play(step):
+        # Шаги анимации по 1/60 с: среднее и худшее время кадра в главном потоке (вместе с отрисовкой)
+        worst, total = 0.0, 0.0
+        for _ in range(steps):
+            s = time.perf_counter()
+            step()
+            window.ctx.finish()
+            spent = time.perf_counter() - s
+            worst, total = max(worst, spent), total + spent
+            time.sleep(max(0.0, 1 / 60 - spent))
+        return total / steps * 1000, worst * 1000
+
+    # Как раньше: каждый кадр - отдельная текстура, все живут в памяти и в атласе
+    start = time.perf_counter()
+    textures = [arcade.load_texture(f"images/start_menu/start_menu_{i:03d}.jpg") for i in range(frames)]
+    for texture in textures:
+        window.ctx.default_atlas.add(texture)
+    window.ctx.finish()
+    t_old = time.perf_counter() - start
+    old_bytes = sum(t.width * t.height * 4 for t in textures)
+    old_atlas = window.ctx.default_atlas.size
+    clock = SimpleNamespace(frame=0, timer=0.0)
+
+    def old_step():
+        clock.timer += 1 / 60
+        if clock.timer > 0.065:
+            clock.timer = 0
+            clock.frame = (clock.frame + 1) % frames
+        arcade.draw_texture_rect(textures[clock.frame], rect)
+
+    old_avg, old_worst = play(old_step)
+
+    # Проигрыватель: один кадр в атласе и несколько декодированных впереди
+    pack = ensure_pack('images/start_menu', 'images/start_menu.frames')  # сборка, если файла ещё нет
+    start = time.perf_counter()
+    player = FramePlayer(pack, frame_time=0.065)
+    player.draw(rect)
+    window.ctx.finish()
+    t_first = time.perf_counter() - start
+
+    def player_step():
+        player.update(1 / 60)
+        player.draw(rect)
+
+    new_avg, new_worst = play(player_step)
+    resident = (len(player.pending) + 1) * player.texture.width * player.texture.height * 4
+    print(f"Анимация меню ({frames} кадров), шаг анимации с отрисовкой на весь экран:")
+    print(f"  текстуры: готово через {t_old:.2f} с, в памяти {old_bytes / 2 ** 20:.0f} МБ, атлас {old_atlas}; "
+          f"кадр {old_avg:.2f} мс, худший {old_worst:.1f} мс")
+    print(f"  проигрыватель: первый кадр через {t_first * 1000:.0f} мс, в памяти ~{resident / 2 ** 20:.0f} МБ; "
+          f"кадр {new_avg:.2f} мс, худший {new_worst:.1f} мс, на кадре {player.index}")
+
+def bench_end_screens():
+    """ Ресурсы финальных экранов: загрузка при старте против AssetRegistry с прогревом в фоне (нужно окно) """
+    import arcade
+
+    try:
+        window = arcade.get_window()
+    except RuntimeError:
+        # На сервере без дисплея запускать с ARCADE_HEADLESS=1
+        window = arcade.Window(SCREEN_WIDTH, SCREEN_HEIGHT, visible=False)
+    from assets import AssetLoader, AssetRegistry
+    from frames import FramePlayer, ensure_pack
+
+    lose_pack = ensure_pack('images/lose_menu', 'images/lose_menu.frames')  # сборка, если файла ещё нет
+
+    def register(registry):
+        registry.sound('lose_music', 'sound/Giulio-Fazio-Wandering-Knight_lose_misic.mp3')
+        registry.sound('win_sound', 'sound/mixkit-medieval-show-fanfare-announcement-226.wav')
+        registry.texture('win_image', 'images/win.png', size=(SCREEN_WIDTH, SCREEN_HEIGHT))
+        registry.add('lose_animation', lambda: FramePlayer(lose_pack, frame_time=0.05),
+                     lambda player: player.resident_bytes, release=FramePlayer.release)
+        return registry
+
+    loader = AssetLoader()
+    loader.reserve_atlas(ATLAS_SIZE)  # как в игре: атлас уже нужного размера
+    names = ('lose_music', 'win_sound', 'win_image', 'lose_animation')
+
+    # Как раньше: всё загружается при старте, даже если до конца партии не дойдёт
+    start = time.perf_counter()
+    eager = register(AssetRegistry(loader))
+    for name in names:
+        eager[name].get()
+    t_eager = time.perf_counter() - start
+    eager_bytes = eager.used()
+    for name in names:
+        eager[name].evict()
+
+    # Лениво: при старте только описания; прогрев в фоне, когда конец партии близок
+    start = time.perf_counter()
+    lazy = register(AssetRegistry(loader))
+    t_lazy = time.perf_counter() - start
+    lazy_bytes = lazy.used()
+    lazy.warm(*names)
+    busy, worst = 0.0, 0.0
+    while loader.queue:
+        s = time.perf_counter()
+        loader.update()
+        spent = time.perf_counter() - s
+        busy, worst = busy + spent, max(worst, spent)
+        time.sleep(1 / 120)
+    window.ctx.finish()
+    start = time.perf_counter()
+    for name in names:
+        lazy[name].get()
+    t_get = time.perf_counter() - start
+    loader.close()
+    print("Финальные экраны (музыка поражения, фанфары, win.png, анимация поражения):")
+    print(f"  при старте: {t_eager * 1000:.0f} мс, в памяти {eager_bytes / 2 ** 20:.1f} МБ")
+    print(f"  лениво: при старте {t_lazy * 1000:.2f} мс и {lazy_bytes} байт; прогрев в фоне занял главный поток "
+          f"на {busy * 1000:.0f} мс (худший кадр {worst * 1000:.0f} мс), get() после прогрева {t_get * 1000:.2f} мс")
+
+
+BENCHMARKS = {
+    'get_stat': bench_get_stat,
+    'save': bench_save,
+    'load': bench_load,
+    'autosave': bench_autosave,
+    'enemy_turn': bench_enemy_turn,
+    'pathfinding': bench_pathfinding,
+    'click': bench_click,
+    'lairs': bench_lairs,
+    'headless': bench_headless,
+    'replay': bench_replay,
+    'profiler': bench_profiler,
+    'particles': bench_particles,
+    'text': bench_text,
+    'assets': bench_assets,
+    'frames': bench_frames,
+    'end_screens': bench_end_screens,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
@@ -0,0 +1,115 @@
+import arcade
+from arcade.gl import geometry
+
+from constants import *
+from fog import FOG_FRAGMENT_SHADER, load_fog_image
+from tilemap import GRID_VERTEX_SHADER, TILE_FRAGMENT_SHADER, TILE_IMAGES, TILE_TEXTURE_SIZE, build_tile_atlas
+
+
+class Chunk:
+    """ Буферы одного чанка на GPU: типы клеток и маска тумана """
+
+    def __init__(self, ctx, terrain, fog, cx, cy):
+        self.x0 = cx * CHUNK_SIZE
+        self.y0 = cy * CHUNK_SIZE
+        self.w = min(CHUNK_SIZE, terrain.width - self.x0)
+        self.h = min(CHUNK_SIZE, terrain.height - self.y0)
+        self.origin = (self.x0 * TILE_SIZE, self.y0 * TILE_SIZE)
+        self.types = ctx.texture((self.w, self.h), components=1, dtype='u1',
+                                 data=terrain.chunk_types(self.x0, self.y0, self.w, self.h),
+                                 filter=(ctx.NEAREST, ctx.NEAREST))
+        self.fog_mask = ctx.texture((self.w, self.h), components=1,
+                                    data=fog.chunk_mask(self.x0, self.y0, self.w, self.h),
+                                    filter=(ctx.NEAREST, ctx.NEAREST))
+
+    def update_fog(self, fog):
+        self.fog_mask.write(fog.chunk_mask(self.x0, self.y0, self.w, self.h))
+
+    def release(self):
+        self.types.delete()
+        self.fog_mask.delete()
+
+
+class ChunkManager:
+    """ Делит мир на чанки CHUNK_SIZE x CHUNK_SIZE, строит их буферы лениво и рисует только видимые """
+
+    def __init__(self, terrain, fog):
+        self.terrain = terrain
+        self.fog = fog
+        self.ctx = arcade.get_window().ctx
+        self.chunks_x = (terrain.width + CHUNK_SIZE - 1) // CHUNK_SIZE
+        self.chunks_y = (terrain.height + CHUNK_SIZE - 1) // CHUNK_SIZE
+        self.chunks = {}  # (cx, cy) -> Chunk
+        self.quad = geometry.quad_2d(size=(1, 1), pos=(0.5, 0.5))
+
+        self.tile_program = self.ctx.program(vertex_shader=GRID_VERTEX_SHADER,
+                                             fragment_shader=TILE_FRAGMENT_SHADER)
+        self.tile_program['tile_size'] = TILE_SIZE
+        self.tile_program['tile_types'] = 0
+        self.tile_program['tile_atlas'] = 1
+        self.tile_program['tile_count'] = len(TILE_IMAGES)
+        self.tile_program['half_texel'] = 0.5 / TILE_TEXTURE_SIZE
+        atlas = build_tile_atlas()
+        self.tile_atlas = self.ctx.texture(atlas.size, components=4, data=atlas.tobytes(),
+                                           wrap_x=self.ctx.CLAMP_TO_EDGE, wrap_y=self.ctx.CLAMP_TO_EDGE)
+
+        self.fog_program = self.ctx.program(vertex_shader=GRID_VERTEX_SHADER,
+                                            fragment_shader=FOG_FRAGMENT_SHADER)
+        self.fog_program['tile_size'] = TILE_SIZE
+        self.fog_program['fog_mask'] = 0
+        self.fog_program['fog_texture'] = 1
+        image = load_fog_image()
+        self.fog_texture = self.ctx.texture(image.size, components=4, data=image.tobytes(),
+                                            wrap_x=self.ctx.CLAMP_TO_EDGE, wrap_y=self.ctx.CLAMP_TO_EDGE)
+
+    def visible_chunks(self, camera):
+        """ Координаты чанков, пересекающих область, которую видит камера """
+        x, y = camera.position
+        size = CHUNK_SIZE * TILE_SIZE
+        cx0 = max(0, int((x + camera.left) // size))
+        cx1 = min(self.chunks_x - 1, int((x + camera.right) // size))
+        cy0 = max(0, int((y + camera.bottom) // size))
+        cy1 = min(self.chunks_y - 1, int((y + camera.top) // size))
+        return [(cx, cy) for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1)]
+
+    def get_chunk(self, key):
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.chunks[key] = Chunk(self.ctx, self.terrain, self.fog, *key)
+        return chunk
+
+    def _render(self, program, chunk, texture):
+        program['origin'] = chunk.origin
+        program['grid_size'] = (chunk.w, chunk.h)
+        texture.use(0)
+        self.quad.render(program)
+
+    def draw_terrain(self, camera):
+        self.tile_atlas.use(1)
+        for key in self.visible_chunks(camera):
+            chunk = self.get_chunk(key)
+            self._render(self.tile_program, chunk, chunk.types)
+
+    def draw_fog(self, camera):
+        # Маски перезаливаем только у построенных чанков; остальные возьмут актуальную альфу при постройке
+        for key in self.fog.dirty_chunks:
+            if key in self.chunks:
+                self.chunks[key].update_fog(self.fog)
+        self.fog.dirty_chunks.clear()
+
+        self.fog_texture.use(1)
+        with self.ctx.enabled(self.ctx.BLEND):
+            for key in self.visible_chunks(camera):
+                chunk = self.get_chunk(key)
+                self._render(self.fog_program, chunk, chunk.fog_mask)
+
+    def evict(self, camera, heroes):
+        """ Выгружает чанки вне экрана, далёкие от всех героев """
+        keep = set(self.visible_chunks(camera))
+        hero_chunks = [(int(h.center_x // TILE_SIZE) // CHUNK_SIZE, int(h.center_y // TILE_SIZE) // CHUNK_SIZE)
+                       for h in heroes]
+        for key in list(self.chunks):
+            if key in keep:
+                continue
+            if all(max(abs(key[0] - hx), abs(key[1] - hy)) > CHUNK_KEEP_RADIUS for hx, hy in hero_chunks):
+                self.chunks.pop(key).release()
@@ -2,12 +2,33 @@
 SCREEN_WIDTH = 1000
 SCREEN_HEIGHT = 800
 SCREEN_TITLE = "D&D Arcade RPG"
+ATLAS_SIZE = (4096, 4096)  # общий атлас текстур сразу такого размера, чтобы не расти по ходу игры
 
 # --- НАСТРОЙКИ МИРА ---
 TILE_SIZE = 120
 GRID_WIDTH = 50
 GRID_HEIGHT = 50
 
+# --- ТИПЫ КЛЕТОК МИРА ---
+TERRAIN_MEADOW = 0
+TERRAIN_FOREST = 1
+TERRAIN_TOWN = 2
+TERRAIN_BAR = 3
+TERRAIN_NAMES = ('meadow', 'forest', 'town', 'bar')
+
+# --- ЧАНКИ (отрисовка больших карт) ---
+CHUNK_SIZE = 16  # клеток по стороне чанка
+CHUNK_KEEP_RADIUS = 3  # чанки дальше этого (в чанках) от всех героев и вне экрана выгружаются
+
+# --- ЛОГОВА ---
+LAIR_ACTIVATION_RADIUS = 5  # стражи выходят, когда герой ближе этого (в клетках)
+
+# --- АВТОСОХРАНЕНИЕ ---
+AUTOSAVE_EVERY_N_TURNS = 5  # 0 - только ручное сохранение по F5
+
+# --- ФИНАЛЬНЫЕ ЭКРАНЫ ---
+WARM_BOSS_HP = 0.3  # доля здоровья босса, с которой экран победы заранее грузится в фоне
+
 # --- СКОРОСТИ ---
 CAMERA_SPEED = 30
 ENEMY_MOVE_SPEED = 15
@@ -115,7 +136,7 @@ BOSS_VAMPIRE = {"name": "Лорд Дракулас",
     "hp": 1,  # в игре поменяем на сумму хп всех героев * 2
     "abilities": [
         {"name": "Кровавый укус",
-         "effect": "target['hp'] -= hero['dexterity'] - target['strength'];hero['hp'] += 5;buff('hero', 'max_hp' 2, 2)",
+         "effect": "target['hp'] -= hero['dexterity'] - target['strength'];hero['hp'] += 5;buff('hero', 'max_hp', 2, 2)",
          "description": "Кусает противника"},
         {"name": "Облако летучих мышей",
          "effect": "buff('target', 'hp', -10, 1);buff('target', 'max_hp', -6, 4)",
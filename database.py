@@ -1,6 +1,8 @@
 import sqlite3
+import itertools
 import json
 import os
+from collections import namedtuple
 
 
 DB_NAME = "gamedata.db"
@@ -80,19 +82,133 @@ def init_db():
             )
         ''')
 
+    # Лог партии для воспроизведения: герои на старте и команды по порядку (дописываются дельтами)
+    cursor.execute('''
+            CREATE TABLE IF NOT EXISTS replays (
+                map_id INTEGER PRIMARY KEY,
+                heroes_json TEXT,
+                FOREIGN KEY (map_id) REFERENCES game_state (id) ON DELETE CASCADE
+            )
+        ''')
+    cursor.execute('''
+            CREATE TABLE IF NOT EXISTS replay_events (
+                map_id INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                event_json TEXT,
+                PRIMARY KEY (map_id, seq),
+                FOREIGN KEY (map_id) REFERENCES game_state (id) ON DELETE CASCADE
+            )
+        ''')
+
+    # Индексы для выборки/удаления по сохранению и каскадного удаления инвентаря
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_entities_map ON entities (map_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_lairs_map ON lairs (map_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_inventory_entity ON inventory (entity_id)')
+
     conn.commit()
     conn.close()
 
 def get_connection():
     conn = sqlite3.connect(DB_NAME)
     conn.execute("PRAGMA foreign_keys = ON")  # Включаем поддержку связей
+    conn.execute("PRAGMA journal_mode = WAL")  # Чтение списка сохранений не ждёт запись
     return conn
 
 
+# Снимок мира для сохранения: только копии данных, без ссылок на спрайты
+# replay - (герои в json, номер первого события, события начиная с него) или None,
+# если партию нельзя проиграть заново; в базе лог только дописывается, поэтому хватает хвоста
+GameSnapshot = namedtuple('GameSnapshot', 'world entities lairs replay', defaults=(None,))
+# key - номер сущности, один на всю её жизнь в кеше снимков: по нему запись находит её строку в базе
+EntitySnapshot = namedtuple('EntitySnapshot', 'name role x y stats effects abilities '
+                                              'is_guardian is_boss image_path inventory key')
+LairSnapshot = namedtuple('LairSnapshot', 'x y guardians_needed next_spawn_interval guardians_spawned')
+
+
+_entity_keys = itertools.count(1)
+
+
+def _snapshot_entity(entity, key=None):
+    return EntitySnapshot(
+        entity.name, entity.role, entity.center_x, entity.center_y, dict(entity.stats_dict),
+        tuple(dict(effect) for effect in entity.active_effects), tuple(entity.abilities),
+        getattr(entity, 'is_guardian', False), getattr(entity, 'is_boss', False), entity.image_path,
+        tuple(_item_fields(item) for item in getattr(entity, 'inventory', [])),
+        next(_entity_keys) if key is None else key)
+
+
+def snapshot_game(world, heroes, enemies, lairs, replay=None, cache=None):
+    """
+    Дешёвая копия состояния игры; делается в главном потоке, пишется потом хоть в другом.
+    cache - словарь между вызовами: сущность копируется заново, только если сдвинулись её счётчики
+    изменений (stats_version, effects_version, abilities_version; покупка предмета двигает stats_version),
+    иначе берётся прошлая копия, при необходимости с новыми координатами. Погибшие из cache выбрасываются
+    """
+    world = dict(world)
+    if world.get('quest'):
+        world['quest'] = dict(world['quest'])
+    if cache is None:
+        entities = tuple(_snapshot_entity(entity) for entity in [*heroes, *enemies])
+    else:
+        fresh = {}
+        for entity in [*heroes, *enemies]:
+            # Счётчики только растут, поэтому по их сумме видно, менялось ли хоть что-то
+            version = entity.stats_version + entity.effects_version + entity.abilities_version
+            cached = cache.get(entity)
+            if cached is None or cached[0] != version:
+                cached = (version, _snapshot_entity(entity, cached and cached[1].key))
+            elif cached[1].x != entity.center_x or cached[1].y != entity.center_y:
+                cached = (version, cached[1]._replace(x=entity.center_x, y=entity.center_y))
+            fresh[entity] = cached
+        cache.clear()
+        cache.update(fresh)
+        entities = tuple(snapshot for _, snapshot in fresh.values())
+    lairs = tuple(LairSnapshot(lair.center_x, lair.center_y, lair.guardians_needed,
+                               lair.next_spawn_interval, lair.guardians_spawned) for lair in lairs)
+    return GameSnapshot(world, entities, lairs, replay)
+
+
 def save_game_state(world, heroes, enemies, lairs):
-    conn = get_connection()
+    save_snapshot(snapshot_game(world, heroes, enemies, lairs))
+
+
+def save_snapshot(snapshot, conn=None, encoded=None):
+    """
+    Пишет снимок одной транзакцией; conn - своё соединение (например, потока автосохранения),
+    encoded - словарь между записями: строки сущностей, чьи копии не менялись, не пишутся заново
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = get_connection()
+    conn.isolation_level = None  # транзакцией управляем сами: всё сохранение - один BEGIN/COMMIT
     cursor = conn.cursor()
+    try:
+        cursor.execute('BEGIN')
+        save_id = _write_world(cursor, snapshot.world)
+        written = _write_entities(cursor, save_id, snapshot.entities, encoded)
+        cursor.executemany('''
+            INSERT INTO lairs (x, y, guardians_needed, next_spawn_interval, guardians_spawned, map_id)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(lair.x, lair.y, lair.guardians_needed, lair.next_spawn_interval,
+               1 if lair.guardians_spawned else 0, save_id) for lair in snapshot.lairs])
+        _write_replay(cursor, save_id, snapshot.replay)
+        cursor.execute('COMMIT')
+        if encoded is not None:
+            # Только после COMMIT: иначе после отката следующая запись сочла бы строки уже записанными
+            encoded.clear()
+            encoded.update(written)
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+    print("Игра сохранена!")
+    return save_id
 
+
+def _write_world(cursor, world):
+    """ Находит или создаёт запись сохранения и очищает её старые логова (сущности обновляет _write_entities) """
     name = world.get('name')
     time_created = world.get('time_of_creation')
 
@@ -103,11 +219,11 @@ def save_game_state(world, heroes, enemies, lairs):
 
     if row:
         save_id = row[0]
-        # Очищаем старые данные сущностей и логов для этого ID
-        cursor.execute('DELETE FROM entities WHERE map_id = ?', (save_id,))
+        # Логов мало, их проще переписать целиком
         cursor.execute('DELETE FROM lairs WHERE map_id = ?', (save_id,))
-        # Обновляем сид (на всякий случай)
-        cursor.execute('UPDATE game_state SET map_seed = ? WHERE id = ?', (world.get('seed'), save_id))
+        cursor.execute('UPDATE game_state SET map_seed = ?, coins = ?, reputation = ?, quest = ? WHERE id = ?',
+                       (world.get('seed'), world.get('coins'), world.get('rep'),
+                        json.dumps(world.get('quest')), save_id))
     else:
         # Создаем новую запись
         cursor.execute('''INSERT INTO game_state (map_seed, name, time_of_creation,
@@ -115,46 +231,103 @@ def save_game_state(world, heroes, enemies, lairs):
                        (world.get('seed'), name, time_created,
                         world.get('coins'), world.get('rep'), json.dumps(world.get('quest'))))
         save_id = cursor.lastrowid
+    return save_id
 
-    # Сохраняем сущности
-    all_entities = [*heroes, *enemies]
-    for entity in all_entities:
-        cursor.execute('''
-            INSERT INTO entities (name, role, x, y, stats_json, effects_json, abilities_json,
-             is_guardian, is_boss, image_path, map_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (entity.name, entity.role, entity.center_x, entity.center_y,
-              json.dumps(entity.stats_dict), json.dumps(entity.active_effects),
-              json.dumps(entity.abilities), 1 if getattr(entity, 'is_guardian', False) else 0,
-              1 if getattr(entity, 'is_boss', False) else 0, entity.image_path, save_id))
-        entity_db_id = cursor.lastrowid
-        for item in getattr(entity, 'inventory', []):
-            # 1. Добавляем предмет в справочник, если его там нет (по имени)
-            cursor.execute('''
-                        INSERT OR IGNORE INTO items (name, image_path, price, stats_json, abilities_json)
-                        VALUES (?, ?, ?, ?, ?)
-                    ''', (item.name, item.image_path, getattr(item, 'price', 0),
-                          json.dumps(getattr(item, 'stats_dict', {})),
-                          json.dumps(getattr(item, 'abilities', []))))
-
-            # Получаем ID предмета
-            cursor.execute('SELECT id FROM items WHERE name = ?', (item.name,))
-            item_id = cursor.fetchone()[0]
-
-            # 2. Создаем связь в таблице inventory
-            cursor.execute('INSERT INTO inventory (entity_id, item_id) VALUES (?, ?)',
-                           (entity_db_id, item_id))
-
-    for lair in lairs:
-        cursor.execute('''
-            INSERT INTO lairs (x, y, guardians_needed, next_spawn_interval, guardians_spawned, map_id)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (lair.center_x, lair.center_y, lair.guardians_needed, lair.next_spawn_interval,
-              1 if lair.guardians_spawned else 0, save_id))
 
-    conn.commit()
-    conn.close()
-    print("Игра сохранена!")
+def _write_entities(cursor, save_id, entities, encoded=None):
+    """
+    Пишет сущности поверх прошлой записи: строка каждой сущности обновляется по её id (INSERT ... ON CONFLICT),
+    неизменённые копии не пишутся вовсе, удаляются только строки погибших. Возвращает новое содержимое encoded
+    """
+    known = encoded if encoded is not None else {}
+    cursor.execute('SELECT id FROM entities WHERE map_id = ? ORDER BY id', (save_id,))
+    stored = [row[0] for row in cursor.fetchall()]
+    stored_set = set(stored)
+    claimed = set()
+    for entity in entities:
+        cached = known.get(entity.key)
+        if cached is not None and cached[5] == save_id:
+            claimed.add(cached[4])
+    # Строки, чьих сущностей мы не знаем (погибшие, или сохранение загружено из базы и ещё не писалось):
+    # их забирают новые сущности по порядку, остаток удаляется. После загрузки порядок сущностей - порядок id,
+    # так что первая запись попадает каждой сущностью в её же строку
+    free = iter([row_id for row_id in stored if row_id not in claimed])
+    # id новых строк раздаём сами, чтобы сразу связать с ними инвентарь без lastrowid на каждую строку
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM entities')
+    new_ids = itertools.count(cursor.fetchone()[0] + 1)
+
+    cursor.execute('SELECT name, id FROM items')
+    item_ids = dict(cursor.fetchall())
+
+    entity_rows = []
+    inventory_rows = []
+    fresh = {}
+    for entity in entities:
+        cached = known.get(entity.key)
+        if cached is not None and cached[5] == save_id and cached[4] in stored_set:
+            if cached[0] is entity:
+                fresh[entity.key] = cached  # копия та же (snapshot_game взял её из кеша) - строка в базе уже такая
+                continue
+            entity_id = cached[4]
+        else:
+            entity_id = next(free, None) or next(new_ids)
+        if cached is None or cached[0].stats is not entity.stats:
+            # Копия лишь сдвинулась (snapshot_game оставил ей словари прошлой) - json тот же
+            cached = (entity, json.dumps(entity.stats), json.dumps(entity.effects), json.dumps(entity.abilities))
+        cached = (entity,) + cached[1:4] + (entity_id, save_id)
+        fresh[entity.key] = cached
+        entity_rows.append((entity_id, entity.name, entity.role, entity.x, entity.y,
+                            cached[1], cached[2], cached[3], 1 if entity.is_guardian else 0,
+                            1 if entity.is_boss else 0, entity.image_path, save_id))
+        for name, image_path, price, stats, abilities in entity.inventory:
+            # Предмет добавляем в справочник, только если его там ещё нет (по имени)
+            if name not in item_ids:
+                cursor.execute('''
+                    INSERT INTO items (name, image_path, price, stats_json, abilities_json)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (name, image_path, price, json.dumps(stats), json.dumps(abilities)))
+                item_ids[name] = cursor.lastrowid
+            inventory_rows.append((entity_id, item_ids[name]))
+
+    # Строки погибших; их инвентарь удалится каскадом
+    cursor.executemany('DELETE FROM entities WHERE id = ?', [(row_id,) for row_id in free])
+    cursor.executemany('''
+        INSERT INTO entities (id, name, role, x, y, stats_json, effects_json, abilities_json,
+         is_guardian, is_boss, image_path, map_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET name = excluded.name, role = excluded.role, x = excluded.x,
+         y = excluded.y, stats_json = excluded.stats_json, effects_json = excluded.effects_json,
+         abilities_json = excluded.abilities_json, is_guardian = excluded.is_guardian,
+         is_boss = excluded.is_boss, image_path = excluded.image_path, map_id = excluded.map_id
+    ''', entity_rows)
+    # Инвентарь переписанных сущностей собираем заново
+    cursor.executemany('DELETE FROM inventory WHERE entity_id = ?', [(row[0],) for row in entity_rows])
+    cursor.executemany('INSERT INTO inventory (entity_id, item_id) VALUES (?, ?)', inventory_rows)
+    return fresh
+
+def _write_replay(cursor, save_id, replay):
+    """ Лог партии: в базу дописываются только события, которых там ещё нет """
+    if replay is None:
+        cursor.execute('DELETE FROM replay_events WHERE map_id = ?', (save_id,))
+        cursor.execute('DELETE FROM replays WHERE map_id = ?', (save_id,))
+        return
+    heroes_json, first, events = replay
+    cursor.execute('INSERT OR IGNORE INTO replays (map_id, heroes_json) VALUES (?, ?)', (save_id, heroes_json))
+    cursor.execute('SELECT COUNT(*) FROM replay_events WHERE map_id = ?', (save_id,))
+    stored = cursor.fetchone()[0]
+    if stored < first:
+        raise ValueError(f"в логе сохранения {stored} событий, а снимок начинается с {first}")
+    cursor.executemany('INSERT INTO replay_events (map_id, seq, event_json) VALUES (?, ?, ?)',
+                       [(save_id, seq, json.dumps(event, ensure_ascii=False))
+                        for seq, event in enumerate(events[stored - first:], start=stored)])
+
+def _item_fields(item):
+    """ Поля предмета: ShopItem из магазина или словарь, пришедший из load_game_state """
+    if isinstance(item, dict):
+        return (item['name'], item.get('image_path'), item.get('price', 0),
+                item.get('stats', {}), item.get('abilities', []))
+    return (item.name, item.image_path, getattr(item, 'price', 0),
+            getattr(item, 'stats_dict', {}), getattr(item, 'abilities', []))
 
 def get_recent_saves(limit=5):
     """ Возвращает последние сохранения """
@@ -182,38 +355,45 @@ def load_game_state(save_id):
     world['rep'] = row[2]
     world['quest'] = json.loads(row[3])
 
-    cursor.execute('''SELECT name, role, x, y, stats_json, effects_json, abilities_json,
-     is_guardian, is_boss, image_path FROM entities WHERE map_id = ?''', (save_id,))
-    entities_rows = cursor.fetchall()
-    entities_data = []
-
-    for r in entities_rows:
-        entity_id = r[0]
-        # Для каждой сущности тянем её предметы через JOIN
-        cursor.execute('''
-                SELECT i.name, i.image_path, i.price, i.stats_json, i.abilities_json
-                FROM items i
-                JOIN inventory inv ON i.id = inv.item_id
-                WHERE inv.entity_id = ?
-            ''', (entity_id,))
-
-        items_data = [{
-            'name': ir[0], 'image_path': ir[1], 'price': ir[2],
-            'stats': json.loads(ir[3]), 'abilities': json.loads(ir[4])
-        } for ir in cursor.fetchall()]
-        entities_data.append({
-            'name': r[0], 'role': r[1], 'x': r[2], 'y': r[3],
-            'stats': json.loads(r[4]), 'effects': json.loads(r[5]),
-            'abilities': json.loads(r[6]), 'is_guardian': bool(r[7]), 'is_boss': bool(r[8]),
-            'image_path': r[9],
-            'inventory': items_data  # Добавляем список предметов в данные сущности
+    # Весь инвентарь сохранения одним запросом, раскладываем по id сущностей
+    cursor.execute('''
+        SELECT inv.entity_id, i.name, i.image_path, i.price, i.stats_json, i.abilities_json
+        FROM inventory inv
+        JOIN items i ON i.id = inv.item_id
+        JOIN entities e ON e.id = inv.entity_id
+        WHERE e.map_id = ?
+        ORDER BY inv.id
+    ''', (save_id,))
+    inventories = {}
+    for ir in cursor.fetchall():
+        inventories.setdefault(ir[0], []).append({
+            'name': ir[1], 'image_path': ir[2], 'price': ir[3],
+            'stats': json.loads(ir[4]), 'abilities': json.loads(ir[5])
         })
 
+    cursor.execute('''SELECT id, name, role, x, y, stats_json, effects_json, abilities_json,
+     is_guardian, is_boss, image_path FROM entities WHERE map_id = ? ORDER BY id''', (save_id,))
+    entities_data = [{
+        'name': r[1], 'role': r[2], 'x': r[3], 'y': r[4],
+        'stats': json.loads(r[5]), 'effects': json.loads(r[6]),
+        'abilities': json.loads(r[7]), 'is_guardian': bool(r[8]), 'is_boss': bool(r[9]),
+        'image_path': r[10],
+        'inventory': inventories.get(r[0], [])
+    } for r in cursor.fetchall()]
+
     cursor.execute('SELECT x, y, guardians_needed, next_spawn_interval, guardians_spawned FROM lairs WHERE map_id = ?', (save_id,))
     lairs_data = [{
         'x': r[0], 'y': r[1], 'guardians_needed': r[2],
         'next_spawn_interval': r[3], 'guardians_spawned': bool(r[4])
     } for r in cursor.fetchall()]
 
+    # Лог для воспроизведения (есть только у партий, начатых с нуля)
+    replay = None
+    cursor.execute('SELECT heroes_json FROM replays WHERE map_id = ?', (save_id,))
+    row = cursor.fetchone()
+    if row:
+        cursor.execute('SELECT event_json FROM replay_events WHERE map_id = ? ORDER BY seq', (save_id,))
+        replay = {'heroes': json.loads(row[0]), 'events': [json.loads(r[0]) for r in cursor.fetchall()]}
+
     conn.close()
-    return {'world': world, 'entities': entities_data, 'lairs': lairs_data}
\ No newline at end of file
+    return {'world': world, 'entities': entities_data, 'lairs': lairs_data, 'replay': replay}
\ No newline at end of file
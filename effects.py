@@ -1,33 +1,118 @@
 import arcade
-from random import randint, uniform
+import numpy as np
+from pyglet import gl
+from random import randint
 import math
 
-class Particle(arcade.SpriteCircle):
-    """ Базовый класс для простых эффектов-точек """
-    def __init__(self, x, y, color, change_x, change_y, fade_speed=5, gravity=0):
-        super().__init__(radius=3, color=color)
-        self.center_x = x
-        self.center_y = y
-        self.change_x = change_x
-        self.change_y = change_y
-        self.fade_speed = fade_speed
-        self.gravity = gravity
+from text_cache import text_texture
+
+MAX_PARTICLES = 4096  # живых частиц-точек одновременно; новые вытесняют самые старые
+PARTICLE_SIZE = 6  # диаметр точки в пикселях
+# Скорости эффектов заданы в пикселях за кадр (как change_x у спрайтов) - в массивах они в секунду
+FRAME_RATE = 60
+
+PARTICLE_VERTEX_SHADER = """
+#version 330
+uniform WindowBlock {
+    mat4 projection;
+    mat4 view;
+} window;
+
+uniform float point_size;
+
+in vec2 in_pos;
+in vec4 in_color;
+out vec4 v_color;
+
+void main() {
+    gl_Position = window.projection * window.view * vec4(in_pos, 0.0, 1.0);
+    gl_PointSize = point_size;
+    v_color = in_color;
+}
+"""
+
+PARTICLE_FRAGMENT_SHADER = """
+#version 330
+in vec4 v_color;
+out vec4 f_color;
+
+void main() {
+    // Квадратная точка -> круг
+    if (length(gl_PointCoord - vec2(0.5)) > 0.5) discard;
+    f_color = v_color;
+}
+"""
+
+
+class ParticleSystem:
+    """
+    Частицы-точки в массивах NumPy фиксированного размера: кольцевой буфер на MAX_PARTICLES,
+    обновление всех частиц одной векторной операцией и отрисовка одним буфером GL_POINTS
+    """
+
+    def __init__(self, capacity=MAX_PARTICLES):
+        self.capacity = capacity
+        # x, y, r, g, b, a - ровно в таком виде строки уходят в буфер вершин
+        self.vertices = np.zeros((capacity, 6), dtype='f4')
+        self.velocity = np.zeros((capacity, 2), dtype='f4')
+        self.fade = np.zeros(capacity, dtype='f4')  # альфа (0..1) в секунду
+        self.gravity = np.zeros(capacity, dtype='f4')
+        self.head = 0  # сюда ляжет следующая частица
+        self.rng = np.random.default_rng()
+        self._geometry = None
+
+    def __len__(self):
+        return int(np.count_nonzero(self.vertices[:, 5] > 0))
+
+    def emit(self, x, y, velocity, color, alpha=255, fade_speed=5, gravity=0):
+        """
+        Частицы из точек x, y (числа или массивы) со скоростями velocity (массив n x 2) в пикселях за кадр.
+        fade_speed - сколько альфы (0..255) теряется за кадр, gravity - как у спрайтов
+        """
+        n = min(len(velocity), self.capacity)
+        idx = (self.head + np.arange(n)) % self.capacity
+        self.head = (self.head + n) % self.capacity
+        rows = self.vertices[idx]
+        rows[:, 0] = x if np.isscalar(x) else x[:n]
+        rows[:, 1] = y if np.isscalar(y) else y[:n]
+        rows[:, 2:5] = np.asarray(color[:3], dtype='f4') / 255
+        rows[:, 5] = alpha / 255
+        self.vertices[idx] = rows
+        self.velocity[idx] = np.asarray(velocity[:n], dtype='f4') * FRAME_RATE
+        self.fade[idx] = fade_speed * FRAME_RATE / 255
+        self.gravity[idx] = gravity * FRAME_RATE
 
     def update(self, delta_time):
-        super().update()
-        self.change_y -= self.gravity * delta_time
-        self.center_x += self.change_x * delta_time
-        self.center_y += self.change_y * delta_time
-        self.alpha -= self.fade_speed
-        if self.alpha <= 0:
-            self.remove_from_sprite_lists()
+        self.velocity[:, 1] -= self.gravity * delta_time
+        self.vertices[:, :2] += self.velocity * delta_time
+        alpha = self.vertices[:, 5]
+        alpha -= self.fade * delta_time
+        np.maximum(alpha, 0, out=alpha)
+
+    def draw(self):
+        live = self.vertices[self.vertices[:, 5] > 0]
+        if not len(live):
+            return
+        ctx = arcade.get_window().ctx
+        if self._geometry is None:
+            self._program = ctx.program(vertex_shader=PARTICLE_VERTEX_SHADER,
+                                        fragment_shader=PARTICLE_FRAGMENT_SHADER)
+            self._program['point_size'] = PARTICLE_SIZE
+            self._buffer = ctx.buffer(reserve=self.vertices.nbytes)
+            self._geometry = ctx.geometry(
+                [arcade.gl.BufferDescription(self._buffer, '2f 4f', ['in_pos', 'in_color'])],
+                mode=ctx.POINTS)
+        self._buffer.write(live.tobytes())
+        # Размер точки задаёт шейдер (gl_PointSize), это нужно включить явно
+        with ctx.enabled(ctx.BLEND, gl.GL_PROGRAM_POINT_SIZE):
+            self._geometry.render(self._program, vertices=len(live))
+
 
 class TextParticle(arcade.Sprite):
     """ Класс для текстовых эффектов (например, зеленые плюсики) """
     def __init__(self, x, y, text, color, change_y=1.5, fade_speed=4):
-        # Создаем текстуру из текста
-        texture = arcade.create_text_sprite(text, color, font_size=20).texture
-        super().__init__(texture)
+        # Текстура общая для всех одинаковых надписей
+        super().__init__(text_texture(text, color, 20))
         self.center_x = x
         self.center_y = y
         self.change_y = change_y * 15
@@ -41,21 +126,20 @@ class TextParticle(arcade.Sprite):
 
 class EffectManager:
     def __init__(self):
-        self.particles = arcade.SpriteList()
+        self.points = ParticleSystem()
+        self.particles = arcade.SpriteList()  # текстовые частицы
+
+    def _burst(self, count, angle_from, angle_to, speed_from, speed_to):
+        """ Скорости count частиц, разлетающихся в секторе углов """
+        rng = self.points.rng
+        angle = rng.uniform(angle_from, angle_to, count)
+        speed = rng.uniform(speed_from, speed_to, count)
+        return np.column_stack((np.cos(angle) * speed, np.sin(angle) * speed))
 
     def add_damage_effect(self, x, y):
         """ Красные капельки разлетаются в стороны """
-        for _ in range(randint(10, 15)):
-            angle = uniform(0, 2 * math.pi)
-            speed = uniform(2, 5)
-            p = Particle(
-                x, y,
-                color=arcade.color.RED,
-                change_x=math.cos(angle) * speed,
-                change_y=math.sin(angle) * speed,
-                fade_speed=7
-            )
-            self.particles.append(p)
+        self.points.emit(x, y, self._burst(randint(10, 15), 0, 2 * math.pi, 2, 5),
+                         arcade.color.RED, fade_speed=7)
 
     def add_heal_effect(self, x, y):
         """ Зеленые плюсики поднимаются вверх """
@@ -65,35 +149,27 @@ class EffectManager:
 
     def add_walk_effect(self, x, y):
         """ Пыль под ногами при ходьбе """
-        p = Particle(
-            x + uniform(-10, 10),
-            y + 10,  # Чуть выше нижней части персонажа
-            color=arcade.color.LIGHT_GRAY,
-            change_x=uniform(-0.5, 0.5),
-            change_y=uniform(0.1, 1),
-            fade_speed=10
-        )
-        p.alpha = 150
-        self.particles.append(p)
+        self.add_walk_effects((x,), (y,))
+
+    def add_walk_effects(self, xs, ys):
+        """ Пыль сразу под всеми идущими: одна вставка в буфер за кадр """
+        rng = self.points.rng
+        n = len(xs)
+        velocity = np.column_stack((rng.uniform(-0.5, 0.5, n), rng.uniform(0.1, 1, n)))
+        self.points.emit(np.asarray(xs, dtype='f4') + rng.uniform(-10, 10, n),
+                         np.asarray(ys, dtype='f4') + 10,  # Чуть выше нижней части персонажа
+                         velocity, arcade.color.LIGHT_GRAY, alpha=150, fade_speed=10)
 
     def add_buy_effect(self, x, y):
         """ Эффект вылета монет по параболе """
-        for _ in range(randint(20, 25)):
-            # Монетки летят вверх под крутым углом
-            angle = uniform(math.pi * 0.3, math.pi * 0.7)
-            speed = uniform(4, 8)
-            p = Particle(
-                x, y,
-                color=arcade.color.GOLD,
-                change_x=math.cos(angle) * speed,
-                change_y=math.sin(angle) * speed,
-                fade_speed=3,  # Сделал затухание медленнее, чтобы успели упасть
-                gravity=10  # Добавляем гравитацию
-            )
-            self.particles.append(p)
+        # Монетки летят вверх под крутым углом; затухают медленно, чтобы успели упасть
+        self.points.emit(x, y, self._burst(randint(20, 25), math.pi * 0.3, math.pi * 0.7, 4, 8),
+                         arcade.color.GOLD, fade_speed=3, gravity=10)
 
     def update(self, delta_time):
+        self.points.update(delta_time)
         self.particles.update(delta_time)
 
     def draw(self):
-        self.particles.draw()
\ No newline at end of file
+        self.points.draw()
+        self.particles.draw()
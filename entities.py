@@ -6,12 +6,14 @@ import base64
 from io import BytesIO
 from collections import deque
 from constants import *
-from game_logic import apply_ability
+from simulation import ItemState, LairState, Unit, cell_center
 from PIL import Image
 
 
-class Entity(arcade.Sprite):
-    def __init__(self, filename=None, role="enemy", stats_dict=None, json_data=None):
+class Entity(arcade.Sprite, Unit):
+    """ Спрайт сущности: данные и правила - в Unit, здесь картинка и анимации """
+
+    def __init__(self, filename=None, role="enemy", stats_dict=None, json_data=None, rng=random):
         self.image_path = filename or "images/hero_1.jpg"
         # Если есть json_data, пытаемся загрузить картинку
         if json_data and "image_b64" in json_data and json_data["image_b64"]:
@@ -29,129 +31,30 @@ class Entity(arcade.Sprite):
         else:
             super().__init__(filename or "images/hero_1.jpg")
 
+        Unit.__init__(self, self.image_path, role, stats_dict, json_data, rng)
         self.width = 120
         self.height = 120
-        self.role = role
-        # Приоритет: явно переданный словарь (например из сохранения) > json > дефолт
-        self.stats_dict = stats_dict if stats_dict else {}
-        self.active_effects = []
-        self.abilities = []
         self.anim_phase = None  # "forward", "back", None
         self.anim_start_pos = None
         self.anim_timer = 0
         self.anim_duration = 0.2  # Длительность одной фазы в секундах
-        self.inventory = []
 
         # Анимация тряски (Урон)
         self.shake_timer = 0
 
-        # Флаг для загрузки сохранения (чтобы не сбрасывать HP)
-        is_loaded_from_save = stats_dict is not None and 'hp' in stats_dict
-
-        if json_data:
-            self.load_from_json(json_data, skip_stats=is_loaded_from_save)
-
-        self.set_full_stats()
-
-        self.selected_ability = None
-
         self.path_queue = deque()
         self.is_moving = False
 
-    def load_from_json(self, data, skip_stats=False):
-        """ Инициализация на основе JSON """
-        self.name = data.get("name", "Unknown")
-
-        if not skip_stats:
-            self.stats_dict = {
-                'max_hp': data.get("hp", 10),
-                'level': data.get("level", 1),
-            }
-            if "stats" in data:
-                self.stats_dict.update(data["stats"])
-
-        self.set_full_stats()
-
-
-        # Применяем Race/Class только если это новая игра (не из сохранения)
-        if not skip_stats:
-            if 'race' in data:
-                try:
-                    self.race = data['race']
-                    apply_ability(self, self, self.race[1])
-                except:
-                    pass
-
-            if "class" in data:
-                try:
-                    self.cls = data['class']
-                    apply_ability(self, self, self.cls[1])
-                except:
-                    pass
-
-        if "abilities" in data:
-            self.abilities = data["abilities"]
+    def walk(self, steps):
+        """ Путь проигрывается в update_position, клетка назначения занята сразу """
+        for sx, sy in steps:
+            self.path_queue.append(cell_center(sx, sy))
+        if steps:
+            self.claim_cell(steps[-1])
 
-    def __setitem__(self, key, value):
-        self.stats_dict[key] = value
-
-    def __getitem__(self, item):
-        return self.stats_dict[item]
-
-    def get_stat(self, stat_name):
-        base = self.stats_dict.get(stat_name, 0)
-        bonus = 0
-        for effect in self.active_effects:
-            if effect['stat'] == stat_name:
-                bonus += effect['value']
-        return (base + bonus, bonus, base)
-
-    def get_as_dict(self):
-        res = {}
-        for key in self.stats_dict:
-            res[key] = self.get_stat(key)[0]
-        res['role'] = self.role
-        return res
-
-    def set_full_stats(self):
-        for param1, param2 in EXTEND_PARAMS.items():
-            if param1 in self.stats_dict:
-                continue
-            if param2.isdigit():
-                self.stats_dict[param1] = int(param2)
-            else:
-                self.stats_dict[param1] = self.stats_dict.get(param2, 0)
-
-    def add_effect(self, stat, value, duration):
-        self.active_effects.append({
-            'stat': stat, 'value': value, 'duration': duration
-        })
-
-    def equip_item(self, item):
-        """ Применение статов и способностей предмета """
-        # 1. Суммируем статы
-        for stat, value in item.stats_dict.items():
-            current_val = self.stats_dict.get(stat, 0)
-            self.stats_dict[stat] = current_val + value
-            self.inventory.append(item)
-
-        # 2. Добавляем способности
-        if item.abilities:
-            self.abilities.extend(item.abilities)
-
-        print(f"{self.name} купил {item.name}!")
-
-
-    def update_effects_turn(self):
-        surviving_effects = []
-        for effect in self.active_effects:
-            effect['duration'] -= 1
-            if effect['duration'] > 0:
-                surviving_effects.append(effect)
-        self.active_effects = surviving_effects
-        keys_to_reset = [k for k in self.stats_dict if k.startswith('temporary_')]
-        for k in keys_to_reset:
-            self.stats_dict[k] = 0
+    def kill(self):
+        self.claim_cell(None)
+        super().kill()
 
     def update_position(self):
         if not self.path_queue:
@@ -252,13 +155,13 @@ class NPC(arcade.Sprite):
                                                 'rep:' + str(quest['reward_rep'])]),
                           'description': quest['text']} for quest in npc_data['quests']]
 
-    def get_random_phrase(self, game_view=None, delta_time=0):
+    def get_random_phrase(self, sim=None, delta_time=0):
         if not self.phrases:
             return ""
         self.time += delta_time
-        if game_view and not delta_time:
+        if sim and not delta_time:
             return random.choice(self.final_phrases)
-        if game_view and game_view.final_quest_unlocked:
+        if sim and sim.final_quest_unlocked:
             if self.final_phrases:
                 return random.choice(self.final_phrases)
         if not delta_time:
@@ -273,13 +176,12 @@ class NPC(arcade.Sprite):
             return None
         return random.choice(self.quests)
 
-class ShopItem(arcade.Sprite):
+class ShopItem(arcade.Sprite, ItemState):
     """ Предмет, который можно купить """
 
     def __init__(self, item_data, x, y, scale):
         # item_data - это словарь с параметрами предмета
-        self.name = item_data.get("name", "Unknown Item")
-        self.image_path = item_data.get("image", "images/potion.png")
+        ItemState.__init__(self, item_data)
 
         try:
             super().__init__(self.image_path)
@@ -290,12 +192,6 @@ class ShopItem(arcade.Sprite):
 
         self.center_x = x
         self.center_y = y
-        self.price = item_data.get("price", 100)
-
-        # Статы, которые дает предмет
-        self.stats_dict = item_data.get("stats", {})
-        # Способности, которые дает предмет
-        self.abilities = item_data.get("abilities", [])
 
         # Поля для совместимости с CharacterInfoOverlay
         self.role = "item"
@@ -306,17 +202,13 @@ class ShopItem(arcade.Sprite):
         val = self.stats_dict.get(stat_name, 0)
         return (val, 0, val)
 
-class Lair(arcade.Sprite):
-    def __init__(self, position):
+class Lair(arcade.Sprite, LairState):
+    def __init__(self, position, rng=random):
         try:
             super().__init__("images/lair.png")
             self.width, self.height = TILE_SIZE, TILE_SIZE
         except:
             super().__init__()
             self.texture = arcade.make_circle_texture(50, arcade.color.DARK_RED)
-        self.position = position
-        self.guardians_spawned = False
-        self.guardians_needed = 6
-        self.spawn_interval = [2, 3]
+        LairState.__init__(self, position, rng)
         self.last_spawn_time = time.time()
-        self.next_spawn_interval = random.randint(*self.spawn_interval)
\ No newline at end of file
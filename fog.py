@@ -0,0 +1,95 @@
+import arcade
+from functools import lru_cache
+from PIL import Image
+
+from constants import *
+
+
+FOG_FRAGMENT_SHADER = """
+#version 330
+uniform sampler2D fog_mask;
+uniform sampler2D fog_texture;
+
+in vec2 v_cell;
+out vec4 f_color;
+
+void main() {
+    float alpha = texelFetch(fog_mask, ivec2(floor(v_cell)), 0).r;
+    if (alpha <= 0.0) discard;
+    vec4 color = texture(fog_texture, fract(v_cell));
+    f_color = vec4(color.rgb, color.a * alpha);
+}
+"""
+
+
+@lru_cache(maxsize=32)
+def disc_offsets(radius):
+    """ Смещения клеток, попадающих в круг обзора радиуса radius (в клетках) """
+    r = int(radius)
+    return tuple((dx, dy) for dx in range(-r, r + 1) for dy in range(-r, r + 1)
+                 if dx * dx + dy * dy <= radius * radius)
+
+
+class FogOfWar:
+    """ Туман войны по сетке: одна байтовая альфа на клетку (255 - скрыто, 0 - открыто) """
+
+    FADE_STEP = 15
+
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT):
+        self.width = width
+        self.height = height
+        self.alpha = bytearray(b'\xff') * (width * height)
+        self.hero_views = {}  # id героя -> ((gx, gy, view_range), индексы клеток в круге)
+        self.fading = set()  # клетки внутри обзора, которые ещё не растаяли
+        self.dirty_chunks = set()  # чанки (cx, cy), чью маску нужно перезалить на GPU
+
+    def cells_in_view(self, gx, gy, view_range):
+        cells = []
+        for dx, dy in disc_offsets(view_range):
+            x, y = gx + dx, gy + dy
+            if 0 <= x < self.width and 0 <= y < self.height:
+                cells.append(y * self.width + x)
+        return cells
+
+    def update(self, heroes):
+        """ Пересчитываем круги обзора только для героев, сменивших клетку или дальность обзора """
+        changed = False
+        alive = set()
+        for hero in heroes:
+            key = id(hero)
+            alive.add(key)
+            state = (int(hero.center_x // TILE_SIZE), int(hero.center_y // TILE_SIZE),
+                     hero.get_stat('view_range')[0])
+            view = self.hero_views.get(key)
+            if view is None or view[0] != state:
+                self.hero_views[key] = (state, self.cells_in_view(*state))
+                changed = True
+        for key in [k for k in self.hero_views if k not in alive]:
+            del self.hero_views[key]
+            changed = True
+
+        if changed:
+            self.fading = {i for _, cells in self.hero_views.values() for i in cells if self.alpha[i]}
+
+        # Плавно растворяем туман в клетках, которые сейчас видны
+        for i in list(self.fading):
+            a = max(0, self.alpha[i] - self.FADE_STEP)
+            self.alpha[i] = a
+            if a == 0:
+                self.fading.discard(i)
+            self.dirty_chunks.add(((i % self.width) // CHUNK_SIZE, (i // self.width) // CHUNK_SIZE))
+
+    def chunk_mask(self, x0, y0, w, h):
+        """ Байты альфы прямоугольника клеток (строка за строкой по y) """
+        return b''.join(self.alpha[y * self.width + x0:y * self.width + x0 + w] for y in range(y0, y0 + h))
+
+    def is_revealed(self, gx, gy):
+        return self.alpha[gy * self.width + gx] == 0
+
+
+def load_fog_image(path="images/_fog.png"):
+    """ Картинка тумана, перевёрнутая под координаты OpenGL """
+    try:
+        return Image.open(path).convert('RGBA').transpose(Image.FLIP_TOP_BOTTOM)
+    except:
+        return Image.new('RGBA', (1, 1), arcade.color.GRAY)
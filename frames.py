@@ -0,0 +1,213 @@
+"""
+Упакованные анимации меню: все кадры в одном файле (JPEG подряд + таблица смещений) и проигрыватель,
+который держит в памяти только несколько кадров впереди и одну текстуру в атласе.
+Файлы кадров в репозитории не хранятся: игра собирает их из папок с кадрами при первом запуске
+(ensure_pack), вручную - python frames.py images/start_menu images/start_menu.frames
+"""
+import argparse
+import glob
+import io
+import itertools
+import mmap
+import os
+import struct
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import arcade
+from PIL import Image
+
+from constants import SCREEN_WIDTH, SCREEN_HEIGHT
+
+PACK_MAGIC = b'DNDF'
+PACK_VERSION = 1
+_HEADER = struct.Struct('<4sHHHI')  # метка, версия, ширина, высота, число кадров
+_ENTRY = struct.Struct('<II')  # смещение и длина кадра от начала файла
+
+FRAMES_AHEAD = 3  # кадров, декодируемых заранее
+PACK_QUALITY = 85  # качество JPEG при упаковке
+
+# Одна фоновая нить на все проигрыватели: одновременно играет одна анимация
+_DECODER = ThreadPoolExecutor(max_workers=1, thread_name_prefix="frames")
+_STREAM_IDS = itertools.count()
+
+
+def _frame_paths(src_dir):
+    return sorted(glob.glob(os.path.join(src_dir, '*.jpg')) + glob.glob(os.path.join(src_dir, '*.png')))
+
+
+def pack_frames(src_dir, out_path, size=(SCREEN_WIDTH, SCREEN_HEIGHT), quality=PACK_QUALITY):
+    """ Собирает кадры *.jpg/*.png из src_dir (по имени) в один файл, сразу в размере экрана; возвращает число кадров """
+    paths = _frame_paths(src_dir)
+    if not paths:
+        raise ValueError(f"В {src_dir} нет кадров")
+    blobs = []
+    for path in paths:
+        image = Image.open(path)
+        image.draft('RGB', size)
+        image = image.convert('RGB').resize(size, Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=quality, optimize=True)
+        blobs.append(buffer.getvalue())
+
+    offset = _HEADER.size + _ENTRY.size * len(blobs)
+    # Недописанный файл никогда не окажется на месте готового; имя своё у каждого сборщика
+    # (фоновая загрузка и экран поражения могут собирать один файл одновременно)
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(out_path) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(PACK_MAGIC, PACK_VERSION, size[0], size[1], len(blobs)))
+            for blob in blobs:
+                f.write(_ENTRY.pack(offset, len(blob)))
+                offset += len(blob)
+            for blob in blobs:
+                f.write(blob)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return len(blobs)
+
+
+def ensure_pack(src_dir, out_path):
+    """ Собирает файл кадров, если его нет или кадры в src_dir новее; возвращает out_path """
+    try:
+        built = os.path.getmtime(out_path) if os.path.exists(out_path) else None
+        if built is None or any(os.path.getmtime(path) > built for path in _frame_paths(src_dir)):
+            count = pack_frames(src_dir, out_path)
+            print(f"Собран {out_path}: {count} кадров")
+    except Exception as e:
+        print(f"Не удалось собрать {out_path}: {e}")  # проигрыватель без файла просто ничего не рисует
+    return out_path
+
+
+class FramePack:
+    """ Файл кадров, отображённый в память: кадр читается и декодируется по номеру (из любого потока) """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, width, height, count = _HEADER.unpack_from(self.data, 0)
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            raise ValueError(f"{path}: не файл кадров или другая версия")
+        self.size = (width, height)
+        self.entries = [_ENTRY.unpack_from(self.data, _HEADER.size + i * _ENTRY.size) for i in range(count)]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def decode(self, index):
+        """ Кадр index как RGBA-картинка (в атласе всё RGBA) """
+        offset, length = self.entries[index]
+        return Image.open(io.BytesIO(self.data[offset:offset + length])).convert('RGBA')
+
+
+class FramePlayer:
+    """
+    Анимация из файла кадров. Декодирует только FRAMES_AHEAD кадров вперёд в фоне и пишет текущий
+    кадр в одну и ту же область атласа. Не готов следующий кадр - показывается прежний, кадр не ждём
+    """
+
+    def __init__(self, path, frame_time, ahead=FRAMES_AHEAD):
+        self.frame_time = frame_time
+        self.ahead = ahead
+        self.index = 0  # текущий кадр
+        self.timer = 0.0
+        self.pending = {}  # номер кадра -> future с картинкой
+        self.texture = None  # одна текстура на анимацию, пиксели в ней меняются
+        self.shown = None  # номер кадра, который сейчас в текстуре
+        try:
+            self.pack = FramePack(path)
+        except Exception as e:
+            print(f"Не удалось открыть анимацию {path}: {e}")
+            self.pack = None
+
+    @property
+    def available(self):
+        return self.pack is not None and len(self.pack) > 0
+
+    @property
+    def ready(self):
+        """ Первый кадр уже декодирован (или анимации нет - ждать нечего) """
+        if not self.available:
+            return True
+        self._prefetch()
+        return self.shown is not None or self.pending[self.index].done()
+
+    @property
+    def resident_bytes(self):
+        """ Память под кадры: декодированные впереди и текущий в текстуре (RGBA) """
+        if not self.available:
+            return 0
+        width, height = self.pack.size
+        return (len(self.pending) + (self.texture is not None)) * width * height * 4
+
+    def release(self):
+        """ Отпускает декодированные кадры и текстуру; при следующем draw всё декодируется заново """
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        self.texture = None  # общий атлас уберёт её сам, когда текстуру соберёт сборщик мусора
+        self.shown = None
+
+    def rewind(self):
+        """ С первого кадра (финальный экран каждый раз начинается сначала) """
+        if not self.available:
+            return
+        self.index = 0
+        self.timer = 0.0
+        self._prefetch()
+
+    def _prefetch(self):
+        count = len(self.pack)
+        window = {(self.index + i) % count for i in range(self.ahead + 1)}
+        for n in list(self.pending):
+            if n not in window:
+                self.pending.pop(n).cancel()
+        for n in sorted(window, key=lambda n: (n - self.index) % count):
+            if n not in self.pending and n != self.shown:
+                self.pending[n] = _DECODER.submit(self.pack.decode, n)
+
+    def update(self, delta_time):
+        if not self.available:
+            return
+        self.timer += delta_time
+        if self.timer > self.frame_time:
+            following = (self.index + 1) % len(self.pack)
+            future = self.pending.get(following)
+            if future is None or future.done():
+                self.timer = 0
+                self.index = following
+        self._prefetch()
+
+    def draw(self, rect):
+        if not self.available:
+            return
+        if self.shown != self.index:
+            self._prefetch()
+            image = self.pending.pop(self.index).result()  # ждём только самый первый кадр
+            if self.texture is None:
+                # Каждый раз новый хеш: прежняя текстура может ещё лежать в атласе со старой картинкой
+                self.texture = arcade.Texture(image, hash=f"{self.pack.path}:stream:{next(_STREAM_IDS)}")
+                arcade.get_window().ctx.default_atlas.add(self.texture)
+            else:
+                self.texture.image = image
+                arcade.get_window().ctx.default_atlas.update_texture_image(self.texture)
+            self.shown = self.index
+        arcade.draw_texture_rect(self.texture, rect)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Упаковка кадров анимации меню в один файл")
+    parser.add_argument('src_dir', help="папка с кадрами (порядок - по именам файлов)")
+    parser.add_argument('out_path')
+    parser.add_argument('--size', type=int, nargs=2, default=(SCREEN_WIDTH, SCREEN_HEIGHT), metavar=('W', 'H'))
+    parser.add_argument('--quality', type=int, default=PACK_QUALITY)
+    args = parser.parse_args(argv)
+    count = pack_frames(args.src_dir, args.out_path, tuple(args.size), args.quality)
+    print(f"{args.out_path}: {count} кадров, {os.path.getsize(args.out_path) / 2 ** 20:.1f} МБ")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,98 @@
-from collections import deque
+import ast
 import random
-from tkinter import filedialog  # для выбора файла
-import tkinter as tk
 from constants import *
 import zipfile
 import json
 
 
-def apply_ability(source, target, effect, eff_manager=None):
-    effect_script = effect
+class EffectError(ValueError):
+    """ Строка эффекта способности не прошла проверку """
+
+
+# Имена, доступные внутри эффекта (кроме встроенных функций ниже)
+EFFECT_NAMES = {'hero', 'target', 'buff', 'd4', 'd6', 'd10', 'd20'}
+EFFECT_BUILTINS = {'min': min, 'max': max, 'abs': abs, 'int': int, 'round': round}
+
+_EFFECT_NODES = (ast.Module, ast.Expr, ast.Assign, ast.AugAssign, ast.Subscript, ast.Name,
+                 ast.Constant, ast.BinOp, ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp, ast.Call,
+                 ast.expr_context, ast.operator, ast.unaryop, ast.boolop, ast.cmpop)
+
+# Кеш: строка эффекта -> скомпилированный код (или ошибка, если строка некорректна)
+_compiled_effects = {}
+
+
+def _check_effect_tree(tree):
+    """ Разрешаем только изменение статов hero/target, вызов buff и арифметику """
+    for node in ast.walk(tree):
+        if not isinstance(node, _EFFECT_NODES):
+            raise EffectError(f"недопустимая конструкция {type(node).__name__}")
+        if isinstance(node, ast.Name) and node.id not in EFFECT_NAMES and node.id not in EFFECT_BUILTINS:
+            raise EffectError(f"неизвестное имя '{node.id}'")
+        if isinstance(node, (ast.Assign, ast.AugAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for t in targets:
+                if not (isinstance(t, ast.Subscript) and isinstance(t.value, ast.Name)
+                        and t.value.id in ('hero', 'target')):
+                    raise EffectError("изменять можно только hero[...] и target[...]")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.keywords:
+                raise EffectError("недопустимый вызов функции")
+            if node.func.id == 'buff' and len(node.args) != 4:
+                raise EffectError("buff принимает 4 аргумента: (кто, стат, значение, длительность)")
+
+
+def compile_effect(effect):
+    """ Разбирает строку эффекта один раз и возвращает закешированный код """
+    cached = _compiled_effects.get(effect)
+    if cached is None:
+        try:
+            body = []
+            for cmd in effect.split(';'):
+                if cmd.strip():
+                    body.extend(ast.parse(cmd.strip(), mode='exec').body)
+            tree = ast.Module(body=body, type_ignores=[])
+            _check_effect_tree(tree)
+            cached = compile(tree, '<effect>', 'exec')
+        except (SyntaxError, EffectError, AttributeError) as e:
+            cached = EffectError(f"{effect!r}: {e}")
+        _compiled_effects[effect] = cached
+    if isinstance(cached, EffectError):
+        raise cached
+    return cached
+
+
+def validate_entity_effects(data):
+    """ Компилирует эффекты персонажа при загрузке, отбрасывая некорректные """
+    for key in ('race', 'class'):
+        value = data.get(key)
+        if isinstance(value, list) and len(value) > 1:
+            try:
+                compile_effect(value[1])
+            except EffectError as e:
+                print(f"Некорректный эффект ({key}) у {data.get('name', 'Unknown')}: {e}")
+                data[key] = [value[0], '']
+    valid = []
+    for abil in data.get('abilities', []):
+        try:
+            compile_effect(abil.get('effect', ''))
+            valid.append(abil)
+        except EffectError as e:
+            print(f"Способность '{abil.get('name', '')}' отклонена: {e}")
+    if 'abilities' in data:
+        data['abilities'] = valid
+    return data
+
+
+def validate_builtin_effects():
+    """ Проверка эффектов из constants (предметы, враги, стражи, босс) """
+    for item in ITEMS_DB:
+        validate_entity_effects(item)
+    for data in (ENEMY_JSON, GUARD_JSON, BOSS_VAMPIRE):
+        validate_entity_effects(data)
+
+
+def apply_ability(source, target, effect, eff_manager=None, rng=random):
+    """ rng - откуда брать кубики (поток симуляции, чтобы партию можно было воспроизвести) """
     s_data = source.get_as_dict()
     t_data = target.get_as_dict()
     pending_buffs = []
@@ -25,22 +109,23 @@ def apply_ability(source, target, effect, eff_manager=None):
         if target_obj:
             pending_buffs.append((target_obj, stat, val, dur))
 
-    context = {'hero': s_data, 'target': t_data, 'buff': buff_func, 'd4': random.randint(1, 4),
-               'd6': random.randint(1,6), 'd10': random.randint(1, 10), 'd20': random.randint(1, 20)}
+    context = {'hero': s_data, 'target': t_data, 'buff': buff_func, 'd4': rng.randint(1, 4),
+               'd6': rng.randint(1,6), 'd10': rng.randint(1, 10), 'd20': rng.randint(1, 20)}
     try:
-        for cmd in effect_script.split(';'):
-            if cmd.strip():
-                exec(cmd.strip(), {}, context)
+        exec(compile_effect(effect), {'__builtins__': EFFECT_BUILTINS}, context)
     except Exception as e:
         print(f"Ошибка применения эффекта: {e}")
         source['moves_left'] += 1  # если произошла ошибка, то возвращаем ход
         return
 
 
-    for key in target.stats_dict.keys():
-         target.stats_dict[key] = context['target'][key] - target.get_stat(key)[1]
-    for key in source.stats_dict.keys():
-        source.stats_dict[key] = context['hero'][key] - source.get_stat(key)[1]
+    # Базу восстанавливаем, вычитая бонусы эффектов (то же, что get_stat(key)[1], без вызова на каждый параметр)
+    for unit, data in ((target, context['target']), (source, context['hero'])):
+        bonus, stats = unit._effect_bonus, unit.stats_dict
+        for key in stats:
+            stats[key] = data[key] - bonus.get(key, 0)
+    target.stats_version += 1
+    source.stats_version += 1
     for (obj, stat, val, dur) in pending_buffs:
         obj.add_effect(stat, val, dur)
     if eff_manager:
@@ -58,47 +143,11 @@ def apply_ability(source, target, effect, eff_manager=None):
 
 
 
-def bfs_path(start_grid, target_grid, grid_width=GRID_WIDTH, grid_height=GRID_HEIGHT, obstacles=None):
-    """ Поиск кратчайшего пути (BFS) """
-    queue = deque([start_grid])
-    came_from = {start_grid: None}
-
-    if obstacles is None:
-        obstacles = set()
-
-    while queue:
-        current = queue.popleft()
-        if current == target_grid:
-            break
-
-        cx, cy = current
-        # Соседи (верх, низ, лево, право)
-        neighbors = [(cx + 1, cy), (cx - 1, cy), (cx, cy + 1), (cx, cy - 1)]
-
-        for next_node in neighbors:
-            nx, ny = next_node
-            # Проверка границ
-            if 0 <= nx < grid_width and 0 <= ny < grid_height:
-                # Проверка препятствий
-                if next_node not in came_from and next_node not in obstacles:
-                    queue.append(next_node)
-                    came_from[next_node] = current
-
-    # Восстановление пути
-    if target_grid not in came_from:
-        return []  # Путь не найден
-
-    path = []
-    curr = target_grid
-    while curr != start_grid:
-        path.append(curr)
-        curr = came_from[curr]
-    path.reverse()
-    return path
-
-
-
 def load_characters_from_zip():
+    # tkinter нужен только для диалога - без дисплея модуль импортируется и работает без него
+    from tkinter import filedialog  # для выбора файла
+    import tkinter as tk
+
     # Создаем окно для выбора файла
     root = tk.Tk()
     root.withdraw()  # Скрываем основное окно
@@ -111,6 +160,11 @@ def load_characters_from_zip():
     if not file_path:
         return []
 
+    return read_characters_zip(file_path)
+
+
+def read_characters_zip(file_path):
+    """ Персонажи из zip-архива с json-файлами (не больше 4) """
     characters = []
 
     try:
@@ -122,10 +176,10 @@ def load_characters_from_zip():
             for file_name in json_files[:4]:  # Ограничиваем количество героев
                 with zip_file.open(file_name) as file:
                     data = json.load(file)
-                    characters.append(data)
+                    characters.append(validate_entity_effects(data))
 
     except Exception as e:
         print(f"Ошибка при загрузке данных: {str(e)}")
         return []
 
-    return characters
\ No newline at end of file
+    return characters
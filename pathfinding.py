@@ -0,0 +1,199 @@
+import heapq
+from array import array
+import numpy as np
+
+from constants import *
+
+
+# Клетки храним в плоских массивах: индекс клетки (x, y) = x * height + y, как у grid.ravel()
+UNREACHED = -1
+
+
+def passable_cells(grid):
+    """ Плоский массив проходимости по карте местности: города и бары непроходимы """
+    return bytearray(np.isin(grid, (TERRAIN_TOWN, TERRAIN_BAR), invert=True).ravel().tobytes())
+
+
+def neighbor_table(shape, passable):
+    """
+    Проходимые соседи клеток одним плоским массивом по 4 на клетку: (x+1, y), (x-1, y), (x, y+1), (x, y-1);
+    -1 - сосед за краем карты или непроходим. Поиск не проверяет границы и местность сам
+    """
+    width, height = shape
+    index = np.arange(width * height, dtype=np.int32).reshape(width, height)
+    free = np.frombuffer(bytes(passable), dtype=np.uint8).reshape(width, height).astype(bool)
+    table = np.full((width, height, 4), -1, dtype=np.int32)
+    table[:-1, :, 0] = np.where(free[1:, :], index[1:, :], -1)
+    table[1:, :, 1] = np.where(free[:-1, :], index[:-1, :], -1)
+    table[:, :-1, 2] = np.where(free[:, 1:], index[:, 1:], -1)
+    table[:, 1:, 3] = np.where(free[:, :-1], index[:, :-1], -1)
+    neighbors = array('i')
+    neighbors.frombytes(table.tobytes())
+    return neighbors
+
+
+class OccupancyGrid:
+    """ Препятствия для поиска пути: местность считается один раз, клетки отрядов меняются по событиям """
+
+    def __init__(self, grid):
+        self.width, self.height = grid.shape
+        self.passable = passable_cells(grid)
+        self.units = [0] * (self.width * self.height)  # сколько сущностей стоит в клетке
+        self.neighbors = neighbor_table(grid.shape, self.passable)
+        self.version = 0  # растёт при каждом перемещении: по нему видно, что поле расстояний устарело
+
+    def in_bounds(self, cell):
+        return 0 <= cell[0] < self.width and 0 <= cell[1] < self.height
+
+    def move(self, old_cell, new_cell):
+        """ Сущность сменила клетку; None - появилась на карте или исчезла с неё """
+        if old_cell is not None and self.in_bounds(old_cell):
+            self.units[old_cell[0] * self.height + old_cell[1]] -= 1
+        if new_cell is not None and self.in_bounds(new_cell):
+            self.units[new_cell[0] * self.height + new_cell[1]] += 1
+        self.version += 1
+
+
+class FlowField:
+    """ Поле расстояний до ближайшего героя: один поиск в ширину сразу из всех героев """
+
+    def __init__(self, occupancy, sources, settle=None):
+        """
+        sources - клетки героев (расстояние 0);
+        занятые клетки из occupancy: расстояние до них считаем, но дальше через них не идём;
+        settle - клетки, расстояние до которых нужно знать: когда все найдены, поиск прекращается
+        """
+        self.occupancy = occupancy
+        self.width = width = occupancy.width
+        self.height = height = occupancy.height
+        self.dist = [UNREACHED] * (width * height)
+        self.owner = [UNREACHED] * (width * height)  # номер героя, от которого пришла волна
+
+        neighbors, units = occupancy.neighbors, occupancy.units
+        remaining = None if settle is None else {x * height + y for x, y in settle}
+        dist, owner = self.dist, self.owner
+        frontier = []
+        for k, (x, y) in enumerate(sources):
+            i = x * height + y
+            if dist[i] == UNREACHED:
+                dist[i] = 0
+                owner[i] = k
+                frontier.append(i)
+                if remaining:
+                    remaining.discard(i)
+        if remaining is not None and not remaining:
+            return
+
+        # Волнами: тот же порядок обхода, что у очереди, но без очереди и без dist[i] + 1 на каждую клетку
+        d = 0
+        while frontier:
+            d += 1
+            wave = []
+            push = wave.append
+            for i in frontier:
+                k = owner[i]
+                j = 4 * i
+                for n in neighbors[j:j + 4]:
+                    if n < 0 or dist[n] != UNREACHED:
+                        continue
+                    dist[n] = d
+                    owner[n] = k
+                    if not units[n]:
+                        push(n)
+                    elif remaining is not None:
+                        remaining.discard(n)
+                        if not remaining:
+                            return
+            frontier = wave
+
+    def distance(self, cell):
+        """ Длина кратчайшего пути от клетки до ближайшего героя или None, если героев не достать """
+        d = self.dist[cell[0] * self.height + cell[1]]
+        return None if d == UNREACHED else d
+
+    def target(self, cell):
+        """ Номер героя (в порядке sources), до которого ближе всего от клетки """
+        k = self.owner[cell[0] * self.height + cell[1]]
+        return None if k == UNREACHED else k
+
+    def steps_from(self, cell, limit):
+        """ До limit шагов вниз по полю, не заходя в занятые сейчас клетки; останавливаемся рядом с героем """
+        x, y = cell
+        d = self.dist[x * self.height + y]
+        units = self.occupancy.units
+        steps = []
+        while len(steps) < limit and d > 1:
+            for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                if (0 <= nx < self.width and 0 <= ny < self.height
+                        and self.dist[nx * self.height + ny] == d - 1 and not units[nx * self.height + ny]):
+                    break
+            else:
+                break  # все короткие ходы заняты - ждём на месте
+            x, y, d = nx, ny, d - 1
+            steps.append((x, y))
+        return steps
+
+
+def manhattan(x0, y0, x1, y1):
+    """ Эвристика для сетки с ходами по 4 направлениям """
+    return abs(x0 - x1) + abs(y0 - y1)
+
+
+def astar_path(start, goal, width=GRID_WIDTH, height=GRID_HEIGHT, passable=None, blocked=(),
+               max_cost=None, heuristic=manhattan):
+    """
+    Кратчайший путь A* (без клетки start, с клеткой goal) или [], если пути нет или он длиннее max_cost.
+    passable - плоский массив проходимости (None - проходимо всё), blocked - занятые клетки,
+    heuristic(x, y, gx, gy) не должна переоценивать оставшийся путь
+    """
+    if start == goal:
+        return []
+    gx, gy = goal
+    if not (0 <= gx < width and 0 <= gy < height) or goal in blocked:
+        return []
+    start_i = start[0] * height + start[1]
+    goal_i = gx * height + gy
+    if passable is not None and not passable[goal_i]:
+        return []
+    limit = float('inf') if max_cost is None else max_cost
+    blocked = {x * height + y for x, y in blocked}
+
+    cost = [UNREACHED] * (width * height)
+    came_from = [UNREACHED] * (width * height)
+    cost[start_i] = 0
+    h = heuristic(start[0], start[1], gx, gy)
+    if h > limit:
+        return []
+    heap = [(h, h, start_i)]  # (оценка пути, эвристика - при равенстве берём клетку ближе к цели, клетка)
+    last_x = (width - 1) * height
+
+    while heap:
+        f, h, i = heapq.heappop(heap)
+        if i == goal_i:
+            break
+        g = cost[i]
+        if f - h > g:
+            continue  # устаревшая запись: клетку уже нашли короче
+        y = i % height
+        for n in (i + height if i < last_x else -1, i - height if i >= height else -1,
+                  i + 1 if y < height - 1 else -1, i - 1 if y > 0 else -1):
+            if n < 0 or n in blocked or (passable is not None and not passable[n]):
+                continue
+            if cost[n] != UNREACHED and cost[n] <= g + 1:
+                continue
+            h = heuristic(n // height, n % height, gx, gy)
+            if g + 1 + h > limit:
+                continue
+            cost[n] = g + 1
+            came_from[n] = i
+            heapq.heappush(heap, (g + 1 + h, h, n))
+    else:
+        return []
+
+    path = []
+    i = goal_i
+    while i != start_i:
+        path.append((i // height, i % height))
+        i = came_from[i]
+    path.reverse()
+    return path
@@ -0,0 +1,94 @@
+""" Замеры времени кадра по зонам: перцентили за последние кадры и выгрузка в Chrome trace (chrome://tracing) """
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import deque
+
+PROFILE_WINDOW = 600  # замеров на зону для перцентилей (~10 с при 60 FPS)
+TRACE_LIMIT = 200000  # событий в буфере трассы; старые вытесняются
+
+_NULL_ZONE = contextlib.nullcontext()
+
+
+class _Zone:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter_ns())
+        return False
+
+
+class Profiler:
+    """
+    Зоны вида `with PROFILER.zone('draw.fog'):`. Пока профилировщик выключен,
+    zone() возвращает общий пустой контекст - в игре остаются только вызов и проверка флага
+    """
+
+    def __init__(self, window=PROFILE_WINDOW, trace_limit=TRACE_LIMIT):
+        self.enabled = False
+        self.window = window
+        self.samples = {}  # зона -> deque длительностей в мс
+        self.trace = deque(maxlen=trace_limit)  # (зона, начало нс, конец нс, поток)
+        self._origin = time.perf_counter_ns()
+
+    def enable(self, on=True):
+        self.enabled = on
+
+    def reset(self):
+        self.samples.clear()
+        self.trace.clear()
+        self._origin = time.perf_counter_ns()
+
+    def zone(self, name):
+        if not self.enabled:
+            return _NULL_ZONE
+        return _Zone(self, name)
+
+    def record(self, name, start_ns, end_ns):
+        """ Замер зоны; можно вызывать и напрямую, если начало и конец известны """
+        bucket = self.samples.get(name)
+        if bucket is None:
+            bucket = self.samples[name] = deque(maxlen=self.window)
+        bucket.append((end_ns - start_ns) / 1e6)
+        self.trace.append((name, start_ns, end_ns, threading.get_ident()))
+
+    def percentiles(self, name, points=(50, 95, 99)):
+        """ Перцентили длительности зоны в мс по последним замерам """
+        values = sorted(self.samples.get(name, ()))
+        if not values:
+            return tuple(0.0 for _ in points)
+        last = len(values) - 1
+        return tuple(values[min(last, round(p / 100 * last))] for p in points)
+
+    def report(self):
+        """ [(зона, p50, p95, p99, замеров)] по убыванию p95 """
+        rows = [(name, *self.percentiles(name), len(self.samples[name])) for name in self.samples]
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows
+
+    def export_chrome_trace(self, path=None):
+        """ Пишет буфер трассы в JSON для chrome://tracing или ui.perfetto.dev, возвращает путь """
+        if path is None:
+            path = time.strftime("profile_%Y%m%d_%H%M%S.json")
+        pid = os.getpid()
+        events = [{'name': name, 'cat': name.split('.')[0], 'ph': 'X', 'pid': pid, 'tid': tid,
+                   'ts': (start - self._origin) / 1000, 'dur': (end - start) / 1000}
+                  for name, start, end, tid in list(self.trace)]
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return path
+
+
+# Общий профилировщик игры; включается по F3 или переменной окружения DND_PROFILE=1
+PROFILER = Profiler()
+PROFILER.enable(os.environ.get('DND_PROFILE') == '1')
@@ -0,0 +1,65 @@
+""" Воспроизведение партии по логу без окна. Запуск: python replay.py <id сохранения> [--turn N] [--check] """
+import argparse
+import time
+
+import database
+import simulation
+from terrain import load_terrain
+
+
+def replay_game(seed, heroes_data, events, until_turn=None):
+    """ Партия, проигранная по логу до начала хода until_turn (None - до конца лога) """
+    grid, taverns = load_terrain(seed)
+    sim = simulation.Simulation(grid, seed, verbose=False)
+    sim.new_game(heroes_data, taverns)
+    sim.fast_forward(events, until_turn)
+    return sim
+
+
+def describe(sim):
+    """ Короткая сводка состояния для сравнения и вывода """
+    return {
+        'turn': sim.turn_number,
+        'coins': sim.coins,
+        'rep': sim.reputation,
+        'quest': sim.active_quest and sim.active_quest['type'],
+        'heroes': [(h.name, h.cell, h.get_stat('hp')[0]) for h in sim.heroes],
+        'enemies': len(sim.enemies),
+        'lairs': [(lair.guardians_needed, lair.guardians_spawned) for lair in sim.lairs],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Воспроизведение сохранённой партии по логу команд")
+    parser.add_argument('save_id', type=int)
+    parser.add_argument('--turn', type=int, default=None, help="остановиться в начале этого хода")
+    parser.add_argument('--check', action='store_true', help="сравнить конец лога со снимком из сохранения")
+    args = parser.parse_args(argv)
+
+    data = database.load_game_state(args.save_id)
+    if not data:
+        print(f"Сохранение {args.save_id} не найдено")
+        return 1
+    if not data['replay']:
+        print("У сохранения нет лога: партия была загружена из снимка старой версии")
+        return 1
+
+    events = data['replay']['events']
+    start = time.perf_counter()
+    sim = replay_game(data['world']['seed'], data['replay']['heroes'], events, args.turn)
+    elapsed = time.perf_counter() - start
+    print(f"{len(events)} событий, ход {sim.turn_number} за {elapsed * 1000:.0f} мс")
+    for key, value in describe(sim).items():
+        print(f"  {key}: {value}")
+
+    if args.check:
+        saved_heroes = [(e['name'], e['stats'].get('hp')) for e in data['entities'] if e['role'] == 'hero']
+        replayed = [(h.name, h['hp']) for h in sim.heroes]
+        same = (sim.coins, sim.reputation, replayed) == (data['world']['coins'], data['world']['rep'], saved_heroes)
+        print("Совпадает со снимком" if same else "Расходится со снимком!")
+        return 0 if same else 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
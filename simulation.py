@@ -0,0 +1,736 @@
+import json
+import math
+import random
+
+from constants import *
+from game_logic import apply_ability
+from pathfinding import FlowField, OccupancyGrid, astar_path
+from profiler import PROFILER
+from spatial import LairIndex, SpatialHash
+from tilemap import TileLayer
+
+
+# Правила игры без окна и графики: этот модуль (и всё, что он импортирует) не должен тянуть arcade,
+# чтобы ходы можно было гонять на сервере без дисплея. GameView рисует то, что лежит в Simulation.
+
+cell_center = TileLayer.cell_center
+cell_at = TileLayer.cell_at
+
+# Свой поток случайных чисел на каждую подсистему: броски одной не сдвигают другие,
+# и партия воспроизводится по сиду и логу команд
+RNG_STREAMS = ('world', 'dice', 'spawns', 'enemy_ai', 'hero_ai')
+
+
+class Unit:
+    """ Данные и правила сущности (герой, враг, босс) без спрайта """
+
+    # Без спрайта координаты - обычные атрибуты; у Entity их заменяют свойства arcade.Sprite
+    center_x = 0.0
+    center_y = 0.0
+
+    def __init__(self, filename=None, role="enemy", stats_dict=None, json_data=None, rng=random):
+        # Счётчики изменений: панель персонажа обновляет строки, только когда они растут
+        self.stats_version = 0
+        self.effects_version = 0
+        self.abilities_version = 0
+        self.resolved_version = None  # stats_version + effects_version на последней проверке смертей
+        self._temporary_reset = None  # stats_version, при котором temporary_-параметры уже обнулены
+        self.image_path = filename or "images/hero_1.jpg"
+        self.name = "Unknown"
+        self.role = role
+        # Приоритет: явно переданный словарь (например из сохранения) > json > дефолт
+        self.stats_dict = stats_dict if stats_dict else {}
+        self.active_effects = []
+        self.abilities = []
+        self.inventory = []
+        self.is_guardian = False
+        self.is_boss = False
+        self.owner_lair = None
+
+        # Флаг для загрузки сохранения (чтобы не сбрасывать HP)
+        is_loaded_from_save = stats_dict is not None and 'hp' in stats_dict
+
+        if json_data:
+            self.load_from_json(json_data, skip_stats=is_loaded_from_save, rng=rng)
+
+        self.set_full_stats()
+
+        self.selected_ability = None
+        self.cell = None  # клетка сетки, которую сущность занимает (или уже заняла, пока идёт к ней)
+        self.cell_listener = None  # listener(entity, old_cell, new_cell) при смене клетки
+
+    def load_from_json(self, data, skip_stats=False, rng=random):
+        """ Инициализация на основе JSON """
+        self.name = data.get("name", "Unknown")
+
+        if not skip_stats:
+            self.stats_dict = {
+                'max_hp': data.get("hp", 10),
+                'level': data.get("level", 1),
+            }
+            if "stats" in data:
+                self.stats_dict.update(data["stats"])
+
+        self.set_full_stats()
+
+
+        # Применяем Race/Class только если это новая игра (не из сохранения)
+        if not skip_stats:
+            if 'race' in data:
+                try:
+                    self.race = data['race']
+                    apply_ability(self, self, self.race[1], rng=rng)
+                except:
+                    pass
+
+            if "class" in data:
+                try:
+                    self.cls = data['class']
+                    apply_ability(self, self, self.cls[1], rng=rng)
+                except:
+                    pass
+
+        if "abilities" in data:
+            self.abilities = data["abilities"]
+
+    def __setitem__(self, key, value):
+        # Запись того же значения (мана в конце хода и т.п.) - не изменение
+        if key in self.stats_dict and self.stats_dict[key] == value:
+            return
+        self.stats_dict[key] = value
+        self.stats_version += 1
+
+    def __getitem__(self, item):
+        return self.stats_dict[item]
+
+    @property
+    def active_effects(self):
+        return self._active_effects
+
+    @active_effects.setter
+    def active_effects(self, effects):
+        # Список эффектов заменили целиком (загрузка, бар) - пересобираем таблицу бонусов
+        self._active_effects = effects
+        self.effects_version += 1
+        self._effect_bonus = {}
+        for effect in effects:
+            self._effect_bonus[effect['stat']] = self._effect_bonus.get(effect['stat'], 0) + effect['value']
+
+    def get_stat(self, stat_name):
+        base = self.stats_dict.get(stat_name, 0)
+        bonus = self._effect_bonus.get(stat_name, 0)
+        return (base + bonus, bonus, base)
+
+    def get_as_dict(self):
+        bonus = self._effect_bonus
+        res = {key: value + bonus.get(key, 0) for key, value in self.stats_dict.items()}
+        res['role'] = self.role
+        return res
+
+    def set_full_stats(self):
+        for param1, param2 in EXTEND_PARAMS.items():
+            if param1 in self.stats_dict:
+                continue
+            if param2.isdigit():
+                self.stats_dict[param1] = int(param2)
+            else:
+                self.stats_dict[param1] = self.stats_dict.get(param2, 0)
+
+    def add_effect(self, stat, value, duration):
+        self._active_effects.append({
+            'stat': stat, 'value': value, 'duration': duration
+        })
+        self._effect_bonus[stat] = self._effect_bonus.get(stat, 0) + value
+        self.effects_version += 1
+
+    def equip_item(self, item):
+        """ Применение статов и способностей предмета """
+        # 1. Суммируем статы
+        for stat, value in item.stats_dict.items():
+            current_val = self.stats_dict.get(stat, 0)
+            self.stats_dict[stat] = current_val + value
+            self.inventory.append(item)
+
+        self.stats_version += 1
+
+        # 2. Добавляем способности
+        if item.abilities:
+            self.abilities.extend(item.abilities)
+            self.abilities_version += 1
+
+
+    def update_effects_turn(self):
+        if self._active_effects:
+            surviving_effects = []
+            for effect in self._active_effects:
+                effect['duration'] -= 1
+                if effect['duration'] > 0:
+                    surviving_effects.append(effect)
+                else:
+                    # Снимаем бонус истекшего эффекта из таблицы
+                    self._effect_bonus[effect['stat']] -= effect['value']
+            self._active_effects = surviving_effects
+            self.effects_version += 1
+        # temporary_-параметры могли появиться или измениться, только если менялись параметры
+        if self._temporary_reset != self.stats_version:
+            changed = False
+            for k in [k for k in self.stats_dict if k.startswith('temporary_')]:
+                changed = changed or self.stats_dict[k] != 0
+                self.stats_dict[k] = 0
+            if changed:
+                self.stats_version += 1
+            self._temporary_reset = self.stats_version
+
+    def claim_cell(self, cell):
+        """ Занимает клетку (None - уходит с карты) и сообщает об этом слушателю """
+        if cell != self.cell:
+            old_cell, self.cell = self.cell, cell
+            if self.cell_listener:
+                self.cell_listener(self, old_cell, cell)
+
+    def place(self, cell):
+        """ Ставит сущность в центр клетки """
+        self.center_x, self.center_y = cell_center(*cell)
+        self.claim_cell(cell)
+
+    def walk(self, steps):
+        """ Проходит по клеткам steps; без графики - сразу оказывается в последней """
+        if steps:
+            self.place(steps[-1])
+
+    def kill(self):
+        self.claim_cell(None)
+
+
+class LairState:
+    """ Логово без спрайта: сколько стражей осталось и когда выйдут бродячие монстры """
+
+    center_x = 0.0
+    center_y = 0.0
+
+    def __init__(self, position, rng=random):
+        self.center_x, self.center_y = position
+        self.guardians_spawned = False
+        self.guardians_needed = 6
+        self.spawn_interval = [2, 3]
+        self.next_spawn_interval = rng.randint(*self.spawn_interval)
+
+    def kill(self):
+        pass
+
+
+class ItemState:
+    """ Предмет магазина без спрайта """
+
+    def __init__(self, item_data):
+        self.name = item_data.get("name", "Unknown Item")
+        self.image_path = item_data.get("image", "images/potion.png")
+        self.price = item_data.get("price", 100)
+        # Статы, которые дает предмет
+        self.stats_dict = item_data.get("stats", {})
+        # Способности, которые дает предмет
+        self.abilities = item_data.get("abilities", [])
+
+
+class Simulation:
+    """
+    Состояние партии и правила ходов. Окно (GameView) подставляет свои фабрики сущностей и логов
+    со спрайтами и рисует то, что здесь лежит; без окна работают Unit и LairState.
+
+    Команды игрока (ход, способность, конец хода, квест, покупка) дописываются в events;
+    партия восстанавливается по seed, героям и этому логу через fast_forward
+    """
+
+    def __init__(self, grid, seed=None, unit_factory=Unit, lair_factory=LairState, verbose=True):
+        self.terrain = TileLayer(grid)
+        self.width, self.height = self.terrain.width, self.terrain.height
+        self.occupancy = OccupancyGrid(grid)
+        self.flow_field = None  # (ключ, поле) прошлого хода врагов: никто не сдвинулся - поле то же
+        self.spatial = SpatialHash()
+        self.lair_index = LairIndex()
+        self.unit_factory = unit_factory
+        self.lair_factory = lair_factory
+        self.verbose = verbose
+        self.seed = random.randrange(1 << 31) if seed is None else seed
+        self.rngs = {name: random.Random(f"{self.seed}:{name}") for name in RNG_STREAMS}
+        self.events = []  # лог команд: только дописывается
+        self.heroes_json = None  # герои новой партии (для воспроизведения); None - партия из снимка
+        self.units = {}  # uid -> сущность
+        self.next_uid = 0
+        self.heroes = []
+        self.enemies = []
+        self.lairs = []
+        self.coins = 75
+        self.reputation = 0
+        self.active_quest = None
+        self.final_quest_unlocked = False
+        self.boss_spawned = False
+        self.boss = None
+        self.turn_number = 0
+        self.effect_manager = None  # задаёт окно: вспышки урона и рывки при атаках
+        self.on_unit_added = None  # on_unit_added(unit) - окно добавляет спрайт в списки отрисовки
+        self.on_lair_added = None
+        self.on_ability = None  # on_ability(source, target, effect, damage) - статистика для прогонов баланса
+
+    def say(self, *args):
+        if self.verbose:
+            print(*args)
+
+    def log(self, *event):
+        self.events.append(event)
+
+    # --- РАССТАНОВКА ---
+
+    def new_game(self, heroes_data, taverns):
+        """ Герои у случайной таверны и три логова подальше от них """
+        # Копия до создания героев: покупки потом дописывают способности в их списки
+        self.heroes_json = json.dumps(heroes_data, ensure_ascii=False)
+        rng = self.rngs['world']
+        valid_spawn_tiles = list(taverns)
+        if not valid_spawn_tiles: valid_spawn_tiles.append((1, self.height // 2))
+        spawn_gx, spawn_gy = rng.choice(valid_spawn_tiles)
+        positions = [
+            (spawn_gx - 1, spawn_gy - 1),
+            (spawn_gx + 1, spawn_gy - 1),
+            (spawn_gx - 1, spawn_gy + 1),
+            (spawn_gx + 1, spawn_gy + 1)
+        ]
+        # Создаем героев
+        for i in range(len(heroes_data)):
+            hero = self.unit_factory(f"images/hero_{i + 1}.jpg", "hero", json_data=heroes_data[i],
+                                     rng=self.rngs['dice'])
+            self.add_unit(hero, positions[i])
+
+        # создаем логова
+        created_lairs = 0
+        attempts = 0
+        while created_lairs < 3 and attempts < 1000:
+            attempts += 1
+            lx = rng.randint(2, self.width - 3)
+            ly = rng.randint(2, self.height - 3)
+            if math.sqrt((lx - spawn_gx) ** 2 + (ly - spawn_gy) ** 2) < 15:
+                continue
+
+            too_close = False
+            for l in self.lairs:
+                if math.sqrt((lx - l.center_x / TILE_SIZE) ** 2 + (ly - l.center_y / TILE_SIZE) ** 2) < 10:
+                    too_close = True
+                    break
+            if not too_close:
+                if self.terrain.type_at(lx, ly) in (TERRAIN_TOWN, TERRAIN_BAR):
+                    continue
+                self.add_lair(self.lair_factory(cell_center(lx, ly), self.rngs['spawns']))
+                created_lairs += 1
+
+        # Логова ставятся после героев, поэтому проверяем, не стоит ли кто-то уже рядом
+        for hero in self.heroes:
+            self.activate_lairs_near(hero.cell)
+        # Окно снимает смерти и лишнее HP каждый кадр - до первой команды тоже
+        self.resolve_deaths()
+
+    def load_game(self, load_data):
+        """ Мир, сущности и логова из load_game_state """
+        self.coins = load_data['world']['coins']
+        self.reputation = load_data['world']['rep']
+        self.active_quest = load_data['world']['quest']
+
+        for ent_data in load_data['entities']:
+            role = 'hero' if ent_data['role'] == 'hero' else 'enemy'
+            unit = self.unit_factory(ent_data['image_path'], role, stats_dict=ent_data['stats'])
+            unit.name = ent_data['name']
+            unit.active_effects = ent_data['effects']
+            unit.abilities = ent_data['abilities']
+            unit.abilities_version += 1
+            unit.inventory = ent_data['inventory']
+            if role == 'enemy':
+                unit.is_guardian = ent_data['is_guardian']
+                unit.is_boss = ent_data['is_boss']
+                if unit.is_boss:
+                    self.boss = unit
+                    self.boss_spawned = True
+                    self.active_quest = dict(FINAL_FIGHT_QUEST, progress=0)
+            self.add_unit(unit, cell_at(ent_data['x'], ent_data['y']))
+
+        # Восстанавливаем логова
+        for l_data in load_data['lairs']:
+            lair = self.lair_factory((l_data['x'], l_data['y']), self.rngs['spawns'])
+            lair.guardians_needed = l_data['guardians_needed']
+            lair.next_spawn_interval = l_data['next_spawn_interval']
+            lair.guardians_spawned = l_data['guardians_spawned']
+            self.add_lair(lair)
+
+        for hero in self.heroes:
+            self.activate_lairs_near(hero.cell)
+        self.resolve_deaths()
+
+    def add_unit(self, unit, cell):
+        """ Ставит сущность на карту: в списки и в сетку занятости, которая дальше следит за её клеткой """
+        (self.heroes if unit.role == 'hero' else self.enemies).append(unit)
+        unit.uid = self.next_uid  # по uid на сущность ссылаются команды в логе
+        self.next_uid += 1
+        self.units[unit.uid] = unit
+        if self.on_unit_added:
+            self.on_unit_added(unit)
+        unit.cell_listener = self.on_unit_cell_change
+        unit.place(cell)
+
+    def on_unit_cell_change(self, unit, old_cell, new_cell):
+        self.occupancy.move(old_cell, new_cell)
+        self.spatial.move(unit, old_cell, new_cell)
+        if unit.role == 'hero' and new_cell is not None:
+            self.activate_lairs_near(new_cell)
+
+    def add_lair(self, lair):
+        self.lairs.append(lair)
+        self.lair_index.add(lair)
+        if self.on_lair_added:
+            self.on_lair_added(lair)
+
+    def destroy_lair(self, lair):
+        lair.kill()
+        self.lairs.remove(lair)
+        self.lair_index.remove(lair)
+        self.coins += 30
+        if self.active_quest and self.active_quest["type"] == "kill_lair":
+            self.active_quest["progress"] += 1
+            self.check_quest_complete()
+
+    def activate_lairs_near(self, cell):
+        """ Герой подошёл к логову ближе LAIR_ACTIVATION_RADIUS - из него выходят стражи """
+        for lair in self.lair_index.within(cell, LAIR_ACTIVATION_RADIUS):
+            if lair.guardians_spawned:
+                continue
+            lair.guardians_spawned = True
+            lx, ly = LairIndex.cell_of(lair)
+            c = 0
+            for dx in range(-2, 3):
+                for dy in range(-2, 3):
+                    if c >= 6:
+                        break
+                    if (dx == 0 and dy == 0) or self.spatial.at((lx + dx, ly + dy)):
+                        continue
+                    self.spawn_enemy(lx + dx, ly + dy, is_guardian=True, owner_lair=lair)
+                    c += 1
+
+    def spawn_enemy(self, x_grid, y_grid, is_guardian=False, owner_lair=None):
+        if is_guardian:
+            enemy = self.unit_factory('images/guardian.jpg', 'enemy', json_data=GUARD_JSON.copy(),
+                                      rng=self.rngs['dice'])
+        else:
+            enemy = self.unit_factory("images/enemy.jpg", "enemy", json_data=ENEMY_JSON.copy(),
+                                      rng=self.rngs['dice'])
+        enemy.is_guardian = is_guardian
+        enemy.owner_lair = owner_lair
+        self.add_unit(enemy, (x_grid, y_grid))
+        return enemy
+
+    def spawn_boss(self):
+        if self.boss_spawned:
+            return
+
+        total_hp = sum(h.get_stat('max_hp')[0] for h in self.heroes)
+        boss_data = BOSS_VAMPIRE.copy()
+        boss_data["hp"] = total_hp * 2
+
+        boss = self.unit_factory("images/vampire.png", "enemy", json_data=boss_data, rng=self.rngs['dice'])
+        boss.is_guardian = False
+        boss.is_boss = True
+
+        # Ставим в рандомный лес
+        self.active_quest = dict(FINAL_FIGHT_QUEST, progress=0)
+        self.add_unit(boss, self.rngs['world'].choice(self.terrain.cells_of_type(TERRAIN_FOREST)))
+
+        self.boss = boss
+        self.boss_spawned = True
+        self.say("Босс появился:", boss_data.get("name"))
+
+    # --- ХОД ГЕРОЕВ ---
+
+    def hero_move(self, hero, cell):
+        """ Ход героя в клетку не дальше move_range; False, если ход невозможен """
+        if not self.terrain.in_bounds(*cell) or hero.get_stat('moves_left')[0] <= 0:
+            return False
+        move_range = hero.get_stat('move_range')[0]
+        if abs(cell[0] - hero.cell[0]) + abs(cell[1] - hero.cell[1]) > move_range:
+            return False
+        path = astar_path(hero.cell, cell, self.width, self.height, max_cost=move_range)
+        # Стражи выходят, как только путь героя проходит мимо логова; последнюю клетку проверит слушатель
+        for step in path[:-1]:
+            self.activate_lairs_near(step)
+        hero.walk(path)
+        hero['moves_left'] -= 1
+        self.log('move', hero.uid, cell[0], cell[1])
+        self.resolve_deaths()  # у вышедших стражей лишнее HP срезается до следующей команды
+        return True
+
+    def hero_attack(self, hero, target, effect):
+        """ Способность героя по цели в радиусе атаки; False, если не достать или нет ходов """
+        dist = abs(hero.cell[0] - target.cell[0]) + abs(hero.cell[1] - target.cell[1])
+        if dist > hero.get_stat('attack_range')[0] or hero.get_stat('moves_left')[0] <= 0:
+            return False
+        self.use_ability(hero, target, effect)
+        hero['moves_left'] -= 1
+        # В лог - номер способности героя, строку эффекта - только если такой способности у него нет
+        ref = next((i for i, ability in enumerate(hero.abilities) if ability.get('effect') == effect), effect)
+        self.log('cast', hero.uid, target.uid, ref)
+        # Смерти снимаем сразу: следующая команда (в окне или при воспроизведении) видит тот же мир
+        self.resolve_deaths()
+        return True
+
+    def use_ability(self, source, target, effect):
+        """ Применяет эффект способности; damage для on_ability - сколько HP потеряла цель """
+        dice = self.rngs['dice']
+        if self.on_ability is None:
+            apply_ability(source, target, effect, self.effect_manager, dice)
+            return
+        hp = target.get_stat('hp')[0]
+        apply_ability(source, target, effect, self.effect_manager, dice)
+        self.on_ability(source, target, effect, hp - target.get_stat('hp')[0])
+
+    def heroes_done(self):
+        return all(u.get_stat('moves_left')[0] <= 0 for u in self.heroes)
+
+    def end_turn(self):
+        """ Конец хода игрока: эффекты, мана и бродячие монстры из логов """
+        self.say("Конец хода игрока.")
+        self.log('end_turn')
+        self.turn_number += 1
+        for unit in self.heroes + self.enemies:
+            unit.update_effects_turn()
+            unit['mana'] = unit.get_stat('max_mana')[0]
+        for lair in self.lairs:
+            lair.next_spawn_interval -= 1
+            if lair.next_spawn_interval <= 0:
+                lair.next_spawn_interval = self.rngs['spawns'].randint(*lair.spawn_interval)
+                lx, ly = LairIndex.cell_of(lair)
+                self.say('Вышли бродячие монстры!')
+                c = 0
+                for sx in range(-2, 2):
+                    for sy in range(-2, 2):
+                        if not self.spatial.at((lx + sx, ly + sy)) and sx != 0 and sy != 0:
+                            if c < 3:
+                                self.spawn_enemy(lx + sx, ly + sy)
+                                c += 1
+
+    # --- ХОД ВРАГОВ ---
+
+    def enemy_turn(self):
+        """ Враги бьют героев в радиусе атаки или идут к ближайшему по одному общему полю расстояний """
+        self.say("Враги думают...")
+
+        # Одно поле расстояний от всех героев сразу; занятые клетки берём из сетки занятости
+        hero_cells = [h.cell for h in self.heroes]
+        enemy_cells = [e.cell for e in self.enemies]
+        key = (tuple(hero_cells), tuple(enemy_cells), self.occupancy.version)
+        with PROFILER.zone('enemy.flow_field'):
+            if self.flow_field is not None and self.flow_field[0] == key:
+                field = self.flow_field[1]
+            else:
+                field = FlowField(self.occupancy, hero_cells, settle=enemy_cells)
+                self.flow_field = (key, field)
+        with PROFILER.zone('enemy.act'):
+            self._enemies_act(field, enemy_cells)
+
+    def _enemies_act(self, field, enemy_cells):
+        """ Каждый враг по полю расстояний: удар по герою рядом или шаги к нему """
+        for enemy, current_pos in zip(list(self.enemies), enemy_cells):
+            dist = field.distance(current_pos)
+            if dist is None:
+                # пути нет (заблокирован или нет героев) - стоим
+                continue
+
+            if dist <= enemy.get_stat('attack_range')[0]:
+                target = self.heroes[field.target(current_pos)]
+                enemy.selected_ability = self.rngs['enemy_ai'].choice(enemy.abilities)
+                self.say(f"Противник использует способность:\n{enemy.selected_ability.get('name', '')}")
+                self.use_ability(enemy, target,
+                                 enemy.selected_ability.get('effect', 'The entity does not have any abilities'))
+            else:
+                # двигаемся, обходя клетки, уже занятые походившими врагами;
+                # клетка назначения занята сразу, а не по прибытии
+                enemy.walk(field.steps_from(current_pos, enemy.get_stat('move_range')[0]))
+
+    def start_player_turn(self):
+        for unit in self.heroes:
+            unit['moves_left'] = unit.get_stat('moves_count')[0]
+        self.say("Ход игрока!")
+
+    # --- СМЕРТИ И КВЕСТЫ ---
+
+    def resolve_deaths(self):
+        """ Убирает погибших и начисляет награды; 'win' - убит босс, 'lose' - героев не осталось """
+        for unit in self.heroes + self.enemies:
+            # HP и max_hp меняются только вместе со счётчиками (оба только растут) - остальных не проверяем
+            if unit.resolved_version == unit.stats_version + unit.effects_version:
+                continue
+            if unit.get_stat('hp')[0] <= 0:
+                if unit is self.boss or unit.is_boss:
+                    self.say("Босс повержен. Игра окончена.")
+                    return 'win'
+                if unit.is_guardian:
+                    # Стражи из старых сохранений не знают своё логово - берём ближайшее
+                    lair = unit.owner_lair or self.lair_index.nearest(unit.cell)
+                    if lair in self.lairs:
+                        lair.guardians_needed -= 1
+                        if lair.guardians_needed <= 0:
+                            self.destroy_lair(lair)
+
+                if unit in self.heroes:
+                    self.heroes.remove(unit)
+                    self.coins -= self.coins // len(self.heroes) if len(self.heroes) > 0 else 0
+                if unit in self.enemies:
+                    self.enemies.remove(unit)
+                    self.coins += 10 if unit.is_guardian else 5
+                    if self.active_quest and self.active_quest["type"] == "kill_enemies":
+                        self.active_quest["progress"] += 1
+                        self.check_quest_complete()
+                self.units.pop(unit.uid, None)
+                unit.kill()
+            elif unit['hp'] > unit.get_stat('max_hp')[0]:
+                unit['hp'] = unit.get_stat('max_hp')[0]
+            unit.resolved_version = unit.stats_version + unit.effects_version
+        if not self.heroes:
+            return 'lose'
+        return None
+
+    def check_quest_complete(self):
+        q = self.active_quest
+        if not q:
+            return
+        if q["progress"] >= q["target"]:
+            self.say("Квест выполнен:", q["text"])
+            self.coins += q["reward_coins"]
+            self.reputation += q["reward_rep"]
+            self.say(f"Награда: {q['reward_coins']} золота, {q['reward_rep']} репутации")
+            # Если репутация стала больше 100 — открываем финальный квест
+            if self.reputation > 100 and not self.final_quest_unlocked:
+                self.final_quest_unlocked = True
+                self.active_quest = dict(FINAL_RETURN_QUEST, progress=0)
+                self.say("Открыт финальный квест: Вернуться в бар")
+            else:
+                self.active_quest = None
+
+    def take_quest(self, quest):
+        """ Квест от NPC в баре """
+        self.log('quest', dict(quest))
+        self.active_quest = dict(quest, progress=0)
+        self.say("Получен квест:", quest["text"])
+
+    def return_to_bar(self):
+        """ Финальный квест: герои вернулись в бар - засчитываем и призываем босса """
+        self.say("Вы приняли финальный квест.")
+        self.log('bar_return')
+        self.active_quest["progress"] = 1
+        self.check_quest_complete()
+        self.spawn_boss()
+        self.resolve_deaths()
+
+    def buy_item(self, hero, item):
+        """ Покупка в баре; False, если не хватает золота """
+        if self.coins < item.price:
+            return False
+        self.coins -= item.price
+        hero.equip_item(item)
+        self.say(f"{hero.name} купил {item.name}!")
+        self.log('buy', hero.uid, item.name)
+        self.resolve_deaths()
+        return True
+
+    # --- ВОСПРОИЗВЕДЕНИЕ ---
+
+    def apply_event(self, event):
+        """ Повторяет команду из лога (после json события приходят списками) """
+        kind, args = event[0], event[1:]
+        if kind == 'move':
+            self.hero_move(self.units[args[0]], (args[1], args[2]))
+        elif kind == 'cast':
+            hero, effect = self.units[args[0]], args[2]
+            if isinstance(effect, int):
+                effect = hero.abilities[effect]['effect']
+            self.hero_attack(hero, self.units[args[1]], effect)
+        elif kind == 'end_turn':
+            # В окне враги ходят в следующих кадрах, но команд игрока между этим нет
+            self.end_turn()
+            self.enemy_turn()
+            self.resolve_deaths()
+            self.start_player_turn()
+        elif kind == 'quest':
+            self.take_quest(args[0])
+        elif kind == 'bar_return':
+            self.return_to_bar()
+        elif kind == 'buy':
+            item_data = next(item for item in ITEMS_DB if item['name'] == args[1])
+            self.buy_item(self.units[args[0]], ItemState(item_data))
+        else:
+            raise ValueError(f"неизвестное событие {kind!r}")
+
+    def fast_forward(self, events, until_turn=None):
+        """ Проигрывает лог; until_turn - остановиться в начале этого хода """
+        for event in events:
+            if until_turn is not None and self.turn_number >= until_turn:
+                break
+            self.apply_event(event)
+
+    # --- ПРОГОН БЕЗ ОКНА ---
+
+    def step_turn(self, ai=None):
+        """
+        Один полный ход без окна: герои (ai(sim), по умолчанию hero_ai), эффекты и логова,
+        враги, смерти. Возвращает 'win', 'lose' или None, если партия продолжается
+        """
+        (ai or hero_ai)(self)
+        outcome = self.resolve_deaths()
+        if outcome:
+            return outcome
+        # Дальше ровно то, что делает apply_event для 'end_turn'
+        self.end_turn()
+        self.enemy_turn()
+        outcome = self.resolve_deaths()
+        if outcome:
+            return outcome
+        self.start_player_turn()
+        return None
+
+
+def hero_ai(sim):
+    """
+    Простой ИИ героев для прогонов без окна: берёт квест в баре, бьёт ближайшего врага
+    случайной способностью, а если не достаёт - идёт к нему или к ближайшему логову
+    """
+    rng = sim.rngs['hero_ai']
+    if not sim.active_quest:
+        sim.take_quest(rng.choice(rng.choice(NPC_DB)['quests']))
+    elif sim.active_quest['type'] == 'return_to_bar':
+        sim.return_to_bar()
+
+    for hero in list(sim.heroes):
+        target = None
+        # Не больше moves_count действий: при ошибке в эффекте apply_ability возвращает ход
+        for _ in range(hero.get_stat('moves_count')[0]):
+            if hero.get_stat('moves_left')[0] <= 0 or hero not in sim.heroes:
+                break
+            if target not in sim.enemies:
+                # Цель выбираем заново, только когда прежняя погибла: враги в ход героев не двигаются
+                hx, hy = hero.cell
+                reach = [abs(e.cell[0] - hx) + abs(e.cell[1] - hy) for e in sim.enemies]
+                target = sim.enemies[reach.index(min(reach))] if reach else None  # первый из ближайших, как min
+            if target is not None and hero.abilities and sim.hero_attack(
+                    hero, target, rng.choice(hero.abilities).get('effect', '')):
+                continue
+
+            if target is not None:
+                goal = target.cell
+            else:
+                lair = sim.lair_index.nearest(hero.cell)
+                if lair is None:
+                    break
+                goal = LairIndex.cell_of(lair)
+            path = astar_path(hero.cell, goal, sim.width, sim.height, sim.occupancy.passable)
+            if target is not None:
+                path = path[:-1]  # встаём рядом с врагом, а не на него
+            steps = path[:hero.get_stat('move_range')[0]]
+            height, units = sim.height, sim.occupancy.units
+            while steps and units[steps[-1][0] * height + steps[-1][1]]:
+                steps.pop()
+            if not steps or not sim.hero_move(hero, steps[-1]):
+                break
@@ -0,0 +1,113 @@
+from constants import *
+
+
+class SpatialHash:
+    """ Индекс сущностей по клеткам сетки: кто стоит в клетке и кто рядом """
+
+    def __init__(self):
+        self.cells = {}  # (gx, gy) -> список сущностей в клетке
+
+    def move(self, entity, old_cell, new_cell):
+        """ Сущность сменила клетку; None - появилась на карте или исчезла с неё """
+        if old_cell is not None:
+            bucket = self.cells.get(old_cell)
+            if bucket and entity in bucket:
+                bucket.remove(entity)
+                if not bucket:
+                    del self.cells[old_cell]
+        if new_cell is not None:
+            self.cells.setdefault(new_cell, []).append(entity)
+
+    def at(self, cell):
+        """ Сущности в клетке (пустой кортеж, если клетка свободна) """
+        return self.cells.get(cell, ())
+
+    def at_point(self, x, y):
+        """ Сущности в клетке под мировой точкой (замена arcade.get_sprites_at_point по сетке) """
+        return self.at((int(x // TILE_SIZE), int(y // TILE_SIZE)))
+
+    def in_radius(self, cell, radius):
+        """ Сущности в клетках не дальше radius клеток от cell """
+        cx, cy = cell
+        r = int(radius)
+        found = []
+        for dx in range(-r, r + 1):
+            for dy in range(-r, r + 1):
+                if dx * dx + dy * dy <= radius * radius:
+                    found.extend(self.cells.get((cx + dx, cy + dy), ()))
+        return found
+
+
+LAIR_BUCKET_SIZE = 8  # сторона корзины индекса логов в клетках
+
+
+class LairIndex:
+    """ Логова, разложенные по корзинам сетки: ближайшее логово и логова в радиусе без перебора всех """
+
+    def __init__(self):
+        self.buckets = {}  # (bx, by) -> список (gx, gy, логово)
+        self.count = 0
+
+    @staticmethod
+    def cell_of(lair):
+        return int(lair.center_x // TILE_SIZE), int(lair.center_y // TILE_SIZE)
+
+    def add(self, lair):
+        gx, gy = self.cell_of(lair)
+        self.buckets.setdefault((gx // LAIR_BUCKET_SIZE, gy // LAIR_BUCKET_SIZE), []).append((gx, gy, lair))
+        self.count += 1
+
+    def remove(self, lair):
+        gx, gy = self.cell_of(lair)
+        key = (gx // LAIR_BUCKET_SIZE, gy // LAIR_BUCKET_SIZE)
+        bucket = self.buckets.get(key)
+        if bucket and (gx, gy, lair) in bucket:
+            bucket.remove((gx, gy, lair))
+            self.count -= 1
+            if not bucket:
+                del self.buckets[key]
+
+    def _ring(self, bx, by, r):
+        """ Записи из корзин на расстоянии ровно r корзин (по Чебышёву) """
+        for dx in range(-r, r + 1):
+            for dy in range(-r, r + 1):
+                if max(abs(dx), abs(dy)) == r:
+                    yield from self.buckets.get((bx + dx, by + dy), ())
+
+    def nearest(self, cell):
+        """ Ближайшее к клетке логово или None """
+        if not self.count:
+            return None
+        gx, gy = cell
+        if self.count <= LAIR_BUCKET_SIZE:
+            # Логов мало - обойти их все дешевле, чем кольца пустых корзин
+            entries = (entry for bucket in self.buckets.values() for entry in bucket)
+            return min(entries, key=lambda e: (e[0] - gx) ** 2 + (e[1] - gy) ** 2)[2]
+        bx, by = gx // LAIR_BUCKET_SIZE, gy // LAIR_BUCKET_SIZE
+        best, best_d2 = None, float('inf')
+        seen = 0
+        r = 0
+        # Размер карты индекс не знает: кольца расширяются, пока не встретятся все логова
+        while seen < self.count:
+            for lx, ly, lair in self._ring(bx, by, r):
+                seen += 1
+                d2 = (lx - gx) ** 2 + (ly - gy) ** 2
+                if d2 < best_d2:
+                    best, best_d2 = lair, d2
+            # Всё, что в следующих кольцах, дальше r корзин от клетки
+            if best is not None and best_d2 <= (r * LAIR_BUCKET_SIZE) ** 2:
+                break
+            r += 1
+        return best
+
+    def within(self, cell, radius):
+        """ Логова, центры которых ближе radius клеток к клетке """
+        gx, gy = cell
+        r = int(radius)
+        found = []
+        for bx in range((gx - r) // LAIR_BUCKET_SIZE, (gx + r) // LAIR_BUCKET_SIZE + 1):
+            for by in range((gy - r) // LAIR_BUCKET_SIZE, (gy + r) // LAIR_BUCKET_SIZE + 1):
+                for lx, ly, lair in self.buckets.get((bx, by), ()):
+                    if (lx - gx) ** 2 + (ly - gy) ** 2 < radius * radius:
+                        found.append(lair)
+        return found
@@ -0,0 +1,172 @@
+import os
+import struct
+import sys
+import tempfile
+import numpy as np
+from perlin_noise.tools import fade, hasher, sample_vector
+
+from constants import *
+
+NOISE_OCTAVES = 4
+FOREST_THRESHOLD = -0.10
+TOWN_THRESHOLD = 0.275
+TAVERN_MIN_DISTANCE = 17
+
+# --- КЕШ КАРТ НА ДИСКЕ ---
+# Рядом с модулем, а не в текущей папке: balance.py и replay.py запускают откуда угодно
+TERRAIN_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "terrain_cache")
+TERRAIN_CACHE_VERSION = 1
+TERRAIN_CACHE_LIMIT = 64 * 1024 * 1024  # суммарный размер кеша в байтах
+# magic, версия формата, сид, ширина, высота, число таверн; дальше таверны (x, y) и сетка uint8 [x][y]
+_CACHE_HEADER = struct.Struct('<4sHqIII')
+_CACHE_MAGIC = b'TRRN'
+
+
+def _builtin_sum(terms):
+    """ Складывает массивы в том же порядке и с той же точностью, что и sum() внутри PerlinNoise """
+    result = terms[0] + 0.0
+    if sys.version_info < (3, 12):
+        for x in terms[1:]:
+            result = result + x
+        return result
+    # С Python 3.12 sum() для float использует компенсированное суммирование (Ноймайер)
+    c = np.zeros_like(result)
+    for x in terms[1:]:
+        t = result + x
+        c += np.where(np.abs(result) >= np.abs(x), (result - t) + x, (x - t) + result)
+        result = t
+    return np.where((c != 0) & np.isfinite(c), result + c, result)
+
+
+def perlin_field(seed, width, height, octaves=NOISE_OCTAVES):
+    """ Массив шума [x][y], побитно совпадающий с PerlinNoise(octaves, seed)([x / width, y / height]) """
+    cx = np.arange(width, dtype=np.float64) / width * octaves
+    cy = np.arange(height, dtype=np.float64) / height * octaves
+    x0 = np.floor(cx).astype(np.int64)
+    y0 = np.floor(cy).astype(np.int64)
+
+    # Случайные векторы в узлах решётки (их всего (octaves + 1) ** 2)
+    vectors = np.empty((octaves + 2, octaves + 2, 2))
+    for i in range(octaves + 2):
+        for j in range(octaves + 2):
+            vectors[i, j] = sample_vector(2, seed * hasher((i, j)))
+
+    terms = []
+    for ox in (0, 1):
+        dx = cx - (x0 + ox)
+        fx = np.array([fade(1 - abs(d)) for d in dx.tolist()])
+        for oy in (0, 1):
+            dy = cy - (y0 + oy)
+            fy = np.array([fade(1 - abs(d)) for d in dy.tolist()])
+            vec = vectors[(x0 + ox)[:, None], (y0 + oy)[None, :]]
+            dot = vec[..., 0] * dx[:, None] + vec[..., 1] * dy[None, :]
+            terms.append((fx[:, None] * fy[None, :]) * dot)
+    return _builtin_sum(terms)
+
+
+def _tavern_disc():
+    r = TAVERN_MIN_DISTANCE - 1
+    d = np.arange(-r, r + 1)
+    return (d[:, None] ** 2 + d[None, :] ** 2) < TAVERN_MIN_DISTANCE ** 2
+
+
+def generate_terrain(seed, width=GRID_WIDTH, height=GRID_HEIGHT):
+    """ Генерация карты: возвращает (grid uint8 [x][y] с кодами TERRAIN_*, список таверн (x, y)) """
+    noise = perlin_field(seed, width, height)
+    grid = np.full((width, height), TERRAIN_MEADOW, dtype=np.uint8)
+    grid[noise < FOREST_THRESHOLD] = TERRAIN_FOREST
+    grid[noise > TOWN_THRESHOLD] = TERRAIN_TOWN
+
+    # Таверна может стоять только в городе, окружённом городом со всех 8 сторон (и не у края карты)
+    town = grid == TERRAIN_TOWN
+    inner = np.zeros_like(town)
+    if width > 4 and height > 4:
+        inner[3:width - 1, 3:height - 1] = True
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                inner[3:width - 1, 3:height - 1] &= town[3 + dx:width - 1 + dx, 3 + dy:height - 1 + dy]
+
+    # Жадно расставляем таверны в порядке обхода (x, затем y), не ближе TAVERN_MIN_DISTANCE друг к другу
+    disc = _tavern_disc()
+    r = TAVERN_MIN_DISTANCE - 1
+    blocked = np.zeros((width + 2 * r, height + 2 * r), dtype=bool)
+    taverns = []
+    for x, y in np.argwhere(inner).tolist():
+        if blocked[x + r, y + r]:
+            continue
+        taverns.append((x, y))
+        grid[x, y] = TERRAIN_BAR
+        blocked[x:x + 2 * r + 1, y:y + 2 * r + 1] |= disc
+    return grid, taverns
+
+
+def _cache_path(seed, width, height):
+    return os.path.join(TERRAIN_CACHE_DIR, f"{seed}_{width}x{height}.v{TERRAIN_CACHE_VERSION}.terrain")
+
+
+def _read_cached_terrain(path, seed, width, height):
+    """ Читает карту из кеша через memmap; None, если файла нет или он от другой версии """
+    try:
+        with open(path, 'rb') as f:
+            magic, version, f_seed, f_width, f_height, count = _CACHE_HEADER.unpack(f.read(_CACHE_HEADER.size))
+            if (magic, version, f_seed, f_width, f_height) != (_CACHE_MAGIC, TERRAIN_CACHE_VERSION,
+                                                                seed, width, height):
+                return None
+            coords = struct.unpack(f'<{count * 2}I', f.read(count * 8))
+        grid = np.memmap(path, dtype=np.uint8, mode='r', shape=(width, height),
+                         offset=_CACHE_HEADER.size + count * 8)
+        os.utime(path)  # время изменения файла служит меткой для LRU
+    except (OSError, ValueError, struct.error):
+        return None
+    return grid, list(zip(coords[::2], coords[1::2]))
+
+
+def _write_cached_terrain(path, seed, grid, taverns):
+    width, height = grid.shape
+    # Своё имя временного файла у каждого процесса: воркеры balance.py пишут одну карту одновременно
+    fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=TERRAIN_CACHE_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_CACHE_HEADER.pack(_CACHE_MAGIC, TERRAIN_CACHE_VERSION, seed, width, height, len(taverns)))
+            f.write(struct.pack(f'<{len(taverns) * 2}I', *[c for xy in taverns for c in xy]))
+            f.write(np.ascontiguousarray(grid, dtype=np.uint8).tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _evict_cached_terrain(keep):
+    """ Удаляет давно не использованные карты, пока кеш не влезет в TERRAIN_CACHE_LIMIT """
+    files = []
+    for name in os.listdir(TERRAIN_CACHE_DIR):
+        path = os.path.join(TERRAIN_CACHE_DIR, name)
+        if name.endswith('.terrain') and path != keep:
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in files) + os.path.getsize(keep)
+    for _, size, path in sorted(files):
+        if total <= TERRAIN_CACHE_LIMIT:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:  # файл может быть занят (открыт в другом окне игры)
+            pass
+
+
+def load_terrain(seed, width=GRID_WIDTH, height=GRID_HEIGHT):
+    """ Карта из дискового кеша по (сид, размеры); при промахе генерируем и сохраняем """
+    path = _cache_path(seed, width, height)
+    cached = _read_cached_terrain(path, seed, width, height)
+    if cached:
+        return cached
+
+    grid, taverns = generate_terrain(seed, width, height)
+    try:
+        os.makedirs(TERRAIN_CACHE_DIR, exist_ok=True)
+        _write_cached_terrain(path, seed, grid, taverns)
+        _evict_cached_terrain(keep=path)
+    except OSError as e:
+        print(f"Не удалось сохранить карту в кеш: {e}")
+    return grid, taverns
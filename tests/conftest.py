@@ -0,0 +1,24 @@
+""" Общее для тестов: модули игры лежат в корне репозитория, пути к ресурсам в них относительные """
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('ARCADE_HEADLESS', '1')  # arcade без дисплея
+
+
+@pytest.fixture(autouse=True)
+def in_repo_root(monkeypatch):
+    monkeypatch.chdir(ROOT)
+
+
+@pytest.fixture
+def temp_db(monkeypatch, tmp_path):
+    """ database на пустой временной базе вместо gamedata.db """
+    import database
+
+    monkeypatch.setattr(database, 'DB_NAME', str(tmp_path / 'test.db'))
+    database.init_db()
+    return database
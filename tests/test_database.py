@@ -0,0 +1,123 @@
+""" Сохранение и загрузка: число запросов, инвентарь и автосохранение дельтами """
+import random
+
+from autosave import AutosaveService
+from constants import *
+from simulation import ItemState, Unit
+
+WORLD = {'seed': 1, 'name': 'test', 'time_of_creation': '2000-01-01 00:00:00', 'coins': 75, 'rep': 0,
+         'quest': None}
+
+
+def make_units(count, seed=0):
+    """ Герои и враги с эффектом и двумя предметами, разбросанные по карте """
+    rng = random.Random(seed)
+    units = []
+    for i in range(count):
+        data = ENEMY_JSON if i % 10 else BOSS_VAMPIRE
+        unit = Unit('images/enemy.jpg', 'hero' if i < 4 else 'enemy', json_data=dict(data), rng=rng)
+        unit.name = f"{unit.name} {i}"
+        unit.center_x = rng.randrange(GRID_WIDTH) * TILE_SIZE
+        unit.center_y = rng.randrange(GRID_HEIGHT) * TILE_SIZE
+        unit.add_effect('hp', 1, 2)
+        unit.inventory = [ItemState(item) for item in rng.sample(ITEMS_DB, 2)]
+        units.append(unit)
+    return units[:4], units[4:]
+
+
+def count_statements(database, monkeypatch, func):
+    """ Выполняет func, считая SQL-запросы на всех соединениях из database.get_connection """
+    statements = []
+    get_connection = database.get_connection
+
+    def traced_connection():
+        conn = get_connection()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(database, 'get_connection', traced_connection)
+    result = func()
+    monkeypatch.setattr(database, 'get_connection', get_connection)
+    return result, len(statements)
+
+
+def saved_state(database):
+    return database.load_game_state(database.get_recent_saves(1)[0][0])
+
+
+def test_load_statements_do_not_grow_with_entities(temp_db, monkeypatch):
+    counts = []
+    for count in (20, 400):
+        heroes, enemies = make_units(count)
+        temp_db.save_game_state(dict(WORLD, name=f"test {count}"), heroes, enemies, [])
+        data, statements = count_statements(temp_db, monkeypatch, lambda: saved_state(temp_db))
+        assert len(data['entities']) == count
+        counts.append(statements)
+    assert counts[0] == counts[1]
+
+
+def test_load_keeps_inventory_per_entity(temp_db):
+    heroes, enemies = make_units(50)
+    temp_db.save_game_state(WORLD, heroes, enemies, [])
+    loaded = saved_state(temp_db)['entities']
+    for unit, row in zip(heroes + enemies, loaded):
+        assert (row['name'], row['x'], row['y']) == (unit.name, unit.center_x, unit.center_y)
+        assert [item['name'] for item in row['inventory']] == [item.name for item in unit.inventory]
+
+
+def test_autosave_writes_changed_entities_and_whole_log(temp_db):
+    heroes, enemies = make_units(60)
+    rng = random.Random(1)
+    events = []
+    service = AutosaveService()
+    try:
+        for turn in range(12):
+            events.extend(['move', turn, step, 0] for step in range(rng.randint(0, 4)))
+            for unit in rng.sample(heroes + enemies, 5):
+                unit.center_x += TILE_SIZE
+                unit['hp'] -= 1
+            if turn == 6:
+                enemies.pop()  # погибший пропадает из сохранения
+            service.request(WORLD, heroes, enemies, [], ('[]', events))
+            if turn % 4 == 0:
+                service.flush()  # остальные запросы заменяют ещё не записанный снимок
+    finally:
+        service.close()
+
+    data = saved_state(temp_db)
+    assert data['replay']['events'] == events
+    assert [(row['name'], row['x'], row['stats']['hp']) for row in data['entities']] == \
+           [(unit.name, unit.center_x, unit['hp']) for unit in heroes + enemies]
+
+
+def test_save_updates_entity_rows_in_place(temp_db):
+    heroes, enemies = make_units(30)
+    cache, encoded = {}, {}
+
+    def rows():
+        conn = temp_db.get_connection()
+        result = {name: (row_id, x) for name, row_id, x in conn.execute('SELECT name, id, x FROM entities')}
+        inventory = conn.execute('SELECT COUNT(*) FROM inventory').fetchone()[0]
+        conn.close()
+        return result, inventory
+
+    def autosave():
+        temp_db.save_snapshot(temp_db.snapshot_game(WORLD, heroes, enemies, [], cache=cache), encoded=encoded)
+        return rows()
+
+    first, _ = autosave()
+    conn = temp_db.get_connection()
+    conn.execute('UPDATE entities SET x = -1')  # так видно, какие строки запись тронула
+    conn.commit()
+    conn.close()
+    enemies[0].center_x += TILE_SIZE
+    dead = enemies.pop()
+    saved, inventory = autosave()
+    assert dead.name not in saved and inventory == 2 * len(saved)
+    assert {name: row_id for name, (row_id, _) in saved.items()} == {name: first[name][0] for name in saved}
+    assert [name for name, (_, x) in saved.items() if x != -1] == [enemies[0].name]
+
+    # Без кеша (F5, первая запись после загрузки) сущности по порядку занимают те же строки
+    temp_db.save_game_state(WORLD, heroes, enemies, [])
+    assert {name: row_id for name, (row_id, _) in rows()[0].items()} == \
+           {name: row_id for name, (row_id, _) in saved.items()}
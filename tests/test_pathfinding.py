@@ -0,0 +1,115 @@
+""" Поле расстояний и A* против обхода в ширину по клеткам """
+import random
+from collections import deque
+
+import pytest
+
+from pathfinding import FlowField, OccupancyGrid, astar_path
+from terrain import generate_terrain
+
+
+def bfs_length(start, goal, width, height, blocked):
+    """ Эталон: число шагов кратчайшего пути обходом в ширину или None, если пути нет """
+    seen = {start: 0}
+    queue = deque([start])
+    while queue:
+        cell = queue.popleft()
+        if cell == goal:
+            return seen[cell]
+        x, y = cell
+        for nxt in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if 0 <= nxt[0] < width and 0 <= nxt[1] < height and nxt not in seen and nxt not in blocked:
+                seen[nxt] = seen[cell] + 1
+                queue.append(nxt)
+    return None
+
+
+def random_walls(size, density, rng):
+    """ Плоский массив проходимости со случайными стенами """
+    return bytearray(0 if rng.random() < density else 1 for _ in range(size * size))
+
+
+@pytest.fixture(scope='module')
+def battlefield():
+    """ Сгенерированная карта с героями и толпой врагов """
+    grid, _ = generate_terrain(7)
+    width, height = grid.shape
+    occupancy = OccupancyGrid(grid)
+    rng = random.Random(7)
+    free = [(x, y) for x in range(width) for y in range(height) if occupancy.passable[x * height + y]]
+    cells = rng.sample(free, 154)
+    for cell in cells:
+        occupancy.move(None, cell)
+    return occupancy, cells[:4], cells[4:]
+
+
+def test_flow_field_matches_bfs_to_nearest_hero(battlefield):
+    occupancy, hero_cells, enemy_cells = battlefield
+    width, height = occupancy.width, occupancy.height
+    walls = {(x, y) for x in range(width) for y in range(height) if not occupancy.passable[x * height + y]}
+    field = FlowField(occupancy, hero_cells, settle=enemy_cells)
+    for pos in enemy_cells:
+        # Через других врагов не пройти, до самого врага дойти можно
+        blocked = walls | set(enemy_cells) - {pos}
+        lengths = [bfs_length(pos, hero, width, height, blocked) for hero in hero_cells]
+        reachable = [n for n in lengths if n is not None]
+        assert field.distance(pos) == (min(reachable) if reachable else None)
+        if reachable:
+            assert lengths[field.target(pos)] == field.distance(pos)
+
+
+def test_flow_field_settle_stops_early_without_changing_answers(battlefield):
+    occupancy, hero_cells, enemy_cells = battlefield
+    full = FlowField(occupancy, hero_cells)
+    settled = FlowField(occupancy, hero_cells, settle=enemy_cells)
+    for pos in enemy_cells:
+        assert settled.distance(pos) == full.distance(pos)
+        assert settled.target(pos) == full.target(pos)
+        assert settled.steps_from(pos, 5) == full.steps_from(pos, 5)
+
+
+def test_flow_field_steps_go_downhill_through_free_cells(battlefield):
+    occupancy, hero_cells, enemy_cells = battlefield
+    field = FlowField(occupancy, hero_cells, settle=enemy_cells)
+    height = occupancy.height
+    for pos in enemy_cells:
+        cell, d = pos, field.distance(pos)
+        for step in field.steps_from(pos, 6):
+            assert abs(step[0] - cell[0]) + abs(step[1] - cell[1]) == 1
+            assert not occupancy.units[step[0] * height + step[1]]
+            assert field.distance(step) == d - 1 >= 1
+            cell, d = step, d - 1
+
+
+@pytest.mark.parametrize('density', [0.0, 0.3])
+def test_astar_lengths_match_bfs(density):
+    size = 41
+    rng = random.Random(3)
+    passable = random_walls(size, density, rng)
+    walls = {(x, y) for x in range(size) for y in range(size) if not passable[x * size + y]}
+    free = [(x, y) for x in range(size) for y in range(size) if passable[x * size + y]]
+    for _ in range(150):
+        start, goal = rng.sample(free, 2)
+        expected = bfs_length(start, goal, size, size, walls)
+        path = astar_path(start, goal, size, size, passable)
+        assert len(path) == (expected or 0)
+        cell = start
+        for step in path:
+            assert abs(step[0] - cell[0]) + abs(step[1] - cell[1]) == 1 and step not in walls
+            cell = step
+
+
+def test_astar_cutoff_and_blocked_cells():
+    size = 41
+    rng = random.Random(5)
+    passable = random_walls(size, 0.25, rng)
+    walls = {(x, y) for x in range(size) for y in range(size) if not passable[x * size + y]}
+    free = [(x, y) for x in range(size) for y in range(size) if passable[x * size + y]]
+    for _ in range(150):
+        start, goal, *others = rng.sample(free, 12)
+        blocked = set(others)
+        expected = bfs_length(start, goal, size, size, walls | blocked)
+        assert len(astar_path(start, goal, size, size, passable, blocked=blocked)) == (expected or 0)
+        near = bfs_length(start, goal, size, size, walls)
+        assert len(astar_path(start, goal, size, size, passable, max_cost=8)) == \
+               (near if near is not None and near <= 8 else 0)
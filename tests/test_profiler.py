@@ -0,0 +1,33 @@
+""" Зоны профилировщика и выгрузка трассы """
+import json
+
+from profiler import Profiler
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler()
+    with profiler.zone('update'):
+        pass
+    assert not profiler.samples and not profiler.trace
+
+
+def test_percentiles_over_window():
+    profiler = Profiler(window=100)
+    for ms in range(200):
+        profiler.record('draw', 0, ms * 1_000_000)
+    assert profiler.percentiles('draw') == (150.0, 194.0, 198.0)  # в окне только последние 100
+    assert profiler.percentiles('missing') == (0.0, 0.0, 0.0)
+
+
+def test_chrome_trace_export(tmp_path):
+    profiler = Profiler()
+    profiler.enable()
+    for _ in range(5):
+        with profiler.zone('enemy.act'):
+            with profiler.zone('enemy.flow_field'):
+                pass
+    path = profiler.export_chrome_trace(str(tmp_path / 'trace.json'))
+    with open(path, encoding='utf-8') as f:
+        trace = json.load(f)['traceEvents']
+    assert len(trace) == 10
+    assert all(e['ph'] == 'X' and e['dur'] >= 0 and e['cat'] == 'enemy' for e in trace)
@@ -0,0 +1,78 @@
+""" Правила без окна: параметры с эффектами, воспроизведение партии по логу """
+import json
+import random
+import subprocess
+import sys
+
+import pytest
+
+import simulation
+from constants import *
+from game_logic import read_characters_zip
+from replay import describe, replay_game
+from terrain import load_terrain
+
+
+def test_simulation_does_not_import_arcade():
+    check = "import sys, simulation; sys.exit('arcade' in sys.modules)"
+    assert subprocess.run([sys.executable, "-c", check]).returncode == 0
+
+
+def test_get_stat_sums_active_effects():
+    rng = random.Random(2)
+    unit = simulation.Unit(role='enemy', json_data=dict(ENEMY_JSON), rng=rng)
+    stats = list(unit.stats_dict)
+    for turn in range(6):
+        for _ in range(10):
+            unit.add_effect(rng.choice(stats), rng.randint(-3, 3), rng.randint(1, 4))
+        for key in stats:
+            bonus = sum(effect['value'] for effect in unit.active_effects if effect['stat'] == key)
+            assert unit.get_stat(key) == (unit.stats_dict[key] + bonus, bonus, unit.stats_dict[key])
+        unit.update_effects_turn()
+
+
+def test_update_effects_turn_clears_temporary_stats():
+    unit = simulation.Unit(role='enemy', json_data=dict(ENEMY_JSON))
+    unit['temporary_armor'] = 3
+    version = unit.stats_version
+    unit.update_effects_turn()
+    assert unit['temporary_armor'] == 0 and unit.stats_version > version
+    version = unit.stats_version
+    unit.update_effects_turn()
+    assert unit.stats_version == version  # обнулять нечего - панель не перерисовывается
+
+
+@pytest.fixture(scope='module')
+def played():
+    """ Партия без окна на 120 ходов (или до исхода) и её лог после записи в json """
+    seed = 17
+    heroes_data = read_characters_zip("sample_heroes/heroes_1.zip")
+    grid, taverns = load_terrain(seed)
+    sim = simulation.Simulation(grid, seed, verbose=False)
+    sim.new_game(json.loads(json.dumps(heroes_data)), taverns)
+    while sim.turn_number < 120 and not sim.step_turn():
+        pass
+    return seed, heroes_data, sim, json.loads(json.dumps(sim.events))
+
+
+def test_replay_reproduces_game(played):
+    seed, heroes_data, sim, events = played
+    replayed = replay_game(seed, json.loads(json.dumps(heroes_data)), events)
+    assert describe(replayed) == describe(sim)
+    assert [(u.uid, u.cell, u.stats_dict) for u in replayed.enemies] == \
+           [(u.uid, u.cell, u.stats_dict) for u in sim.enemies]
+
+
+def test_replay_stops_at_turn(played):
+    seed, heroes_data, sim, events = played
+    middle = replay_game(seed, json.loads(json.dumps(heroes_data)), events, until_turn=sim.turn_number // 2)
+    assert middle.turn_number == sim.turn_number // 2
+
+
+def test_same_seed_plays_same_game(played):
+    seed, heroes_data, sim, events = played
+    again = simulation.Simulation(load_terrain(seed)[0], seed, verbose=False)
+    again.new_game(json.loads(json.dumps(heroes_data)), load_terrain(seed)[1])
+    while again.turn_number < sim.turn_number and not again.step_turn():
+        pass
+    assert json.loads(json.dumps(again.events)) == events
@@ -0,0 +1,69 @@
+""" Индексы по клеткам против перебора """
+import math
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from constants import *
+from spatial import LairIndex, SpatialHash
+
+
+def test_spatial_hash_finds_same_sprites_as_arcade():
+    arcade = pytest.importorskip('arcade')
+    rng = random.Random(5)
+    sprites = arcade.SpriteList()
+    index = SpatialHash()
+    for gx, gy in rng.sample([(x, y) for x in range(GRID_WIDTH) for y in range(GRID_HEIGHT)], 300):
+        sprite = arcade.SpriteSolidColor(TILE_SIZE, TILE_SIZE, color=arcade.color.RED)
+        sprite.position = (gx * TILE_SIZE + TILE_SIZE / 2, gy * TILE_SIZE + TILE_SIZE / 2)
+        sprites.append(sprite)
+        index.move(sprite, None, (gx, gy))
+    for _ in range(300):
+        x, y = rng.uniform(0, GRID_WIDTH * TILE_SIZE), rng.uniform(0, GRID_HEIGHT * TILE_SIZE)
+        assert set(arcade.get_sprites_at_point((x, y), sprites)) == set(index.at_point(x, y))
+
+
+def test_spatial_hash_follows_moves():
+    index = SpatialHash()
+    unit = object()
+    index.move(unit, None, (3, 4))
+    index.move(unit, (3, 4), (5, 4))
+    assert list(index.at((3, 4))) == [] and list(index.at((5, 4))) == [unit]
+    index.move(unit, (5, 4), None)
+    assert list(index.at((5, 4))) == []
+
+
+def make_lairs(cells):
+    index = LairIndex()
+    lairs = []
+    for gx, gy in cells:
+        lair = SimpleNamespace(center_x=gx * TILE_SIZE + TILE_SIZE / 2, center_y=gy * TILE_SIZE + TILE_SIZE / 2)
+        lairs.append(lair)
+        index.add(lair)
+    return index, lairs
+
+
+def dist2(cell, lair):
+    lx, ly = LairIndex.cell_of(lair)
+    return (lx - cell[0]) ** 2 + (ly - cell[1]) ** 2
+
+
+@pytest.mark.parametrize('count', [1, 3, 300])
+def test_lair_index_matches_brute_force(count):
+    rng = random.Random(count)
+    index, lairs = make_lairs(rng.sample([(x, y) for x in range(GRID_WIDTH) for y in range(GRID_HEIGHT)], count))
+    for _ in range(500):
+        cell = (rng.randrange(GRID_WIDTH), rng.randrange(GRID_HEIGHT))
+        assert dist2(cell, index.nearest(cell)) == min(dist2(cell, lair) for lair in lairs)
+        within = {id(lair) for lair in lairs if math.sqrt(dist2(cell, lair)) < LAIR_ACTIVATION_RADIUS}
+        assert {id(lair) for lair in index.within(cell, LAIR_ACTIVATION_RADIUS)} == within
+
+
+def test_lair_index_nearest_beyond_grid():
+    # Карта может быть больше GRID_WIDTH x GRID_HEIGHT: поиск не должен упираться в её размер
+    far = (GRID_WIDTH * 4, GRID_HEIGHT * 4)
+    index, lairs = make_lairs([far])
+    assert index.nearest((0, 0)) is lairs[0]
+    index.remove(lairs[0])
+    assert index.nearest((0, 0)) is None
@@ -0,0 +1,19 @@
+""" Общие текстуры надписей: одна текстура на (строку, цвет, размер) вместо новой при каждом вызове """
+from functools import lru_cache
+
+import arcade
+
+TEXT_CACHE_SIZE = 256  # надписей в кеше; самые давно не нужные выбрасываются
+
+
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def text_texture(text, color, font_size):
+    """ Текстура надписи; color - кортеж RGBA (arcade.color.* подходят) """
+    return arcade.create_text_sprite(text, color, font_size).texture
+
+
+def set_text(label, text, color=None):
+    """ Обновляет arcade.Text, только если надпись или цвет поменялись (иначе пересборки нет) """
+    label.text = text  # arcade.Text сам пропускает ту же строку
+    if color is not None and label.color != color:
+        label.color = color
@@ -0,0 +1,102 @@
+import numpy as np
+from PIL import Image
+
+from constants import *
+
+
+# Общий вершинный шейдер для слоёв, которые рисуются квадом поверх прямоугольника клеток (чанка)
+GRID_VERTEX_SHADER = """
+#version 330
+uniform WindowBlock {
+    mat4 projection;
+    mat4 view;
+} window;
+
+in vec2 in_vert;
+in vec2 in_uv;
+out vec2 v_cell;
+
+uniform vec2 origin;
+uniform vec2 grid_size;
+uniform float tile_size;
+
+void main() {
+    vec2 world = origin + in_vert * grid_size * tile_size;
+    gl_Position = window.projection * window.view * vec4(world, 0.0, 1.0);
+    v_cell = in_uv * grid_size;
+}
+"""
+
+TILE_FRAGMENT_SHADER = """
+#version 330
+uniform usampler2D tile_types;
+uniform sampler2D tile_atlas;
+uniform float tile_count;
+uniform float half_texel;
+
+in vec2 v_cell;
+out vec4 f_color;
+
+void main() {
+    float tile_type = float(texelFetch(tile_types, ivec2(floor(v_cell)), 0).r);
+    vec2 uv = clamp(fract(v_cell), half_texel, 1.0 - half_texel);
+    f_color = texture(tile_atlas, vec2((tile_type + uv.x) / tile_count, uv.y));
+}
+"""
+
+# Картинка и запасной цвет для каждого типа клетки (индекс = код TERRAIN_*).
+# Цвета - значения arcade.color.GREEN, FOREST_GREEN, DARK_SLATE_GRAY, GOLD: модуль не тянет arcade,
+# чтобы карту можно было разбирать в симуляции без окна
+TILE_IMAGES = (
+    ("images/meadow2.jpg", (0, 255, 0, 255)),
+    ("images/forest2.jpg", (34, 139, 34, 255)),
+    ("images/town_dark.jpg", (47, 79, 79, 255)),
+    ("images/bar2.jpg", (255, 215, 0, 255)),
+)
+TILE_TEXTURE_SIZE = 128
+
+
+class TileLayer:
+    """ Карта местности: типизированная сетка [x][y] с кодами TERRAIN_* """
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.width, self.height = grid.shape
+
+    def in_bounds(self, gx, gy):
+        return 0 <= gx < self.width and 0 <= gy < self.height
+
+    def type_at(self, gx, gy):
+        """ Тип клетки или None за пределами карты """
+        if not self.in_bounds(gx, gy):
+            return None
+        return int(self.grid[gx, gy])
+
+    def cells_of_type(self, *types):
+        """ Все клетки заданных типов в порядке обхода (x, затем y) """
+        return [tuple(c) for c in np.argwhere(np.isin(self.grid, types)).tolist()]
+
+    def chunk_types(self, x0, y0, w, h):
+        """ Байты типов прямоугольника клеток (строка за строкой по y) """
+        return np.ascontiguousarray(self.grid[x0:x0 + w, y0:y0 + h].T, dtype=np.uint8).tobytes()
+
+    @staticmethod
+    def cell_at(x, y):
+        """ Клетка сетки по мировым координатам """
+        return int(x // TILE_SIZE), int(y // TILE_SIZE)
+
+    @staticmethod
+    def cell_center(gx, gy):
+        return gx * TILE_SIZE + TILE_SIZE / 2, gy * TILE_SIZE + TILE_SIZE / 2
+
+
+def build_tile_atlas(size=TILE_TEXTURE_SIZE):
+    """ Склеивает картинки всех типов клеток в одну полосу """
+    atlas = Image.new('RGBA', (size * len(TILE_IMAGES), size))
+    for i, (path, color) in enumerate(TILE_IMAGES):
+        try:
+            image = Image.open(path).convert('RGBA').resize((size, size), Image.BILINEAR)
+        except:
+            image = Image.new('RGBA', (size, size), color)
+        atlas.paste(image, (i * size, 0))
+    return atlas.transpose(Image.FLIP_TOP_BOTTOM)
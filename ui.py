@@ -1,10 +1,18 @@
 import arcade
+import pyglet
 from arcade.gui import UIManager
 
 from constants import *
+from text_cache import set_text
 
 
 class CharacterInfoOverlay:
+    """
+    Панель персонажа. Раскладка строится один раз при показе; дальше панель следит за счётчиками
+    изменений сущности (stats_version, effects_version, abilities_version) и меняет текст только
+    тех строк, что поменялись. Прокрутка - сдвиг камеры панели, а не координат каждой надписи
+    """
+
     def __init__(self):
         self.visible = False
         self.entity = None
@@ -12,8 +20,6 @@ class CharacterInfoOverlay:
         self.scroll_y = 0
         self.padding = 35
         self.panel_width = 350
-        self.update_timer = 0
-        self.update_interval = 1
         self.scissor_bottom = self.padding * 1.5
         self.scissor_height = SCREEN_HEIGHT - self.padding * 3
         self.ability_buttons = []
@@ -23,40 +29,98 @@ class CharacterInfoOverlay:
 
         # Кешируем фон и список элементов
         self.background_texture = arcade.load_texture('images/info_panel.jpg')
+        self.batch = pyglet.graphics.Batch()  # все надписи панели - одна пачка
         self.ui_elements = []  # Здесь будем хранить объекты arcade.Text
+        self.status_labels = []  # строки HP и ОД
+        self.param_labels = {}  # параметр -> строка "база +бафф"
         self.sprite_list = arcade.SpriteList()  # Для превью
-        self.panel_sprite = None
+        self.scroll_camera = arcade.camera.Camera2D()
+        self.versions = None  # счётчики сущности, по которым построены строки
 
     def show(self, entity, position="left"):
         self.entity = entity
         self.visible = True
         self.position = position
         self.scroll_y = 0
-        self.ability_buttons = []
         self.manager = UIManager()
         self.rebuild_ui()
+        self._scroll_to(0)
         if entity.role == 'hero':
             self.manager.enable()
 
+    def _entity_versions(self):
+        # У NPC и предметов счётчиков нет - их панель не меняется
+        entity = self.entity
+        return (getattr(entity, 'stats_version', 0), getattr(entity, 'effects_version', 0),
+                getattr(entity, 'abilities_version', 0), len(entity.stats_dict))
+
     def update(self, delta_time):
-        if self.visible and self.entity:
-            self.update_timer += delta_time
-            if self.update_timer >= self.update_interval:
-                self.rebuild_ui()
-                self.update_timer = 0
+        if not self.visible or not self.entity:
+            return
+        versions = self._entity_versions()
+        if versions == self.versions:
+            return
+        if versions[2:] != self.versions[2:]:
+            # Новые способности или параметры меняют раскладку - строим заново
+            self.rebuild_ui()
+            self._update_button_positions()
+        else:
+            self.refresh_rows()
+        self.versions = versions
 
     def hide(self):
         self.manager.disable()
         self.visible = False
+        self._clear()
+
+    def _clear(self):
+        for element in self.ui_elements:
+            element.label.delete()
         self.ui_elements.clear()
+        self.status_labels.clear()
+        self.param_labels.clear()
         self.sprite_list.clear()
+        self.manager.clear()
+        self.ability_buttons = []
+
+    def _status_rows(self):
+        entity = self.entity
+        return [f"HP: {int(entity.get_stat('hp')[0])}/{int(entity.get_stat('max_hp')[0])}",
+                f"AP (ОД): {entity.get_stat('moves_left')[0]}"]
+
+    def _param_row(self, key):
+        _, buff, base = self.entity.get_stat(key)
+        text = f"{key}: {base}"
+        if buff != 0:
+            if buff > 0:
+                sign = '+'
+                color = arcade.color.GREEN
+            else:
+                sign = "-"
+                color = arcade.color.RED
+            text += f" {sign}{buff}"
+        else:
+            color = arcade.color.WHITE
+        return text, color
+
+    def _add_text(self, *args, **kwargs):
+        text = arcade.Text(*args, batch=self.batch, **kwargs)
+        self.ui_elements.append(text)
+        return text
+
+    def refresh_rows(self):
+        """ Обновляет строки статов и параметров; надписи с прежним текстом не пересобираются """
+        for label, text in zip(self.status_labels, self._status_rows()):
+            set_text(label, text)
+        for key, label in self.param_labels.items():
+            set_text(label, *self._param_row(key))
 
     def rebuild_ui(self):
-        self.ui_elements.clear()
-        self.sprite_list.clear()
+        self._clear()
 
         if not self.entity:
             return
+        self.versions = self._entity_versions()
 
         x_start = 0 if self.position == "left" else SCREEN_WIDTH - self.panel_width
         content_x = x_start + self.padding
@@ -64,10 +128,8 @@ class CharacterInfoOverlay:
 
         # 1. Имя
         name_text = getattr(self.entity, 'name', self.entity.role.capitalize())
-        self.ui_elements.append(arcade.Text(
-            name_text, x_start + self.panel_width // 2, current_y,
-            arcade.color.WHITE, 20, bold=True, anchor_x="center"
-        ))
+        self._add_text(name_text, x_start + self.panel_width // 2, current_y,
+                       arcade.color.WHITE, 20, bold=True, anchor_x="center")
         current_y -= self.padding * 2
         # 2. Картинка (Превью) - создаем спрайт
         preview = arcade.Sprite(self.entity.texture)
@@ -80,21 +142,14 @@ class CharacterInfoOverlay:
 
         # 3. Статы
         if self.entity.role in ('hero', 'bar_hero', 'enemy'):
-            stats_to_show = [
-                ("HP", f"{int(self.entity.get_stat('hp')[0])}/{int(self.entity.get_stat('max_hp')[0])}"),
-                ("AP (ОД)", f"{self.entity.get_stat('moves_left')[0]}")
-            ]
-
-            for label, val in stats_to_show:
-                self.ui_elements.append(arcade.Text(
-                    f"{label}: {val}", content_x, current_y, arcade.color.WHITE, 16
-                ))
+            for text in self._status_rows():
+                self.status_labels.append(self._add_text(text, content_x, current_y, arcade.color.WHITE, 16))
                 current_y -= 25
 
         current_y -= 20
         # 4. Способности
         text = "Способности:" if self.entity.role != 'npc' else 'Квесты:'
-        self.ui_elements.append(arcade.Text(text, content_x + 10, current_y, arcade.color.GOLD, 18))
+        self._add_text(text, content_x + 10, current_y, arcade.color.GOLD, 18)
         current_y -= 30
 
         if hasattr(self.entity, 'abilities'):
@@ -103,73 +158,54 @@ class CharacterInfoOverlay:
                 name = abil.get('name', 'Unnamed')
 
                 # Создаем кнопку через UIManager
-                if len(self.ability_buttons) != len(self.entity.abilities):
-                    btn = arcade.gui.UIFlatButton(text=f"• {name}",
-                                                  x=content_x, y=current_y - 25,
-                                                  width=self.panel_width - self.padding * 2)
+                btn = arcade.gui.UIFlatButton(text=f"• {name}",
+                                              x=content_x, y=current_y - 25,
+                                              width=self.panel_width - self.padding * 2)
 
-                    # Добавляем логику нажатия
-                    @btn.event("on_click")
-                    def on_click_ability(event, eff=effect):
-                        self.entity.selected_ability = eff
-                        print(f"Selected: {eff}")
+                # Добавляем логику нажатия
+                @btn.event("on_click")
+                def on_click_ability(event, eff=effect):
+                    self.entity.selected_ability = eff
+                    print(f"Selected: {eff}")
 
-                    # Сохраняем начальную Y позицию в самом объекте кнопки для скролла
-                    btn.base_y = btn.center_y
+                # Сохраняем начальную Y позицию в самом объекте кнопки для скролла
+                btn.base_y = btn.center_y
 
-                    self.manager.add(btn)
-                    self.ability_buttons.append(btn)
+                self.manager.add(btn)
+                self.ability_buttons.append(btn)
 
                 current_y -= 50  # Отступ после кнопки
 
                 # Эффект
-                eff_text = arcade.Text(
-                    f"Эффект: {abil.get('effect', 'None')}",
-                    content_x, current_y, arcade.color.VIOLET, 16,
-                    width=self.panel_width - 70, multiline=True
-                )
-                self.ui_elements.append(eff_text)
+                eff_text = self._add_text(f"Эффект: {abil.get('effect', 'None')}",
+                                          content_x, current_y, arcade.color.VIOLET, 16,
+                                          width=self.panel_width - 70, multiline=True)
                 current_y -= (eff_text.content_height + 10)
 
                 # Описание
-                desc_text = arcade.Text(
-                    abil.get('description', ''),
-                    content_x, current_y, arcade.color.WHITE, 14,
-                    width=self.panel_width - 70, multiline=True
-                )
-                self.ui_elements.append(desc_text)
+                desc_text = self._add_text(abil.get('description', ''),
+                                           content_x, current_y, arcade.color.WHITE, 14,
+                                           width=self.panel_width - 70, multiline=True)
                 current_y -= (desc_text.content_height + 20)
         # 5. Детальные параметры (База + Бафф)
-        self.ui_elements.append(arcade.Text("Параметры:", content_x + 10,
-                                            current_y, arcade.color.GOLD, 18))
+        self._add_text("Параметры:", content_x + 10, current_y, arcade.color.GOLD, 18)
         current_y -= 30
 
-        for key, val in self.entity.stats_dict.items():
-
-            base, buff = self.entity.get_stat(key)[-1], self.entity.get_stat(key)[1]
-
-            text = f"{key}: {base}"
-            if buff != 0:
-                if buff > 0:
-                    sign = '+'
-                    color = arcade.color.GREEN
-                else:
-                    sign = "-"
-                    color = arcade.color.RED
-                text += f" {sign}{buff}"
-            else:
-                color = arcade.color.WHITE
-
-            self.ui_elements.append(arcade.Text(text, content_x + 20, current_y, color, 16))
-
+        for key in self.entity.stats_dict:
+            text, color = self._param_row(key)
+            self.param_labels[key] = self._add_text(text, content_x + 20, current_y, color, 16)
             current_y -= 20
 
     def on_scroll(self, scroll_y):
         if self.visible:
-            self.scroll_y -= scroll_y * 20
             # Ограничение скролла
-            self.scroll_y = max(0, self.scroll_y)
-            self._update_button_positions()
+            self._scroll_to(max(0, self.scroll_y - scroll_y * 20))
+
+    def _scroll_to(self, scroll_y):
+        self.scroll_y = scroll_y
+        # Содержимое едет вверх - камера панели смотрит ниже
+        self.scroll_camera.position = (SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - scroll_y)
+        self._update_button_positions()
 
     def _update_button_positions(self):
         """Сдвигает кнопки UIManager вслед за скроллом"""
@@ -179,6 +215,7 @@ class CharacterInfoOverlay:
                 btn.visible = False
             else:
                 btn.visible = True
+
     def draw(self):
         if not self.visible or not self.entity or not self.sprite_list:
             return
@@ -190,22 +227,60 @@ class CharacterInfoOverlay:
             self.background_texture,
             arcade.rect.LBWH(x, 0, self.panel_width, SCREEN_HEIGHT)
         )
-        self.window.ctx.scissor = (x, self.scissor_bottom, self.panel_width, self.scissor_height)
-        # 2. Отрисовка элементов с учетом скролла
-        prev = self.sprite_list[-1]
-        original_y = prev.center_y
-        prev.center_y += self.scroll_y
-        if 0 < prev.bottom < SCREEN_HEIGHT:
+        scissor = (x, self.scissor_bottom, self.panel_width, self.scissor_height)
+        # 2. Содержимое панели целиком, со сдвигом камеры на прокрутку; лишнее отрезает scissor
+        # (камера при включении сбрасывает scissor, поэтому он задаётся уже после неё)
+        with self.scroll_camera.activate():
+            self.window.ctx.scissor = scissor
             self.sprite_list.draw()
-        prev.center_y = original_y
+            self.batch.draw()
+        self.window.ctx.scissor = scissor
+        self.manager.draw()
+        self.window.ctx.scissor = None
 
 
-        for element in self.ui_elements:
-            original_y = element.y
-            element.y += self.scroll_y
-            # Рисуем только если элемент в пределах экрана
-            if 0 < element.y < SCREEN_HEIGHT:
-                element.draw()
-            element.y = original_y  # Возвращаем обратно
-        self.manager.draw()
-        self.window.ctx.scissor = None
\ No newline at end of file
+class ProfilerOverlay:
+    """ Таблица зон профилировщика поверх игры (F3) """
+
+    def __init__(self, profiler, rows=16, refresh_interval=0.5):
+        self.profiler = profiler
+        self.visible = False
+        self.refresh_interval = refresh_interval
+        self.refresh_timer = 0
+        self.always_on = profiler.enabled  # включён переменной окружения - пишет и без таблицы
+        x, top = 10, SCREEN_HEIGHT - 10
+        line_height = 16
+        self.background = arcade.rect.LBWH(0, top - line_height * (rows + 1) - 6, 470, line_height * (rows + 1) + 16)
+        # Строки создаются один раз, дальше меняется только текст
+        self.lines = [arcade.Text("", x, top - line_height * (i + 1), arcade.color.WHITE, 11, font_name="Courier New")
+                      for i in range(rows + 1)]
+        self.lines[0].text = f"{'зона':<24}{'p50':>8}{'p95':>8}{'p99':>8}  мс"
+        self.lines[0].color = arcade.color.YELLOW
+
+    def toggle(self):
+        self.visible = not self.visible
+        # Замеры нужны, только пока на них смотрят
+        self.profiler.enable(self.visible or self.always_on)
+        self.refresh_timer = self.refresh_interval
+
+    def update(self, delta_time):
+        if not self.visible:
+            return
+        self.refresh_timer += delta_time
+        if self.refresh_timer < self.refresh_interval:
+            return
+        self.refresh_timer = 0
+        report = self.profiler.report()
+        for i, line in enumerate(self.lines[1:]):
+            if i < len(report):
+                name, p50, p95, p99, _ = report[i]
+                line.text = f"{name:<24}{p50:>8.2f}{p95:>8.2f}{p99:>8.2f}"
+            else:
+                line.text = ""
+
+    def draw(self):
+        if not self.visible:
+            return
+        arcade.draw_rect_filled(self.background, (0, 0, 0, 180))
+        for line in self.lines:
+            line.draw()
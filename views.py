@@ -1,60 +1,78 @@
 import datetime
 import arcade
+import pyglet
 from entities import NPC
 from arcade.gui import UIManager
 from arcade.gui.widgets.layout import UIAnchorLayout
 import random
-import math
-from perlin_noise import PerlinNoise
 from constants import *
 from entities import Entity, Lair, ShopItem
-from game_logic import bfs_path, apply_ability, load_characters_from_zip
-from ui import CharacterInfoOverlay
+from game_logic import load_characters_from_zip, validate_builtin_effects
+from ui import CharacterInfoOverlay, ProfilerOverlay
 from effects import EffectManager
+from fog import FogOfWar
+from chunks import ChunkManager
+from terrain import load_terrain
+from tilemap import TileLayer
+from simulation import Simulation
 import database
+from autosave import AutosaveService
+from profiler import PROFILER
+from text_cache import set_text
+from assets import AssetLoader, AssetRegistry, load_sound
+from frames import FramePlayer, ensure_pack
 
 
 class ResourceManager:
-    start_frames = []
-    lose_frames = []
-    loaded = False
+    start_animation = None
+    loader = None
+    assets = None  # AssetRegistry: финальные экраны, загружаются при первом обращении
 
     @classmethod
     def load_resources(cls):
-        if cls.loaded:
+        """
+        Ставит ресурсы в очередь фоновой загрузки. Порядок = приоритет: сначала всё для стартового меню,
+        потом звуки игры. Анимация меню читается из упакованного файла кадров (frames.py) по ходу показа.
+        Финальные экраны только описываются: до них доходит не каждая партия
+        """
+        if cls.loader is not None:
             return
-        try:
-            for i in range(51):
-                filename = f"images/start_menu/start_menu_{i:03d}.jpg"
-                cls.start_frames.append(arcade.load_texture(filename))
-        except:
-            pass
-        try:
-            for i in range(51):
-                filename = f"images/lose_menu/lose_menu_{i:03d}.jpg"
-                cls.lose_frames.append(arcade.load_texture(filename))
-            cls.win_image = arcade.load_texture('images/win.png')
-        except:
-            pass
-        # Загрузка звуков (заглушки при ошибке)
-        try:
-            cls.start_music = arcade.load_sound('sound/Dota_2_-_Main_Menu_Flute_Theme_75018976.mp3')
-            cls.lose_music = arcade.load_sound('sound/Giulio-Fazio-Wandering-Knight_lose_misic.mp3')
-            cls.game_music = arcade.load_sound('sound/backgound_witcher.mp3')
-            cls.bar_music = arcade.load_sound('sound/tavern_witcher.mp3')
-            cls.win_sound = arcade.load_sound('sound/mixkit-medieval-show-fanfare-announcement-226.wav')
-            cls.click_sound = arcade.load_sound('sound/click.mp3')
-        except:
-            cls.start_music = arcade.load_sound(':resources:/music/1918.mp3')
-            cls.lose_music = arcade.load_sound(':resources:/music/1918.mp3')
-            cls.game_music = arcade.load_sound(':resources:/music/1918.mp3')
-            cls.bar_music = arcade.load_sound(':resources:/music/funkyrobot.mp3')
-        try:
-            cls.button = arcade.load_texture('images/button.png')
-            cls.hover_button = arcade.load_texture('images/hover_button.png')
-        except:
-            cls.button = arcade.load_texture(':resources:/gui_basic_assets/button/red_normal.png')
-            cls.hover_button = arcade.load_texture(':resources:/gui_basic_assets/button/red_hover.png')
+        validate_builtin_effects()  # некорректные эффекты отбрасываем сразу, а не посреди хода
+        loader = cls.loader = AssetLoader(autoupdate=True)
+        loader.reserve_atlas(ATLAS_SIZE)
+
+        def keep(name):
+            return lambda value: setattr(cls, name, value)
+
+        def sound(name, path, fallback=None):
+            return lambda: setattr(cls, name, load_sound(path, fallback))
+
+        def start_animation(path):
+            cls.start_animation = FramePlayer(path, frame_time=0.065)
+
+        # 1. Меню: кнопки, анимация фона (файл кадров собирается при первом запуске), музыка и щелчок
+        loader.texture('images/button.png', keep('button'), 'menu',
+                       fallback=':resources:/gui_basic_assets/button/red_normal.png')
+        loader.texture('images/hover_button.png', keep('hover_button'), 'menu',
+                       fallback=':resources:/gui_basic_assets/button/red_hover.png')
+        loader.run(ensure_pack, start_animation, 'menu', 'images/start_menu', 'images/start_menu.frames')
+        loader.call(sound('start_music', 'sound/Dota_2_-_Main_Menu_Flute_Theme_75018976.mp3',
+                          ':resources:/music/1918.mp3'), 'menu')
+        loader.call(sound('click_sound', 'sound/click.mp3'), 'menu')
+        # 2. Звуки партии и бара (заглушка при ошибке - у каждого файла своя); их ждёт GameView.setup
+        loader.call(sound('game_music', 'sound/backgound_witcher.mp3', ':resources:/music/1918.mp3'), 'game')
+        loader.call(sound('bar_music', 'sound/tavern_witcher.mp3', ':resources:/music/funkyrobot.mp3'), 'game')
+        # 3. Финальные экраны: загрузка при первом обращении или заранее (GameView.warm_end_screens)
+        assets = cls.assets = AssetRegistry(loader)
+        cls.lose_music = assets.sound('lose_music', 'sound/Giulio-Fazio-Wandering-Knight_lose_misic.mp3',
+                                      ':resources:/music/1918.mp3')
+        cls.win_sound = assets.sound('win_sound', 'sound/mixkit-medieval-show-fanfare-announcement-226.wav')
+        cls.win_image = assets.texture('win_image', 'images/win.png', size=(SCREEN_WIDTH, SCREEN_HEIGHT))
+        cls.lose_animation = assets.add('lose_animation', cls._lose_animation, lambda player: player.resident_bytes,
+                                        release=FramePlayer.release)
+        # Файл кадров поражения собирается заранее в фоне, чтобы первый проигрыш его не ждал
+        loader.run(ensure_pack, lambda path: None, 'packs', 'images/lose_menu', 'images/lose_menu.frames')
+
         try:
             conn = database.get_connection()
             cursor = conn.cursor()
@@ -69,7 +87,17 @@ class ResourceManager:
         except:
             pass
 
-        cls.loaded = True
+    @staticmethod
+    def _lose_animation():
+        animation = FramePlayer(ensure_pack('images/lose_menu', 'images/lose_menu.frames'), frame_time=0.05)
+        animation.rewind()  # первые кадры начинают декодироваться сразу
+        return animation
+
+    @classmethod
+    def wait(cls, *groups):
+        """ Догружает группы немедленно """
+        if cls.loader is not None:
+            cls.loader.wait(*groups)
 
 
 class LoadingView(arcade.View):
@@ -79,11 +107,13 @@ class LoadingView(arcade.View):
             self.logo = arcade.load_texture("images/logo.png")
         except:
             self.logo = arcade.load_texture(':resources:/images/pinball/bumper.png')
-        self.loaded_frame_count = 0
+        self.progress_text = arcade.Text("", SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2 - 200, arcade.color.WHITE, 16,
+                                         anchor_x="center")
 
     def on_show_view(self):
         arcade.set_background_color(arcade.color.BLACK)
         database.init_db()  # Инициализация БД при запуске
+        ResourceManager.load_resources()
 
     def on_draw(self):
         self.clear()
@@ -93,11 +123,17 @@ class LoadingView(arcade.View):
         else:
             arcade.draw_text("LOADING...", SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2, arcade.color.WHITE, 30,
                              anchor_x="center")
+        # Полоса загрузки того, что нужно меню
+        progress = ResourceManager.loader.progress('menu')
+        bar = arcade.rect.LBWH(SCREEN_WIDTH / 2 - 150, SCREEN_HEIGHT / 2 - 180, 300, 12)
+        arcade.draw_rect_filled(arcade.rect.LBWH(bar.left, bar.bottom, bar.width * progress, bar.height),
+                                arcade.color.WHITE)
+        arcade.draw_rect_outline(bar, arcade.color.WHITE, 2)
+        set_text(self.progress_text, f"{int(progress * 100)}%")
+        self.progress_text.draw()
 
     def on_update(self, delta_time):
-        self.loaded_frame_count += 1
-        if self.loaded_frame_count > 1:
-            ResourceManager.load_resources()
+        if ResourceManager.loader.done('menu') and ResourceManager.start_animation.ready:
             self.window.show_view(StartView())
 
 
@@ -105,8 +141,6 @@ class StartView(arcade.View):
     def __init__(self):
         super().__init__()
         self.view_camera = arcade.camera.Camera2D()
-        self.current_frame = 0
-        self.anim_timer = 0.0
         self.manager = UIManager()
         self.manager.enable()
         self.anchor_layout = UIAnchorLayout()
@@ -118,7 +152,7 @@ class StartView(arcade.View):
         self.select_save = True
         ResourceManager.click_sound.play()
         self.manager.disable()
-        self.window.show_view(SaveListView(self, self.current_frame))
+        self.window.show_view(SaveListView(self))
 
 
     def on_click_new_game(self, event):
@@ -148,18 +182,13 @@ class StartView(arcade.View):
         self.manager.enable()
 
     def on_update(self, delta_time):
-        if ResourceManager.start_frames:
-            self.anim_timer += delta_time
-            if self.anim_timer > 0.065:
-                self.anim_timer = 0
-                self.current_frame = (self.current_frame + 1) % len(ResourceManager.start_frames)
+        ResourceManager.start_animation.update(delta_time)
 
     def on_draw(self):
         self.clear()
         self.view_camera.use()
-        if ResourceManager.start_frames:
-            texture = ResourceManager.start_frames[self.current_frame]
-            arcade.draw_texture_rect(texture, arcade.rect.LBWH(0, 0, self.width, self.height))
+        if ResourceManager.start_animation.available:
+            ResourceManager.start_animation.draw(arcade.rect.LBWH(0, 0, self.width, self.height))
         else:
             arcade.draw_text("МЕНЮ", SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2, arcade.color.WHITE, 30, anchor_x="center")
         self.manager.draw()
@@ -203,7 +232,7 @@ class StartView(arcade.View):
         self.anchor_layout.add(anchor_x="left", anchor_y="center_y", align_x=55, align_y=-50, child=self.v_box)
 
 class SaveListView(arcade.View):
-    def __init__(self, main_menu_view, cur_frame):
+    def __init__(self, main_menu_view):
         super().__init__()
         self.main_menu_view = main_menu_view
         self.manager = arcade.gui.UIManager()
@@ -249,8 +278,6 @@ class SaveListView(arcade.View):
         self.anchor = arcade.gui.UIAnchorLayout()
         self.anchor.add(anchor_x="center_x", anchor_y="center_y", child=self.v_box)
         self.manager.add(self.anchor)
-        self.anim_timer = 0
-        self.current_frame = cur_frame
 
     def on_click_quit(self, event):
         self.manager.disable()
@@ -272,50 +299,41 @@ class SaveListView(arcade.View):
 
     def on_draw(self):
         self.clear()
-        if ResourceManager.start_frames:
-            texture = ResourceManager.start_frames[self.current_frame]
-            arcade.draw_texture_rect(texture, arcade.rect.LBWH(0, 0, self.width, self.height))
+        ResourceManager.start_animation.draw(arcade.rect.LBWH(0, 0, self.width, self.height))
         self.manager.draw()
+
     def on_update(self, delta_time):
-        if ResourceManager.start_frames:
-            self.anim_timer += delta_time
-            if self.anim_timer > 0.065:
-                self.anim_timer = 0
-                self.current_frame = (self.current_frame + 1) % len(ResourceManager.start_frames)
-                self.main_menu_view.current_frame = (self.current_frame + 1) % len(ResourceManager.start_frames)
+        # Проигрыватель общий с главным меню: после возврата анимация идёт дальше с того же кадра
+        ResourceManager.start_animation.update(delta_time)
 
 class GameEndView(arcade.View):
     def __init__(self, win=False):
         super().__init__()
         self.view_camera = arcade.camera.Camera2D()
-        self.current_frame = 0
         self.win = win
-        self.anim_timer = 0.0
 
 
     def on_show_view(self):
         if not self.win:
-            self.player = ResourceManager.lose_music.play(loop=True, speed=0.75)
+            self.player = ResourceManager.lose_music.get().play(loop=True, speed=0.75)
+            ResourceManager.lose_animation.get().rewind()
         else:
-            self.player = ResourceManager.win_sound.play(volume=0.75)
+            self.player = ResourceManager.win_sound.get().play(volume=0.75)
         arcade.set_background_color(arcade.color.BLACK)
 
     def on_update(self, delta_time):
-        if ResourceManager.lose_frames and not self.win:
-            self.anim_timer += delta_time
-            if self.anim_timer > 0.05:
-                self.anim_timer = 0
-                self.current_frame = (self.current_frame + 1) % len(ResourceManager.lose_frames)
+        if not self.win:
+            ResourceManager.lose_animation.get().update(delta_time)
 
     def on_draw(self):
         self.clear()
         self.view_camera.use()
-        if ResourceManager.lose_frames and not self.win:
-            texture = ResourceManager.lose_frames[self.current_frame]
-            arcade.draw_texture_rect(texture, arcade.rect.LBWH(0, 0, self.width, self.height))
-        elif self.win:
-            arcade.draw_texture_rect(ResourceManager.win_image,
-                                     arcade.rect.LBWH(0, 0, self.width, self.height))
+        animation = None if self.win else ResourceManager.lose_animation.get()
+        win_image = ResourceManager.win_image.get() if self.win else None
+        if animation is not None and animation.available:
+            animation.draw(arcade.rect.LBWH(0, 0, self.width, self.height))
+        elif win_image:
+            arcade.draw_texture_rect(win_image, arcade.rect.LBWH(0, 0, self.width, self.height))
         else:
             arcade.draw_text("GAME END",
                              SCREEN_WIDTH / 2, SCREEN_HEIGHT / 2, arcade.color.RED, 50, anchor_x="center")
@@ -390,6 +408,17 @@ class BarView(arcade.View):
         self.near_npc = None
         self.npc_phrase = ''
 
+        # Надписи бара создаются здесь один раз; ценники не меняются и рисуются одной пачкой
+        self.price_batch = pyglet.graphics.Batch()
+        self.price_labels = [arcade.Text(f"{item.price}$", item.center_x, item.top + 10, arcade.color.GOLD, 24,
+                                         anchor_x="center", batch=self.price_batch) for item in self.items_list]
+        self.phrase_text = arcade.Text("", 0, 0, arcade.color.BLACK, 14, anchor_x="center", anchor_y="center")
+        self.hud_batch = pyglet.graphics.Batch()
+        self.coins_text = arcade.Text("", SCREEN_WIDTH - 20, SCREEN_HEIGHT - 20, arcade.color.GOLD, 20,
+                                      anchor_x="right", anchor_y="top", batch=self.hud_batch)
+        self.quest_text = arcade.Text("", SCREEN_WIDTH // 2, SCREEN_HEIGHT - 40, font_size=24, width=250,
+                                      multiline=True, anchor_x='center', batch=self.hud_batch)
+
         # Игрок
         self.player_sprite = Entity(self.game_view.selected_unit.image_path,'bar_hero',
                              stats_dict=self.game_view.selected_unit.stats_dict)
@@ -414,62 +443,32 @@ class BarView(arcade.View):
         self.camera.use()
         self.scene.draw()
         if self.near_npc and self.npc_phrase:
-            text = self.npc_phrase
             padding = 10
             font_size = 14
+            set_text(self.phrase_text, self.npc_phrase)
+            self.phrase_text.position = (self.near_npc.center_x, self.near_npc.top + 20)
 
-            # Размер текста
-            text_width = arcade.create_text_sprite(text, arcade.color.BLACK, font_size).width
-            text_height = font_size + 4
-
-            x = self.near_npc.center_x
-            y = self.near_npc.top + 20
-
-            # Белый фон
+            # Белый фон по размеру текста
             arcade.draw_rect_filled(arcade.rect.XYWH(
-                x,
-                y,
-                text_width + padding * 2,
-                text_height + padding,
+                self.phrase_text.x,
+                self.phrase_text.y,
+                self.phrase_text.content_width + padding * 2,
+                font_size + 4 + padding,
             ), arcade.color.WHITE)
-
-            # Текст
-            arcade.draw_text(
-                text,
-                x,
-                y,
-                arcade.color.BLACK,
-                font_size,
-                anchor_x="center",
-                anchor_y="center"
-            )
+            self.phrase_text.draw()
         self.effect_manager.draw()
 
         # Рисуем ценники над предметами
-        for item in self.items_list:
-            arcade.draw_text(
-                f"{item.price}$",
-                item.center_x,
-                item.top + 10,
-                arcade.color.GOLD,
-                24,
-                anchor_x="center"
-            )
+        self.price_batch.draw()
 
         # Рисуем UI поверх всего
         self.game_view.ui_camera.use()
-        # Отображаем текущее золото игрока
-        coins = getattr(self.game_view, 'coins', 0)
-        arcade.draw_text(f"Золото: {coins}", SCREEN_WIDTH - 20, SCREEN_HEIGHT - 20,
-                         arcade.color.GOLD, 20, anchor_x="right", anchor_y="top")
-
-        if self.game_view.active_quest:
-            q = self.game_view.active_quest
-            arcade.draw_text(
-                f"Квест: {q['text']} ({q['progress']}/{q['target']})",
-                x=SCREEN_WIDTH // 2, y=SCREEN_HEIGHT - 40,
-                width=250, multiline=True, font_size=24, anchor_x='center'
-            )
+        # Отображаем текущее золото игрока и квест
+        sim = self.game_view.sim
+        q = sim.active_quest
+        set_text(self.coins_text, f"Золото: {sim.coins}")
+        set_text(self.quest_text, f"Квест: {q['text']} ({q['progress']}/{q['target']})" if q else "")
+        self.hud_batch.draw()
 
         self.ui_overlay.draw()
 
@@ -495,7 +494,7 @@ class BarView(arcade.View):
         if closest:
             npc, dist = closest
             if dist < (30 * self.scale) * 1.3:
-                phrase = npc.get_random_phrase(self.game_view, delta_time=delta_time)
+                phrase = npc.get_random_phrase(self.game_view.sim, delta_time=delta_time)
                 self.npc_phrase = phrase if phrase else self.npc_phrase
                 self.near_npc = npc
             else:
@@ -530,26 +529,19 @@ class BarView(arcade.View):
             self.player_sprite.change_x = PLAYER_BAR_SPEED
         if key == arcade.key.E:
             if self.near_npc:
-                if self.game_view.active_quest and self.game_view.active_quest["type"] == "return_to_bar":
-                    print("Вы приняли финальный квест.")
-                    # Засчитываем "возврат в бар"
-                    self.game_view.active_quest["progress"] = 1
-                    self.game_view.check_quest_complete()
-
-                    # Спавним босса
+                sim = self.game_view.sim
+                if sim.active_quest and sim.active_quest["type"] == "return_to_bar":
+                    # Засчитываем "возврат в бар" и спавним босса
+                    sim.return_to_bar()
                     self.ui_overlay.hide()
                     arcade.stop_sound(self.bar_player)
                     self.window.show_view(self.game_view)
-                    self.game_view.spawn_boss()
                 else:
                     # Обычные квесты как раньше
-                    if not self.game_view.active_quest:
+                    if not sim.active_quest:
                         q = self.near_npc.get_random_quest()
                         if q:
-                            quest = dict(q)
-                            quest["progress"] = 0
-                            self.game_view.active_quest = quest
-                            print("Получен квест:", quest["text"])
+                            sim.take_quest(q)
                         return
                     else:
                         self.npc_phrase = "У тебя уже есть задание."
@@ -558,20 +550,15 @@ class BarView(arcade.View):
             if closest_item:
                 item, dist = closest_item
                 if dist < (30 * self.scale) * 1.3:  # Если стоим рядом
-                    cost = item.price
-                    current_coins = getattr(self.game_view, 'coins', 0)
-
-                    if current_coins >= cost:
-                        self.game_view.coins = current_coins - cost
-                        buyer = self.game_view.selected_unit
-                        if buyer:
-                            self.effect_manager.add_buy_effect(item.center_x, item.center_y)
-                            self.player_sprite.equip_item(item)  # применяем к временному персонажу в баре
-                            buyer.equip_item(item)  # применяем к основному персонажу
-                            print("Предмет куплен!")
-                            # Удаляем предмет
-                            item.remove_from_sprite_lists()
-                            self.ui_overlay.hide()
+                    buyer = self.game_view.selected_unit
+                    # Статы и способности временного персонажа в баре - те же словари, что у основного,
+                    # поэтому предмет применяется один раз, к основному
+                    if buyer and self.game_view.sim.buy_item(buyer, item):
+                        self.effect_manager.add_buy_effect(item.center_x, item.center_y)
+                        print("Предмет куплен!")
+                        # Удаляем предмет
+                        item.remove_from_sprite_lists()
+                        self.ui_overlay.hide()
                     else:
                         print("Недостаточно золота!")
         elif key == arcade.key.ESCAPE:
@@ -589,16 +576,18 @@ class BarView(arcade.View):
 
 
 class GameView(arcade.View):
+    """ Окно партии: рисует состояние Simulation, проигрывает анимации и переводит клики в ходы """
+
     def __init__(self, name='not_named', time=''):
         super().__init__()
         self.map_seed = None  # Для сохранения
-        self.tile_list = None
+        self.sim = None
+        self.terrain = None
+        self.lair_sprites = None
         self.entity_list = None
         self.effect_manager = EffectManager()
-        self.fog_list = None
-        self.enemy_list = None
-        self.heroes_list = None
-        self.lairs_list = []
+        self.fog = None
+        self.chunk_manager = None
         self.camera = None
         self.camera_vel = [0, 0]
         self.camera_mode = "FOLLOW"
@@ -608,308 +597,110 @@ class GameView(arcade.View):
         self.pending_buffs = []
         self.name = name
         self.time_of_creation = time
+        self.autosave = None
+        self.hero_count = 0  # героев на прошлом кадре: когда их становится меньше, греем экран поражения
+        self.profiler_overlay = ProfilerOverlay(PROFILER)
         arcade.set_background_color(arcade.color.BLACK)
 
     def on_show_view(self):
         self.background_music_player = ResourceManager.game_music.play(volume=0.4, loop=True)
 
     def setup(self, load_data=None):
-        self.tile_list = arcade.SpriteList()
+        ResourceManager.wait('game')  # партию могли начать раньше, чем догрузилась музыка
+        self.lair_sprites = arcade.SpriteList()
         self.entity_list = arcade.SpriteList()
-        self.enemy_list = arcade.SpriteList()
-        self.heroes_list = arcade.SpriteList()
-        self.fog_list = arcade.SpriteList()
-        self.towns = arcade.SpriteList()
-        self.forests = arcade.SpriteList()
+        self.fog = FogOfWar(GRID_WIDTH, GRID_HEIGHT)
         self.ui_camera = arcade.camera.Camera2D()
         self.char_info_overlay = CharacterInfoOverlay()
-        self.coins = 75
-        self.active_quest = None
-        self.reputation = 0
-        self.boss_spawned = False
-        self.boss_entity = None
-        self.final_quest_unlocked = False
-        self.lairs_list = []
         self.camera = arcade.camera.Camera2D()
+        if self.autosave is None:
+            self.autosave = AutosaveService()
 
         # 1. Генерация карты (из сохранения или новая)
         if load_data:
             self.map_seed = load_data['world']['seed']
-            self.coins = load_data['world']['coins']
-            self.reputation = load_data['world']['rep']
-            self.active_quest = load_data['world']['quest']
-
-            random.seed(self.map_seed)  # Восстанавливаем рандом для карты
         else:
             self.map_seed = random.randint(1, 100000)
-            random.seed(self.map_seed)
-
-        noise = PerlinNoise(octaves=4, seed=self.map_seed)
-
-        self.grid_types = [['meadow' for _ in range(GRID_HEIGHT)] for _ in range(GRID_WIDTH)]
-        tavern_locations = []
-        valid_spawn_tiles = []
-        for x in range(GRID_WIDTH):
-            for y in range(GRID_HEIGHT):
-                n = noise([x / GRID_WIDTH, y / GRID_HEIGHT])
-                tile_type = "meadow"
-                if n < -0.10:
-                    tile_type = "forest"
-                elif n > 0.275:
-                    tile_type = "town"
-                self.grid_types[x][y] = tile_type
-
-        for x in range(GRID_WIDTH):
-            for y in range(GRID_HEIGHT):
-                tile_type = self.grid_types[x][y]
-                if tile_type == "town":
-                    valid = True
-                    for dx in range(-1, 2):
-                        for dy in range(-1, 2):
-                            nx, ny = x + dx, y + dy
-                            if not (1 < nx < GRID_WIDTH and 1 < ny < GRID_HEIGHT) or self.grid_types[nx][ny] != 'town':
-                                valid = False
-                    if valid:
-                        too_close = any(math.sqrt((x - tx) ** 2 + (y - ty) ** 2) < 17 for tx, ty in tavern_locations)
-                        if not too_close:
-                            tile_type = "bar"
-                            tavern_locations.append((x, y))
-
-                img_file = "images/meadow2.jpg"
-                if tile_type == "forest":
-                    img_file = "images/forest2.jpg"
-                elif tile_type == "town":
-                    img_file = "images/town_dark.jpg"
-                elif tile_type == "bar":
-                    img_file = "images/bar2.jpg"
+        random.seed(self.map_seed)  # Восстанавливаем рандом для карты
 
-                try:
-                    tile = arcade.Sprite(img_file)
-                    if tile_type in ('bar', 'town'):
-                        self.towns.append(tile)
-                    elif tile_type == 'forest':
-                        self.forests.append(tile)
-                except:
-                    color = arcade.color.GREEN
-                    if tile_type == 'town':
-                        color = arcade.color.DARK_SLATE_GRAY
-                    elif tile_type == 'bar':
-                        color = arcade.color.GOLD
-                    elif tile_type == 'forest':
-                        color = arcade.color.FOREST_GREEN
-                    tile = arcade.SpriteSolidColor(TILE_SIZE, TILE_SIZE, color)
-
-                tile.width = TILE_SIZE
-                tile.height = TILE_SIZE
-                tile.center_x = x * TILE_SIZE + TILE_SIZE / 2
-                tile.center_y = y * TILE_SIZE + TILE_SIZE / 2
-                tile.properties = {'type': tile_type, 'grid_x': x, 'grid_y': y}
-                self.tile_list.append(tile)
-                if tile_type == "bar":
-                    valid_spawn_tiles.append(tile)
-
-                try:
-                    fog = arcade.Sprite("images/_fog.png")
-                except:
-                    fog = arcade.SpriteSolidColor(TILE_SIZE, TILE_SIZE, arcade.color.GRAY)
-                fog.center_x = tile.center_x
-                fog.center_y = tile.center_y
-                fog.width = TILE_SIZE
-                fog.height = TILE_SIZE
-                fog.alpha = 255
-                self.fog_list.append(fog)
+        # grid_types[x][y] - код клетки (TERRAIN_*), таверны уже отмечены как TERRAIN_BAR
+        self.grid_types, tavern_locations = load_terrain(self.map_seed, GRID_WIDTH, GRID_HEIGHT)
+        self.sim = Simulation(self.grid_types, self.map_seed, unit_factory=Entity, lair_factory=Lair)
+        self.sim.on_unit_added = self.entity_list.append
+        self.sim.on_lair_added = self.lair_sprites.append
+        self.terrain = self.sim.terrain
+        self.chunk_manager = ChunkManager(self.terrain, self.fog)
 
         # 2. Загрузка сущностей
-        if load_data:
-            # Восстанавливаем сущности из БД
-            for ent_data in load_data['entities']:
-                if ent_data['role'] == 'hero':
-                    hero = Entity(ent_data['image_path'], "hero", stats_dict=ent_data['stats'])
-                    hero.name = ent_data['name']
-                    hero.active_effects = ent_data['effects']
-                    hero.abilities = ent_data['abilities']
-                    hero.inventory = ent_data['inventory']
-                    hero.center_x, hero.center_y = ent_data['x'], ent_data['y']
-                    self.entity_list.append(hero)
-                    self.heroes_list.append(hero)
-                else:
-                    is_guardian = ent_data['is_guardian']
-                    enemy = Entity(ent_data['image_path'], "enemy", stats_dict=ent_data['stats'])
-                    enemy.name = ent_data['name']
-                    enemy.active_effects = ent_data['effects']
-                    enemy.abilities = ent_data['abilities']
-                    enemy.inventory = ent_data['inventory']
-                    enemy.is_guardian = is_guardian
-                    enemy.is_boss = ent_data['is_boss']
-                    if enemy.is_boss:
-                        self.boss_entity = enemy
-                        self.boss_spawned = True
-                        self.active_quest = FINAL_FIGHT_QUEST
-                        self.active_quest['progress'] = 0
-                    enemy.center_x, enemy.center_y = ent_data['x'], ent_data['y']
-                    self.entity_list.append(enemy)
-                    self.enemy_list.append(enemy)
-
-            # Восстанавливаем логова
-            for l_data in load_data['lairs']:
-                lair = Lair((l_data['x'], l_data['y']))
-                lair.center_x, lair.center_y = l_data['x'], l_data['y']
-                lair.guardians_needed = l_data['guardians_needed']
-                lair.next_spawn_interval = l_data['next_spawn_interval']
-                lair.guardians_spawned = l_data['guardians_spawned']
-                self.lairs_list.append(lair)
-                self.tile_list.append(lair)
-
+        if load_data and load_data.get('replay'):
+            # Партию проигрываем заново по логу: так и потоки случайных чисел продолжатся с того же места
+            replay = load_data['replay']
+            self.sim.new_game(replay['heroes'], tavern_locations)
+            self.sim.verbose = False  # сообщения этих ходов игрок уже видел
+            self.sim.fast_forward(replay['events'])
+            self.sim.verbose = True
+            for entity in self.entity_list:
+                entity.path_queue.clear()
+                entity.place(entity.cell)
+        elif load_data:
+            self.sim.load_game(load_data)
         else:
-            # Новая игра
-            if not valid_spawn_tiles: valid_spawn_tiles.append(self.tile_list[GRID_WIDTH + GRID_WIDTH // 2])
-            spawn_point = random.choice(valid_spawn_tiles)
             heroes = load_characters_from_zip()
             if not heroes:
                 self.success = False
                 return
             self.success = True
             self.time_of_creation = str(datetime.datetime.now())[:-7]
-            positions = [
-                (spawn_point.position[0] - TILE_SIZE, spawn_point.position[1] - TILE_SIZE),
-                (spawn_point.position[0] + TILE_SIZE, spawn_point.position[1] - TILE_SIZE),
-                (spawn_point.position[0] - TILE_SIZE, spawn_point.position[1] + TILE_SIZE),
-                (spawn_point.position[0] + TILE_SIZE, spawn_point.position[1] + TILE_SIZE)
-            ]
-            # Создаем героев
-            for i in range(len(heroes)):
-                hero = Entity(f"images/hero_{i + 1}.jpg", "hero", json_data=heroes[i])
-                hero.position = positions[i]
-                self.entity_list.append(hero)
-                self.heroes_list.append(hero)
-
-            # создаем логова
-            spawn_gx = spawn_point.properties['grid_x']
-            spawn_gy = spawn_point.properties['grid_y']
-            created_lairs = 0
-            attempts = 0
-            while created_lairs < 3 and attempts < 1000:
-                attempts += 1
-                lx = random.randint(2, GRID_WIDTH - 3)
-                ly = random.randint(2, GRID_HEIGHT - 3)
-                if math.sqrt((lx - spawn_gx) ** 2 + (ly - spawn_gy) ** 2) < 15:
-                    continue
-
-                too_close = False
-                for l in self.lairs_list:
-                    if math.sqrt((lx - l.center_x / TILE_SIZE) ** 2 + (ly - l.center_y / TILE_SIZE) ** 2) < 10:
-                        too_close = True
-                        break
-                if not too_close:
-                    l_pos = (lx * TILE_SIZE + TILE_SIZE / 2, ly * TILE_SIZE + TILE_SIZE / 2)
-                    if arcade.get_sprites_at_point(l_pos, self.towns):
-                        continue
-                    lair = Lair(l_pos)
-                    self.lairs_list.append(lair)
-                    self.tile_list.append(lair)
-                    created_lairs += 1
-
-        self.selected_unit = self.heroes_list[0]
-        self.camera.position = self.selected_unit.position
+            self.sim.new_game(heroes, tavern_locations)
 
+        self.sim.effect_manager = self.effect_manager  # вспышки и рывки - только для живой игры, не для лога
+        self.setup_hud()
+        self.hero_count = len(self.sim.heroes)
+        self.selected_unit = self.sim.heroes[0]
+        self.camera.position = self.selected_unit.position
 
-    def enemy_turn_logic(self):
-        print("Враги думают...")
-
-        # 1. Собираем препятствия (Города, Бары, Другие враги, Герои)
-        obstacles = set()
-
-        # города
-        for x in range(GRID_WIDTH):
-            for y in range(GRID_HEIGHT):
-                if self.grid_types[x][y] in ['town', 'bar']:
-                    obstacles.add((x, y))
-
-        # герои
-        for h in self.heroes_list:
-            obstacles.add((int(h.center_x // TILE_SIZE), int(h.center_y // TILE_SIZE)))
-
-        # враги
-        enemy_positions = {}  # Map index -> pos
-        for idx, enemy in enumerate(self.enemy_list):
-            pos = (int(enemy.center_x // TILE_SIZE), int(enemy.center_y // TILE_SIZE))
-            enemy_positions[idx] = pos
-            obstacles.add(pos)
-
-        # 2. Планируем путь для каждого врага
-        for idx, enemy in enumerate(self.enemy_list):
-            # Временно убираем текущую позицию этого врага из препятствий, чтобы он мог выйти
-            current_pos = enemy_positions[idx]
-            if current_pos in obstacles:
-                obstacles.remove(current_pos)
-
-            closest_hero = None
-            min_dist = float('inf')
-            e_gx, e_gy = current_pos
-
-            # Ищем цель
-            for hero in self.heroes_list:
-                h_gx = int(hero.center_x // TILE_SIZE)
-                h_gy = int(hero.center_y // TILE_SIZE)
-                dist = abs(e_gx - h_gx) + abs(e_gy - h_gy)
-                if dist < min_dist:
-                    min_dist = dist
-                    closest_hero = hero
-
-            if closest_hero:
-                # для поиска пути временно убираем героя из obstacles
-                hero_pos = (int(closest_hero.center_x // TILE_SIZE), int(closest_hero.center_y // TILE_SIZE))
-                if hero_pos in obstacles:
-                    obstacles.remove(hero_pos)
-
-                path = bfs_path((e_gx, e_gy), hero_pos, obstacles=obstacles)
-
-                # Возвращаем героя в obstacles
-                obstacles.add(hero_pos)
-
-                if len(path) > 0:
-                    # Если путь найден
-                    move_limit = enemy.get_stat('move_range')[0]
-                    real_steps = path
-                    if real_steps and real_steps[-1] == hero_pos:
-                        real_steps.pop()  # Убираем клетку героя из маршрута перемещения
-
-                    # Ограничиваем дальность
-                    steps = real_steps[:move_limit]
-
-                    if len(path) <= enemy.get_stat('attack_range')[0]:
-                        enemy.selected_ability = random.choice(enemy.abilities)
-                        print(f"Противник использует способность:\n{enemy.selected_ability.get('name', '')}")
-                        apply_ability(enemy, closest_hero,
-                                      enemy.selected_ability.get('effect', 'The entity does not have any abilities'),
-                                      self.effect_manager)
-                        # остаемся на месте и возвращаем в obstacles
-                        obstacles.add(current_pos)
-                    else:
-                        # двигаемся
-                        for sx, sy in steps:
-                            world_x = sx * TILE_SIZE + TILE_SIZE / 2
-                            world_y = sy * TILE_SIZE + TILE_SIZE / 2
-                            enemy.path_queue.append((world_x, world_y))
-
-                        # новая позиция врага
-                        obstacles.add(steps[-1])
-                else:
-                    # пути нет (заблокирован) - стоим
-                    obstacles.add(current_pos)
-            else:
-                # нет героев - стоим
-                obstacles.add(current_pos)
-
-        self.turn_state = ENEMY_MOVING
+    def setup_hud(self):
+        """ Надписи HUD создаются один раз и рисуются одной пачкой; в кадре меняется только их текст """
+        self.hud_batch = pyglet.graphics.Batch()
+        self.quest_text = arcade.Text("", SCREEN_WIDTH // 2, SCREEN_HEIGHT - 40, font_size=24, width=250,
+                                      multiline=True, anchor_x='center', batch=self.hud_batch)
+        self.coins_text = arcade.Text("", SCREEN_WIDTH // 2, 25, arcade.color.GOLD, 24,
+                                      anchor_x='center', batch=self.hud_batch)
+        self.rep_text = arcade.Text("", SCREEN_WIDTH // 2, 60, font_size=24, anchor_x='center', batch=self.hud_batch)
+        # Счётчики стражей над логовами - в мире, своей пачкой
+        self.lair_batch = pyglet.graphics.Batch()
+        self.lair_labels = {}  # логово -> arcade.Text
+
+    def update_hud(self):
+        sim = self.sim
+        q = sim.active_quest
+        set_text(self.quest_text, f"Квест: {q['text']} ({q['progress']}/{q['target']})" if q else "")
+        set_text(self.coins_text, f"Монеты: {sim.coins}")
+        set_text(self.rep_text, f"Репутация: {sim.reputation}",
+                 arcade.color.RED if sim.reputation < 35 else arcade.color.GREEN)
+
+        if len(self.lair_labels) > len(sim.lairs):
+            for lair in [lair for lair in self.lair_labels if lair not in sim.lairs]:
+                self.lair_labels.pop(lair).label.delete()
+        for lair in sim.lairs:
+            label = self.lair_labels.get(lair)
+            if label is None:
+                label = self.lair_labels[lair] = arcade.Text("", lair.center_x, lair.center_y + 50, arcade.color.RED,
+                                                             14, anchor_x="center", batch=self.lair_batch)
+            set_text(label, str(lair.guardians_needed))
 
     def on_key_press(self, key, modifiers):
         # Сохранение по F5
         if key == arcade.key.F5:
-            database.save_game_state({'seed':self.map_seed, 'name': self.name,
-                                      'time_of_creation': self.time_of_creation,
-                                      'coins': self.coins, 'rep': self.reputation, 'quest': self.active_quest},
-                                     self.heroes_list, self.enemy_list, self.lairs_list)
+            self.save_game()
+            return
+        # Профилировщик: F3 - таблица зон, F4 - трасса для chrome://tracing
+        if key == arcade.key.F3:
+            self.profiler_overlay.toggle()
+            return
+        if key == arcade.key.F4:
+            if PROFILER.trace:
+                print(f"Трасса сохранена: {PROFILER.export_chrome_trace()}")
             return
 
         if self.turn_state != PLAYER_TURN:
@@ -923,20 +714,20 @@ class GameView(arcade.View):
         elif key == arcade.key.RIGHT:
             self.camera_vel[0] = 1
         elif key == arcade.key.TAB:
-            if self.heroes_list:
-                self.current_unit_index = (self.current_unit_index + 1) % len(self.heroes_list)
-                self.selected_unit = self.heroes_list[self.current_unit_index]
+            if self.sim.heroes:
+                self.current_unit_index = (self.current_unit_index + 1) % len(self.sim.heroes)
+                self.selected_unit = self.sim.heroes[self.current_unit_index]
                 self.camera_mode = "FOLLOW"
         elif key == arcade.key.ENTER:
             if self.selected_unit:
-                tiles = arcade.get_sprites_at_point(self.selected_unit.position, self.tile_list)
-                if tiles and tiles[0].properties.get('type') == 'bar':
+                if self.terrain.type_at(*TileLayer.cell_at(*self.selected_unit.position)) == TERRAIN_BAR:
                     bar_view = BarView(self)
                     arcade.stop_sound(self.background_music_player)
                     bar_view.setup()
                     self.window.show_view(bar_view)
         elif key == arcade.key.ESCAPE:
             arcade.stop_sound(self.background_music_player)
+            self.autosave.close()
             self.window.show_view(StartView())
 
     def on_key_release(self, key, modifiers):
@@ -946,37 +737,54 @@ class GameView(arcade.View):
             self.camera_vel[0] = 0
 
     def on_update(self, delta_time):
-        if len(self.heroes_list) == 0:
+        heroes = self.sim.heroes
+        if len(heroes) == 0:
             arcade.stop_sound(self.background_music_player)
+            self.autosave.close()
             self.window.show_view(GameEndView())
             return
+        with PROFILER.zone('update'):
+            self._update(heroes, delta_time)
+        self.profiler_overlay.update(delta_time)
+
+    def _update(self, heroes, delta_time):
         if self.char_info_overlay.visible:
-            self.char_info_overlay.update(delta_time)
+            with PROFILER.zone('update.char_overlay'):
+                self.char_info_overlay.update(delta_time)
 
-        self.effect_manager.update(delta_time)
+        with PROFILER.zone('update.effects'):
+            self.effect_manager.update(delta_time)
         # Эффект ходьбы
-        for entity in self.entity_list:
-            # Обновляем логику рывков и тряски
-            entity.update_animation_logic(delta_time)
-            if hasattr(entity, 'path_queue') and entity.path_queue:
-                self.effect_manager.add_walk_effect(entity.center_x, entity.bottom)
-
+        with PROFILER.zone('update.walk'):
+            walking_x, walking_y = [], []
+            for entity in self.entity_list:
+                # Обновляем логику рывков и тряски
+                entity.update_animation_logic(delta_time)
+                if entity.path_queue:
+                    walking_x.append(entity.center_x)
+                    walking_y.append(entity.bottom)
+            if walking_x:
+                self.effect_manager.add_walk_effects(walking_x, walking_y)
 
         if self.turn_state == ENEMY_CALCULATING:
-            self.enemy_turn_logic()
+            with PROFILER.zone('update.enemy_turn'):
+                self.sim.enemy_turn()
+            self.turn_state = ENEMY_MOVING
         elif self.turn_state == ENEMY_MOVING:
             any_moving = False
-            for enemy in self.enemy_list:
+            for enemy in self.sim.enemies:
                 enemy.update_position()
                 if enemy.is_moving:
                     any_moving = True
             if not any_moving:
                 self.turn_state = PLAYER_TURN
-                for unit in self.heroes_list:
-                    unit['moves_left'] = unit.get_stat('moves_count')[0]
-                print("Ход игрока!")
+                self.sim.start_player_turn()
+                # Автосохранение в начале хода игрока: снимок совпадает с тем, что даёт проигрывание лога
+                if AUTOSAVE_EVERY_N_TURNS and self.sim.turn_number % AUTOSAVE_EVERY_N_TURNS == 0:
+                    with PROFILER.zone('update.autosave'):
+                        self.save_game()
 
-        for hero in self.heroes_list:
+        for hero in heroes:
             hero.update_position()
 
         # Камера
@@ -995,88 +803,50 @@ class GameView(arcade.View):
         max(half_view_w, min(nx, map_w - half_view_w)), max(half_view_h, min(ny, map_h - half_view_h)))
 
         # Туман
-        if self.heroes_list:
+        if heroes:
             if self.turn_state == PLAYER_TURN:
-                self.current_unit_index = self.current_unit_index % len(self.heroes_list)
-                active_unit = self.heroes_list[self.current_unit_index]
+                self.current_unit_index = self.current_unit_index % len(heroes)
+                active_unit = heroes[self.current_unit_index]
                 self.selected_unit = active_unit
-            for hero in self.heroes_list:
-                view_dist = hero.get_stat('view_range')[0] * TILE_SIZE
-                for fog in self.fog_list:
-                    if not fog.visible:
-                        continue
-                    d = math.sqrt((fog.center_x - hero.center_x) ** 2 + (fog.center_y - hero.center_y) ** 2)
-                    if d <= view_dist:
-                        fog.alpha = max(0, fog.alpha - 15)
-                        if fog.alpha == 0: fog.visible = False
-
-        # Логова
-        for lair in self.lairs_list:
-            min_dist = float('inf')
-            for hero in self.heroes_list:
-                d = math.sqrt((hero.center_x - lair.center_x) ** 2 + (hero.center_y - lair.center_y) ** 2)
-                if d < min_dist: min_dist = d
-            if (min_dist / TILE_SIZE) < 5 and not lair.guardians_spawned:
-                lair.guardians_spawned = True
-                lx, ly = int(lair.center_x // TILE_SIZE), int(lair.center_y // TILE_SIZE)
-                c = 0
-                for dx in range(-2, 3):
-                    for dy in range(-2, 3):
-                        if c >= 6:
-                            break
-                        if ((dx == 0 and dy == 0) or arcade.get_sprites_at_point(
-                                ((lx + dx) * TILE_SIZE + 40, (ly + dy) * TILE_SIZE + 40), self.entity_list)):
-                            continue
-                        self.spawn_enemy(lx + dx, ly + dy, is_guardian=True)
-                        c += 1
-
-            if lair.guardians_needed <= 0:
-                lair.kill()
-                self.lairs_list.remove(lair)
-                self.coins += 30
-                if self.active_quest and self.active_quest["type"] == "kill_lair":
-                    self.active_quest["progress"] += 1
-                    self.check_quest_complete()
+            with PROFILER.zone('update.fog'):
+                self.fog.update(heroes)
+                self.chunk_manager.evict(self.camera, heroes)
 
         # Смерть
-        for entity in self.entity_list:
-            if entity.get_stat('hp')[0] <= 0:
-                if entity == self.boss_entity or getattr(entity, 'is_boss', False):
-                    print("Босс повержен. Игра окончена.")
-                    arcade.stop_sound(self.background_music_player)
-                    self.window.show_view(GameEndView(win=True))
-                    return
-                if getattr(entity, 'is_guardian', False):
-                    n_lair, min_d = None, float('inf')
-                    for l in self.lairs_list:
-                        d = math.sqrt((entity.center_x - l.center_x) ** 2 + (entity.center_y - l.center_y) ** 2)
-                        if d < min_d:
-                            min_d = d; n_lair = l
-                    if n_lair:
-                        n_lair.guardians_needed -= 1
-
-                if entity in self.heroes_list:
-                    self.heroes_list.remove(entity)
-                    self.coins -= self.coins // len(self.heroes_list) if len(self.heroes_list) > 0 else 0
-                if entity in self.enemy_list:
-                    self.enemy_list.remove(entity)
-                    self.coins += 10 if getattr(entity, 'is_guardian', False) else 5
-                    if self.active_quest and self.active_quest["type"] == "kill_enemies":
-                        self.active_quest["progress"] += 1
-                        self.check_quest_complete()
-                entity.kill()
-            elif entity['hp'] > entity.get_stat('max_hp')[0]:
-                entity['hp'] = entity.get_stat('max_hp')[0]
+        if self.sim.resolve_deaths() == 'win':
+            arcade.stop_sound(self.background_music_player)
+            self.autosave.close()
+            self.window.show_view(GameEndView(win=True))
+            return
+        self.warm_end_screens()
+
+    def warm_end_screens(self):
+        """ Финальный экран, который скоро может понадобиться, заранее грузится в фоне """
+        heroes = len(self.sim.heroes)
+        if heroes < self.hero_count:
+            ResourceManager.assets.warm('lose_music', 'lose_animation')
+        self.hero_count = heroes
+        boss = self.sim.boss
+        if boss is not None and boss.get_stat('hp')[0] <= boss.get_stat('max_hp')[0] * WARM_BOSS_HP:
+            ResourceManager.assets.warm('win_sound', 'win_image')
 
     def on_draw(self):
+        with PROFILER.zone('draw'):
+            self._draw()
+        self.profiler_overlay.draw()
+
+    def _draw(self):
         self.clear()
         if self.camera:
             self.camera.use()
-        self.tile_list.draw()
-        self.entity_list.draw()
-        for lair in self.lairs_list:
-            arcade.draw_text(f"{lair.guardians_needed}", lair.center_x, lair.center_y + 50, arcade.color.RED, 14,
-                             anchor_x="center")
+        with PROFILER.zone('draw.terrain'):
+            self.chunk_manager.draw_terrain(self.camera)
+        with PROFILER.zone('draw.sprites'):
+            self.lair_sprites.draw()
+            self.entity_list.draw()
+        with PROFILER.zone('draw.lair_text'):
+            self.update_hud()
+            self.lair_batch.draw()
         if self.selected_unit:
             arcade.draw_rect_outline(arcade.rect.XYWH(
                 self.selected_unit.center_x,
@@ -1084,106 +854,35 @@ class GameView(arcade.View):
                 self.selected_unit.width,
                 self.selected_unit.height,
             ), color=arcade.color.WHITE, border_width=3)
-        self.effect_manager.draw()
-        self.fog_list.draw()
-        if self.active_quest:
-            q = self.active_quest
-            arcade.draw_text(
-                f"Квест: {q['text']} ({q['progress']}/{q['target']})",
-                x=self.camera.position[0], y=self.camera.position[1] + SCREEN_HEIGHT // 2 - 40,
-                width=250, multiline=True, font_size=24, anchor_x='center'
-            )
-        arcade.draw_text(
-            f"Монеты: {self.coins}",
-            x=self.camera.position[0], y=self.camera.position[1] - SCREEN_HEIGHT // 2 + 25, color=arcade.color.GOLD,
-            font_size=24, anchor_x='center'
-        )
-        arcade.draw_text(
-            f"Репутация: {self.reputation}",
-            x=self.camera.position[0], y=self.camera.position[1] - SCREEN_HEIGHT // 2 + 60,
-            color=arcade.color.RED if self.reputation < 35 else arcade.color.GREEN,
-            font_size=24, anchor_x='center'
-        )
+        with PROFILER.zone('draw.effects'):
+            self.effect_manager.draw()
+        with PROFILER.zone('draw.fog'):
+            self.chunk_manager.draw_fog(self.camera)
         self.ui_camera.use()
-        self.char_info_overlay.draw()
-
-    def spawn_enemy(self, x_grid, y_grid, is_guardian=False):
-        if is_guardian:
-            enemy = Entity('images/guardian.jpg', 'enemy', json_data=GUARD_JSON.copy())
-        else:
-            enemy = Entity("images/enemy.jpg", "enemy", json_data=ENEMY_JSON.copy())
-        enemy.is_guardian = is_guardian
-        enemy.center_x = x_grid * TILE_SIZE + TILE_SIZE / 2
-        enemy.center_y = y_grid * TILE_SIZE + TILE_SIZE / 2
-        self.entity_list.append(enemy)
-        self.enemy_list.append(enemy)
-
-    def spawn_boss(self):
-        if self.boss_spawned:
-            return
-
-        total_hp = sum(h.get_stat('max_hp')[0] for h in self.heroes_list)
-        boss_data = BOSS_VAMPIRE.copy()
-        boss_data["hp"] = total_hp * 2
-
-        boss = Entity("images/vampire.png", "enemy", json_data=boss_data)
-        boss.is_guardian = False
-        boss.is_boss = True
-
-        # Ставим в рандомный лес
-        boss.position = random.choice(self.forests).position
-        self.active_quest = FINAL_FIGHT_QUEST
-        self.active_quest['progress'] = 0
-        self.entity_list.append(boss)
-        self.enemy_list.append(boss)
-
-        self.boss_entity = boss
-        self.boss_spawned = True
-        print("Босс появился:", boss_data.get("name"))
+        with PROFILER.zone('draw.hud_text'):
+            self.hud_batch.draw()
+        with PROFILER.zone('draw.char_overlay'):
+            self.char_info_overlay.draw()
 
     def on_mouse_scroll(self, x, y, scroll_x, scroll_y):
         self.char_info_overlay.on_scroll(scroll_y)
 
+    def save_game(self):
+        """ Сохранение в фоне: здесь только снимок мира, запись идёт в потоке автосохранения """
+        sim = self.sim
+        # Лог пишется только для партий, начатых с нуля: у загруженных из снимка его не с чего проигрывать.
+        # Снимок сущностей пишется и при логе: загрузка его не читает, но по нему replay.py --check проверяет,
+        # что лог всё ещё приводит к той же партии (например, после правки правил); пишутся только изменённые
+        replay = (sim.heroes_json, sim.events) if sim.heroes_json else None  # копирует автосохранение, только новое
+        self.autosave.request({'seed': self.map_seed, 'name': self.name,
+                               'time_of_creation': self.time_of_creation,
+                               'coins': sim.coins, 'rep': sim.reputation, 'quest': sim.active_quest},
+                              sim.heroes, sim.enemies, sim.lairs, replay)
+
     def end_turn(self):
-        print("Конец хода игрока.")
-        for entity in self.entity_list:
-            entity.update_effects_turn()
-            entity['mana'] = entity.get_stat('max_mana')[0]
-        for lair in self.lairs_list:
-            lair.next_spawn_interval -= 1
-            if lair.next_spawn_interval <= 0:
-                lair.next_spawn_interval = random.randint(*lair.spawn_interval)
-                lx, ly = int(lair.center_x // TILE_SIZE), int(lair.center_y // TILE_SIZE)
-                print('Вышли бродячие монстры!')
-                c = 0
-                for sx in range(-2, 2):
-                    for sy in range(-2, 2):
-                        if (not (arcade.get_sprites_at_point(((lx + sx) * TILE_SIZE + 42,
-                                                              (ly + sy) * TILE_SIZE + 42),
-                                                             self.entity_list)) and sx != 0 and sy != 0):
-                            if c < 3:
-                                self.spawn_enemy(lx + sx, ly + sy)
-                                c += 1
+        self.sim.end_turn()
         self.turn_state = ENEMY_CALCULATING
 
-    def check_quest_complete(self):
-        q = self.active_quest
-        if not q:
-            return
-        if q["progress"] >= q["target"]:
-            print("Квест выполнен:", q["text"])
-            self.coins += q["reward_coins"]
-            self.reputation += q["reward_rep"]
-            print(f"Награда: {q['reward_coins']} золота, {q['reward_rep']} репутации")
-            # Если репутация стала больше 100 — открываем финальный квест
-            if self.reputation > 100 and not self.final_quest_unlocked:
-                self.final_quest_unlocked = True
-                self.active_quest = FINAL_RETURN_QUEST
-                self.active_quest["progress"] = 0
-                print("Открыт финальный квест: Вернуться в бар")
-            else:
-                self.active_quest = None
-
     def on_mouse_press(self, x, y, button, modifiers):
         if self.turn_state != PLAYER_TURN:
             return
@@ -1192,7 +891,7 @@ class GameView(arcade.View):
 
         # Инфо по ПКМ
         if button == arcade.MOUSE_BUTTON_RIGHT:
-            clicked = arcade.get_sprites_at_point(world_point, self.entity_list)
+            clicked = self.sim.spatial.at_point(wx, wy)
             if clicked:
                 target = clicked[0]
                 new_pos = "left"
@@ -1203,47 +902,27 @@ class GameView(arcade.View):
             return
 
         # ЛКМ действия
-        active_hero = self.heroes_list[self.current_unit_index] if self.heroes_list else None
+        heroes = self.sim.heroes
+        active_hero = heroes[self.current_unit_index] if heroes else None
         if not active_hero or active_hero.path_queue:
             return
-        clicked = arcade.get_sprites_at_point((wx, wy), self.entity_list)
+        clicked = self.sim.spatial.at_point(wx, wy)
 
         if clicked:
             target = clicked[0]
-            dist = abs(active_hero.center_x - target.center_x) + abs(active_hero.center_y - target.center_y)
-            if target in self.heroes_list:
+            if target in heroes:
                 if not self.selected_unit.selected_ability:
                     self.selected_unit = target
-                    self.current_unit_index = self.heroes_list.index(target)
-                elif (dist // TILE_SIZE <= active_hero.get_stat('attack_range')[0]
-                      and active_hero.get_stat('moves_left')[0] > 0):
-                    apply_ability(self.selected_unit, target, self.selected_unit.selected_ability, self.effect_manager)
-                    active_hero['moves_left'] -= 1
+                    self.current_unit_index = heroes.index(target)
+                else:
+                    self.sim.hero_attack(self.selected_unit, target, self.selected_unit.selected_ability)
             elif target.role == 'enemy':
-                if (dist // TILE_SIZE <= active_hero.get_stat('attack_range')[0]
-                        and active_hero.get_stat('moves_left')[0] > 0):
-                    if active_hero.selected_ability:
-                        apply_ability(active_hero, target, active_hero.selected_ability, self.effect_manager)
-                        active_hero['moves_left'] -= 1
-                    else:
-                        print('Способность не выбрана')
+                if active_hero.selected_ability:
+                    self.sim.hero_attack(active_hero, target, active_hero.selected_ability)
+                else:
+                    print('Способность не выбрана')
         else:
-            clicked_tiles = arcade.get_sprites_at_point((wx, wy), self.tile_list)
-            if clicked_tiles:
-                tile = clicked_tiles[0]
-                start_gx = int(active_hero.center_x // TILE_SIZE)
-                start_gy = int(active_hero.center_y // TILE_SIZE)
-                end_gx = int(tile.center_x // TILE_SIZE)
-                end_gy = int(tile.center_y // TILE_SIZE)
-                dist = abs(end_gx - start_gx) + abs(end_gy - start_gy)
-
-                if active_hero.get_stat('moves_left')[0] > 0 and dist <= active_hero.get_stat('move_range')[0]:
-                    path = bfs_path((start_gx, start_gy), (end_gx, end_gy))
-                    for sx, sy in path:
-                        world_x = sx * TILE_SIZE + TILE_SIZE / 2
-                        world_y = sy * TILE_SIZE + TILE_SIZE / 2
-                        active_hero.path_queue.append((world_x, world_y))
-                    active_hero['moves_left'] -= 1
+            self.sim.hero_move(active_hero, TileLayer.cell_at(wx, wy))
         self.selected_unit.selected_ability = None  # убираем выбранную способность (уже использовали или пошли)
-        if all(u.get_stat('moves_left')[0] <= 0 for u in self.heroes_list):
-            self.end_turn()
\ No newline at end of file
+        if self.sim.heroes_done():
+            self.end_turn()